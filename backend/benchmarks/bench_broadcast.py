@@ -0,0 +1,112 @@
+"""Горячее обсуждение: сколько кадров Socket.IO уходит в комнату поста со склейкой и без.
+
+Запуск: python benchmarks/bench_broadcast.py --voters 300 --votes 3000 --comments 500 --workers 16
+Голоса и комментарии идут через HTTP (test client) параллельно; все кадры, которые
+приложение отправляет через socketio.emit, подсчитываются. Проверяется, что последний
+vote_update несет итоги из базы, а каждый комментарий доставлен ровно один раз.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import prepare_app, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--voters', type=int, default=300)
+    parser.add_argument('--votes', type=int, default=3000)
+    parser.add_argument('--comments', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--windows', default='0,0.1,0.25', help='окна склейки в секундах через запятую')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    # Фоновые сбросы - обычные потоки: бенчмарк работает без хаба eventlet
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+    app_module = prepare_app('bench_broadcast.db')
+    app, db, socketio, broadcaster = app_module.app, app_module.db, app_module.socketio, app_module.room_broadcaster
+    from models import User, Post
+    from flask_jwt_extended import create_access_token
+
+    frames = []
+    frames_lock = threading.Lock()
+    original_emit = socketio.emit
+
+    def counting_emit(event, *args, **kwargs):
+        with frames_lock:
+            frames.append((time.perf_counter(), event, args[0] if args else None, kwargs.get('room') or kwargs.get('to')))
+        return original_emit(event, *args, **kwargs)
+
+    socketio.emit = counting_emit
+
+    with app.app_context():
+        voter_ids = [f"user_v{i}" for i in range(args.voters)]
+        for voter_id in voter_ids:
+            db.session.add(User(id=voter_id, name=voter_id, username=voter_id, email=f"{voter_id}@bench", password_hash='x'))
+        db.session.commit()
+        tokens = {voter_id: create_access_token(identity=voter_id) for voter_id in voter_ids}
+
+    rng = random.Random(args.seed)
+    print(f"votes: {args.votes}, comments: {args.comments}, voters: {args.voters}, threads: {args.workers}")
+    ok = True
+    for run_index, window in enumerate(float(value) for value in args.windows.split(',')):
+        post_id = f"post_hot_{run_index}"
+        with app.app_context():
+            db.session.add(Post(id=post_id, author_id=voter_ids[0], author_name='Author', content='hot'))
+            db.session.commit()
+        broadcaster.window = window
+        broadcaster.updates = broadcaster.frames = broadcaster.dropped = 0
+        frames.clear()
+        actions = [('vote', rng.choice(voter_ids), rng.choice(['up', 'down'])) for _ in range(args.votes)]
+        actions += [('comment', rng.choice(voter_ids), f"c{index}") for index in range(args.comments)]
+        rng.shuffle(actions)
+
+        def act(action):
+            kind, voter_id, value = action
+            client = app.test_client()
+            headers = {'Authorization': f"Bearer {tokens[voter_id]}"}
+            if kind == 'vote':
+                client.post(f'/api/posts/{post_id}/vote', json={'type': value}, headers=headers)
+            else:
+                client.post(f'/api/posts/{post_id}/comments', json={'content': value}, headers=headers)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(act, actions))
+        finished = time.perf_counter()
+        time.sleep(broadcaster.interval + 0.1)
+        broadcaster.flush_all()
+
+        with app.app_context():
+            post = db.session.get(Post, post_id)
+            totals = (post.upvotes, post.downvotes)
+        vote_frames = [frame for frame in frames if frame[1] == 'vote_update']
+        comment_frames = [frame for frame in frames if frame[1] in ('new_comment', 'new_comments')]
+        delivered = []
+        for _, event, payload, _ in comment_frames:
+            delivered.extend([payload] if event == 'new_comment' else payload['comments'])
+        dropped = sum(payload.get('dropped', 0) for _, event, payload, _ in comment_frames if event == 'new_comments')
+        last_totals = (vote_frames[-1][2]['upvotes'], vote_frames[-1][2]['downvotes']) if vote_frames else None
+        batch_sizes = [len(payload['comments']) if event == 'new_comments' else 1 for _, event, payload, _ in comment_frames]
+        gaps = [later[0] - earlier[0] for earlier, later in zip(vote_frames, vote_frames[1:])]
+        stats = broadcaster.stats()
+        print(f"[window={window:.2f}s] actions in {finished - started:.2f}s, frames: {len(frames)} "
+              f"(vote_update {len(vote_frames)}, comments {len(comment_frames)}), emits saved: {stats['saved']} "
+              f"({stats['saved'] / max(stats['updates'], 1):.0%})")
+        print(f"[window={window:.2f}s]   comments per frame p50/max: {percentile(batch_sizes, 0.5)}/{max(batch_sizes or [0])}, "
+              f"vote frame gap p50: {percentile(gaps, 0.5) * 1000:.0f}ms, dropped to backpressure: {dropped}")
+        run_ok = last_totals == totals and len(delivered) + dropped == args.comments and len({c['id'] for c in delivered}) == len(delivered)
+        if not run_ok:
+            print(f"[window={window:.2f}s]   FAIL: last totals {last_totals} vs db {totals}, comments {len(delivered)}+{dropped} of {args.comments}")
+        ok = ok and run_ok
+    print('OK: final totals and comments delivered' if ok else 'FAIL: see above')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""Все маршруты app.py и события Socket.IO на синтетических данных reset_db: задержка, запросы к БД, пиковый RSS.
+
+Запуск: TMPDIR=/dev/shm python benchmarks/bench_endpoints.py --scale 0.5 --requests 50
+Postgres: DATABASE_URL=postgresql://.../eventum_bench python benchmarks/bench_endpoints.py (база пересоздается!)
+
+Данные генерирует reset_db.seed_database (скос по степенному закону: вирусные посты,
+топовые организаторы). Каждый сценарий выполняется --requests раз через test client;
+считаются p50/p99, число SQL-запросов этого потока на запрос и пик RSS процесса
+(VmHWM, сбрасывается перед каждым сценарием). Результат сравнивается с
+benchmarks/baseline_endpoints.json для того же диалекта БД: запросов не больше,
+p50 не хуже (1 + tolerance) * базовый + floor, p99 - с большим запасом.
+--save-baseline перезаписывает базовую линию.
+Маршрут или socket-событие без сценария - тоже ошибка: набор должен расти вместе с app.py.
+SQLite и uploads лучше держать в памяти: TMPDIR=/dev/shm.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+from bench_utils import BACKEND_DIR, percentile, prepare_app
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_endpoints.json')
+POOL_SIZE = 50
+
+
+class QueryCounter:
+    """SQL-запросы только текущего потока: фоновые задачи приложения в счет не идут."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._thread_id = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread_id:
+            self.count += 1
+
+
+def reset_peak_rss():
+    # 5 в clear_refs сбрасывает VmHWM (Linux 4.0+); иначе остается пик за все время процесса
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_image(index):
+    from PIL import Image
+    image = Image.new('RGB', (1200, 800), ((index * 70) % 256, (index * 40) % 256, 120))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class Context:
+    """Идентификаторы из сгенерированных данных и то, что сценарии создают по ходу."""
+
+    def __init__(self, app_module):
+        from flask_jwt_extended import create_access_token
+        from sqlalchemy import func
+        from models import db, Comment, Event, Notification, Post, Ticket, follows
+        with app_module.app.app_context():
+            self.organizer = db.session.query(follows.c.organizer_id).group_by(follows.c.organizer_id).order_by(func.count().desc()).limit(1).scalar()
+            self.reader = db.session.query(Notification.recipient_id).group_by(Notification.recipient_id).order_by(func.count().desc()).limit(1).scalar()
+            self.ticket_holder = db.session.query(Ticket.user_id).group_by(Ticket.user_id).order_by(func.count().desc()).limit(1).scalar()
+            self.viral_post = db.session.query(Post.id).order_by(Post.comment_count.desc()).limit(1).scalar()
+            self.thread_root = db.session.query(Comment.parent_id).filter(Comment.parent_id.isnot(None)).group_by(Comment.parent_id).order_by(func.count().desc()).limit(1).scalar()
+            self.popular_events = [row.id for row in db.session.query(Event.id).order_by(Event.views.desc()).limit(POOL_SIZE)]
+            self.pool = [f"user_s{i:06d}" for i in range(POOL_SIZE, 2 * POOL_SIZE)]
+            self.tokens = {user_id: create_access_token(identity=user_id)
+                           for user_id in self.pool + [self.organizer, self.reader, self.ticket_holder]}
+        self.created_events = []
+        self.job_ids = []
+        self.hold_ids = []
+        self.uploads = {}
+        self.images = [make_image(index) for index in range(4)]
+
+    def auth(self, user_id):
+        return {'Authorization': f"Bearer {self.tokens[user_id]}"}
+
+    def user(self, i):
+        return self.pool[i % POOL_SIZE]
+
+
+def build_scenarios(ctx, run_tag):
+    """(имя, функция i -> (метод, путь, kwargs для test client), допустимые статусы, максимум повторов)."""
+    c = ctx
+    organizer, reader, post = c.organizer, c.reader, c.viral_post
+
+    def multipart(field, i):
+        return {'data': {field: (io.BytesIO(c.images[i % len(c.images)]), f"bench{i}.jpg")}, 'content_type': 'multipart/form-data'}
+
+    return [
+        ('POST /api/register', lambda i: ('POST', '/api/register', {'json': {
+            'email': f"bench{run_tag}_{i}@bench.local", 'password': 'password', 'name': 'Bench', 'username': f"bench{run_tag}_{i}"}}), {201}, None),
+        ('POST /api/login', lambda i: ('POST', '/api/login', {'json': {'email': f"seed{POOL_SIZE + i % POOL_SIZE}@seed.local", 'password': 'password'}}), {200}, None),
+        ('GET /api/user/me', lambda i: ('GET', '/api/user/me', {'headers': c.auth(reader)}), {200}, None),
+        ('GET /api/user/me?fields=all', lambda i: ('GET', '/api/user/me?fields=all', {'headers': c.auth(c.ticket_holder)}), {200}, None),
+        ('PUT /api/user/profile', lambda i: ('PUT', '/api/user/profile', {'headers': c.auth(c.user(i)), 'json': {'bio': f"bio {i}"}}), {200}, None),
+        ('POST /api/user/interests', lambda i: ('POST', '/api/user/interests', {'headers': c.auth(c.user(i)), 'json': {'interests': ['music', 'art', f"i{i % 5}"]}}), {200}, None),
+        ('POST /api/user/favorite', lambda i: ('POST', '/api/user/favorite', {'headers': c.auth(c.user(i)), 'json': {'eventId': c.popular_events[i % 7]}}), {200}, None),
+        ('PUT|DELETE /api/user/favorites/<id>', lambda i: ('PUT' if i % 2 == 0 else 'DELETE', f"/api/user/favorites/{c.popular_events[i // 2 % 7]}", {'headers': c.auth(c.user(i // 2))}), {200}, None),
+        ('POST /api/user/follow', lambda i: ('POST', '/api/user/follow', {'headers': c.auth(c.user(i)), 'json': {'organizerId': organizer}}), {200}, None),
+        ('PUT|DELETE /api/user/following/<id>', lambda i: ('PUT' if i % 2 == 0 else 'DELETE', f"/api/user/following/{organizer}", {'headers': c.auth(c.user(i // 2))}), {200}, None),
+        ('POST /api/user/sync', lambda i: ('POST', '/api/user/sync', {'headers': c.auth(c.user(i)), 'json': {'actions': [
+            {'type': 'favorite', 'op': 'add' if (i + k) % 3 else 'remove', 'id': c.popular_events[k]} for k in range(15)] + [
+            {'type': 'follow', 'op': 'add' if i % 2 else 'remove', 'id': organizer}]}}), {200}, None),
+        ('POST /api/user/become-organizer', lambda i: ('POST', '/api/user/become-organizer', {'headers': c.auth(c.user(i))}), {200}, None),
+        ('GET /api/notifications?limit=20', lambda i: ('GET', '/api/notifications?limit=20', {'headers': c.auth(reader)}), {200}, None),
+        ('GET /api/notifications', lambda i: ('GET', '/api/notifications', {'headers': c.auth(reader)}), {200}, None),
+        ('GET /api/notifications/unread-count', lambda i: ('GET', '/api/notifications/unread-count', {'headers': c.auth(reader)}), {200}, None),
+        ('PUT /api/notifications/read', lambda i: ('PUT', '/api/notifications/read', {'headers': c.auth(c.user(i)), 'json': {}}), {200}, None),
+        ('GET /api/events?limit=20', lambda i: ('GET', '/api/events?limit=20', {}), {200}, None),
+        ('GET /api/events?district&categories', lambda i: ('GET', f"/api/events?limit=20&district=Медеуский&categories=concert,festival&maxPrice={5000 + i}", {}), {200}, None),
+        ('GET /api/events?sort=hot', lambda i: ('GET', '/api/events?sort=hot&limit=20', {}), {200}, None),
+        ('GET /api/events?sort=trending', lambda i: ('GET', '/api/events?sort=trending&limit=20', {}), {200}, None),
+        ('GET /api/events (full feed)', lambda i: ('GET', '/api/events', {}), {200}, 10),
+        ('GET /api/events/for-you', lambda i: ('GET', '/api/events/for-you?limit=20', {'headers': c.auth(c.user(i))}), {200}, None),
+        ('POST /api/events', lambda i: ('POST', '/api/events', {'headers': c.auth(organizer), 'json': {
+            'title': f"Bench event {i}", 'fullDescription': 'Описание', 'district': 'Медеуский', 'vibe': 'chill',
+            'tags': ['music', 'live'], 'categories': ['concert'], 'priceValue': 3000, 'timestamp': int(time.time() * 1000) + 86400000}}), {201}, None),
+        ('GET /api/notification-jobs/<id>', lambda i: ('GET', f"/api/notification-jobs/{c.job_ids[i % len(c.job_ids)]}", {'headers': c.auth(organizer)}), {200}, None),
+        ('PUT /api/events/<id>', lambda i: ('PUT', f"/api/events/{c.created_events[i % len(c.created_events)]}", {'headers': c.auth(organizer), 'json': {
+            'title': f"Bench event {i} (updated)", 'tags': ['music', 'jazz']}}), {200}, None),
+        ('POST /api/events/<id>/view', lambda i: ('POST', f"/api/events/{c.popular_events[i % 10]}/view", {
+            'environ_base': {'REMOTE_ADDR': f"10.99.{i // 250}.{i % 250 + 1}"}}), {200}, None),
+        ('GET /api/organizer/analytics', lambda i: ('GET', '/api/organizer/analytics', {'headers': c.auth(organizer)}), {200}, None),
+        ('GET /api/organizer/analytics?granularity=hour', lambda i: ('GET', '/api/organizer/analytics?granularity=hour', {'headers': c.auth(organizer)}), {200}, None),
+        ('GET /api/organizer/summary', lambda i: ('GET', '/api/organizer/summary', {'headers': c.auth(organizer)}), {200}, None),
+        ('GET /api/organizer/summary/events?limit=20', lambda i: ('GET', '/api/organizer/summary/events?limit=20', {'headers': c.auth(organizer)}), {200}, None),
+        ('GET /api/search', lambda i: ('GET', f"/api/search?q={['концерт', 'джаз вечер', 'выставка', 'город'][i % 4]}", {}), {200}, None),
+        ('GET /api/search/suggest', lambda i: ('GET', f"/api/search/suggest?q={['кон', 'джа', 'выс', 'гор'][i % 4]}", {}), {200}, None),
+        ('GET /api/posts?limit=20', lambda i: ('GET', '/api/posts?limit=20', {'headers': c.auth(c.user(i))}), {200}, None),
+        ('GET /api/posts?sort=hot', lambda i: ('GET', '/api/posts?sort=hot&limit=20', {'headers': c.auth(c.user(i))}), {200}, None),
+        ('POST /api/posts', lambda i: ('POST', '/api/posts', {'headers': c.auth(c.user(i)), 'json': {'content': f"Бенчмарк пост {i}", 'categorySlug': 'concert'}}), {201}, None),
+        ('POST /api/posts/<id>/vote', lambda i: ('POST', f"/api/posts/{post}/vote", {'headers': c.auth(c.user(i)), 'json': {'type': 'up' if i % 3 else 'down'}}), {200}, None),
+        ('GET /api/posts/<id>/comments?limit=20', lambda i: ('GET', f"/api/posts/{post}/comments?limit=20", {}), {200}, None),
+        ('POST /api/posts/<id>/comments', lambda i: ('POST', f"/api/posts/{post}/comments", {'headers': c.auth(c.user(i)), 'json': {'content': f"Комментарий {i}"}}), {201}, None),
+        ('GET /api/posts/<id>/comments/tree', lambda i: ('GET', f"/api/posts/{post}/comments/tree?limit=20", {}), {200}, None),
+        ('GET /api/comments/<id>/replies', lambda i: ('GET', f"/api/comments/{c.thread_root}/replies?limit=20", {}), {200}, None),
+        ('POST /api/tickets/buy', lambda i: ('POST', '/api/tickets/buy', {'headers': c.auth(c.user(i)), 'json': {
+            'eventId': c.created_events[i // POOL_SIZE % len(c.created_events)], 'quantity': 1 + i % 2}}), {201}, None),
+        ('POST /api/tickets/buy (idempotent retry)', lambda i: ('POST', '/api/tickets/buy', {'headers': dict(c.auth(reader), **{'Idempotency-Key': f"bench-{run_tag}"}),
+            'json': {'eventId': c.created_events[-1]}}), {201}, None),
+        ('GET /api/tickets/my', lambda i: ('GET', '/api/tickets/my', {'headers': c.auth(c.ticket_holder)}), {200}, None),
+        ('POST /api/tickets/holds', lambda i: ('POST', '/api/tickets/holds', {'headers': c.auth(c.user(i)), 'json': {
+            'eventId': c.created_events[1 % len(c.created_events)], 'quantity': 1 + i % 2}}), {200, 201}, None),
+        # Брони снимают их владельцы: после pop длина списка - номер владельца в пуле
+        ('DELETE /api/tickets/holds/<id>', lambda i: ('DELETE', f"/api/tickets/holds/{c.hold_ids.pop()}", {'headers': c.auth(c.user(len(c.hold_ids)))}), {200}, None),
+        ('GET /api/events/<id>/availability', lambda i: ('GET', f"/api/events/{c.popular_events[i % 10]}/availability", {}), {200}, None),
+        ('POST /api/user/upload-avatar', lambda i: ('POST', '/api/user/upload-avatar', dict(multipart('avatar', i), headers=c.auth(c.user(i)))), {200}, 20),
+        ('POST /api/events/upload-image', lambda i: ('POST', '/api/events/upload-image', dict(multipart('image', i), headers=c.auth(organizer))), {200}, 20),
+        ('GET /api/uploads/status', lambda i: ('GET', f"/api/uploads/status?url={c.uploads['avatars']}", {}), {200}, None),
+        ('GET /uploads/avatars/<file>', lambda i: ('GET', f"/uploads/avatars/{c.uploads['avatars']}", {}), {200}, None),
+        ('GET /uploads/events/<file>', lambda i: ('GET', f"/uploads/events/{c.uploads['events']}", {'headers': {'Range': 'bytes=0-1023'}}), {206}, None),
+        ('GET /metrics', lambda i: ('GET', '/metrics', {}), {200}, None),
+        ('DELETE /api/events/<id>', lambda i: ('DELETE', f"/api/events/{c.created_events.pop()}", {'headers': c.auth(organizer)}), {200}, None),
+    ]
+
+
+def after_response(name, ctx, response):
+    """Запоминает созданное сценарием для следующих сценариев."""
+    if name == 'POST /api/events':
+        body = response.get_json()
+        ctx.created_events.append(body['id'])
+        ctx.job_ids.append(body['notificationJobId'])
+    elif name == 'POST /api/tickets/holds' and response.status_code == 201:
+        ctx.hold_ids.append(response.get_json()['id'])
+    elif name in ('POST /api/user/upload-avatar', 'POST /api/events/upload-image'):
+        body = response.get_json()
+        url = body.get('avatarUrl') or body.get('imageUrl')
+        ctx.uploads['avatars' if 'avatar' in name else 'events'] = url.rsplit('/', 1)[-1]
+
+
+def wait_for_uploads(app_module, ctx, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(app_module.image_pipeline.status(filename) == 'ready' for filename in ctx.uploads.values()):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"uploads not processed: {ctx.uploads}")
+
+
+def run_http(app_module, ctx, args, counter, results, covered):
+    app = app_module.app
+    client = app.test_client()
+    adapter = app.url_map.bind('localhost')
+    for name, build, statuses, cap in build_scenarios(ctx, int(time.time())):
+        if name.startswith('GET /uploads') or name.startswith('GET /api/uploads'):
+            wait_for_uploads(app_module, ctx)
+        repeat = min(args.requests, cap or args.requests)
+        latencies, queries, errors = [], [], []
+        reset_peak_rss()
+        for i in range(repeat):
+            method, path, kwargs = build(i)
+            covered.add(adapter.match(path.split('?')[0], method=method)[0])
+            counter.count = 0
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()
+            latencies.append(time.perf_counter() - started)
+            queries.append(counter.count)
+            if response.status_code not in statuses:
+                errors.append(f"{response.status_code} {response.get_data(as_text=True)[:120]}")
+            else:
+                after_response(name, ctx, response)
+        results[name] = summarize(latencies, queries, errors)
+
+
+def run_socketio(app_module, ctx, args, counter, results, covered):
+    app, socketio = app_module.app, app_module.socketio
+    room_clients = []
+
+    def measure(name, action, repeat):
+        latencies, queries = [], []
+        reset_peak_rss()
+        for i in range(repeat):
+            counter.count = 0
+            started = time.perf_counter()
+            action(i)
+            latencies.append(time.perf_counter() - started)
+            queries.append(counter.count)
+        results[name] = summarize(latencies, queries, [])
+
+    def connect(i):
+        room_clients.append(socketio.test_client(app))
+
+    measure('socket connect', connect, args.requests)
+    covered.add('socket:connect')
+    measure('socket join_post', lambda i: room_clients[i].emit('join_post', {'postId': ctx.viral_post}), args.requests)
+    measure('socket join_user_room', lambda i: room_clients[i].emit('join_user_room', {'userId': ctx.user(i)}), args.requests)
+    covered.update({'socket:join_post', 'socket:join_user_room'})
+    for client in room_clients:
+        client.get_received()
+
+    # Рассылка в комнату вирусного поста: POST комментария и доставка всем подключенным клиентам
+    http = app.test_client()
+    sent = []
+
+    def comment_fanout(i):
+        content = f"fanout {i}"
+        sent.append(content)
+        http.post(f"/api/posts/{ctx.viral_post}/comments", json={'content': content}, headers=ctx.auth(ctx.user(i)))
+        app_module.room_broadcaster.flush_all()
+
+    measure(f"socket new_comment -> {len(room_clients)} clients", comment_fanout, args.requests)
+    delivered = sum(1 for client in room_clients for packet in client.get_received()
+                    if packet['name'] in ('new_comment', 'new_comments'))
+    expected_frames = len(room_clients) * len(sent)
+    if delivered < expected_frames and app_module.room_broadcaster.window == 0:
+        results[f"socket new_comment -> {len(room_clients)} clients"]['errors'] = [f"delivered {delivered} of {expected_frames} frames"]
+
+    measure('socket leave_post', lambda i: room_clients[i].emit('leave_post', {'postId': ctx.viral_post}), args.requests)
+    covered.add('socket:leave_post')
+    for client in room_clients:
+        client.disconnect()
+
+
+def summarize(latencies, queries, errors):
+    return {"p50_ms": round(percentile(latencies, 0.5) * 1000, 2), "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "queries": max(queries or [0]), "queries_p50": percentile(queries, 0.5),
+            "peak_rss_mb": round(peak_rss_mb(), 1), "requests": len(latencies), "errors": errors}
+
+
+def compare(results, baseline, args):
+    """Список регрессий относительно базовой линии."""
+    regressions = []
+    same_scale = baseline.get('scale') == args.scale and baseline.get('requests') == args.requests
+    if not same_scale:
+        print(f"baseline was recorded with scale={baseline.get('scale')} requests={baseline.get('requests')}: comparing query counts only")
+    for name, current in results.items():
+        base = baseline['routes'].get(name)
+        if base is None:
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} queries per request (baseline {base['queries']})")
+        if same_scale and current['p50_ms'] > base['p50_ms'] * (1 + args.tolerance) + args.floor_ms:
+            regressions.append(f"{name}: p50 {current['p50_ms']:.1f}ms (baseline {base['p50_ms']:.1f}ms)")
+        if same_scale and current['p99_ms'] > base['p99_ms'] * (1 + args.p99_tolerance) + args.p99_floor_ms:
+            regressions.append(f"{name}: p99 {current['p99_ms']:.1f}ms (baseline {base['p99_ms']:.1f}ms)")
+        if same_scale and current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + args.tolerance) + args.floor_mb:
+            regressions.append(f"{name}: peak RSS {current['peak_rss_mb']:.0f}MiB (baseline {base['peak_rss_mb']:.0f}MiB)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=0.5, help='множитель объемов reset_db.SEED_DEFAULTS')
+    parser.add_argument('--requests', type=int, default=50, help='повторов на сценарий')
+    parser.add_argument('--random-seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='допустимый рост p50 и RSS относительно базовой линии')
+    parser.add_argument('--floor-ms', type=float, default=2.0, help='абсолютный запас по p50 для быстрых маршрутов')
+    # Хвост на 50 запросах - единичные выбросы (GC, фоновые потоки, блокировка записи SQLite),
+    # поэтому по p99 ловятся только грубые регрессии
+    parser.add_argument('--p99-tolerance', type=float, default=3.0)
+    parser.add_argument('--p99-floor-ms', type=float, default=50.0)
+    parser.add_argument('--floor-mb', type=float, default=20.0, help='абсолютный запас по пиковому RSS')
+    args = parser.parse_args()
+
+    # Фоновые задачи - обычные потоки; bcrypt дешевый, чтобы вход и регистрация мерили приложение, а не стоимость хэша;
+    # без склейки кадров каждая рассылка уходит сразу и ее можно посчитать
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('BROADCAST_WINDOW', '0')
+    app_module = prepare_app('bench_endpoints.db')
+    app_module.app.root_path = os.getcwd()
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import reset_db
+
+    started = time.perf_counter()
+    with app_module.app.app_context():
+        counts = reset_db.seed_database(reset_db.seed_counts(args.scale), seed=args.random_seed, log=lambda message: None)
+        dialect = app_module.db.engine.dialect.name
+        counter = QueryCounter(app_module.db.engine)
+    print(f"{dialect}: seeded in {time.perf_counter() - started:.1f}s: " + ', '.join(f"{k} {v}" for k, v in counts.items()))
+
+    ctx = Context(app_module)
+    results, covered = {}, set()
+    run_http(app_module, ctx, args, counter, results, covered)
+    run_socketio(app_module, ctx, args, counter, results, covered)
+    overall_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"{'scenario':52s} {'p50 ms':>8s} {'p99 ms':>8s} {'queries':>8s} {'RSS MiB':>8s}")
+    for name, result in results.items():
+        print(f"{name:52s} {result['p50_ms']:8.1f} {result['p99_ms']:8.1f} {result['queries']:8d} {result['peak_rss_mb']:8.0f}")
+    print(f"process peak RSS: {overall_peak:.0f}MiB")
+
+    failures = [f"{name}: {result['errors'][0]} ({len(result['errors'])} errors)" for name, result in results.items() if result['errors']]
+    endpoints = {rule.endpoint for rule in app_module.app.url_map.iter_rules() if rule.endpoint != 'static'}
+    socket_events = {f"socket:{name}" for name in app_module.socketio.server.handlers.get('/', {})} | {'socket:connect'}
+    missing = sorted((endpoints | socket_events) - covered)
+    if missing:
+        failures.append(f"no scenario for: {', '.join(missing)}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        routes = {name: {k: v for k, v in result.items() if k != 'errors'} for name, result in results.items()}
+        baselines[dialect] = {"scale": args.scale, "requests": args.requests, "routes": routes}
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"baseline for {dialect} saved to {args.baseline}")
+    elif dialect in baselines:
+        failures.extend(compare(results, baselines[dialect], args))
+    else:
+        print(f"no {dialect} baseline in {args.baseline}: run with --save-baseline")
+
+    for failure in failures:
+        print(f"  {failure}")
+    print('OK: all routes and socket events within baseline' if not failures else 'FAIL: see above')
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Конвейер картинок: задержка от загрузки до готовности производных и вес страницы ленты.
+
+Запуск: python benchmarks/bench_images.py --uploads 40 --workers 2 --concurrency 4
+Вес страницы сравнивает оригиналы (что раньше скачивал клиент) с card-вариантами WebP/JPEG.
+Повторная загрузка страницы: сколько байт уходит при If-None-Match (хранилище по хэшу отдает 304).
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import prepare_app, percentile
+
+
+def make_photo(width, height, seed):
+    """Шумная "фотография" с EXIF (камера, поворот), чтобы сжатие и очистка метаданных были честными."""
+    from PIL import Image
+    noise = Image.effect_noise((width, height), 64 + seed % 32).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    photo = Image.blend(noise, gradient, 0.5)
+    exif = Image.Exif()
+    exif[0x010F] = 'BenchCam'  # Make
+    exif[0x0112] = 6  # Orientation: повернуть на 90
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=92, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=2, help='процессов в пуле (0 - обработка в запросе)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['IMAGE_WORKERS'] = str(args.workers)
+    app_module = prepare_app('bench_images.db')
+    app, pipeline = app_module.app, app_module.image_pipeline
+    # Папки загрузок относительны рабочей папки, send_from_directory считает от root_path
+    app.root_path = os.getcwd()
+    from PIL import Image
+
+    client = app.test_client()
+    token = client.post('/api/register', json={'email': 'org@bench', 'password': 'x', 'name': 'Org'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    photos = [make_photo(args.width, args.height, i) for i in range(min(args.uploads, 8))]
+
+    def upload(index):
+        data = photos[index % len(photos)]
+        started = time.perf_counter()
+        response = app.test_client().post('/api/events/upload-image', headers=headers, content_type='multipart/form-data',
+                                          data={'image': (io.BytesIO(data), f'photo_{index}.jpg')})
+        responded = time.perf_counter()
+        filename = response.json['imageUrl'].split('/')[-1]
+        base = filename[:-len('_full.jpg')]
+        paths = [os.path.join(app_module.EVENTS_FOLDER, f"{base}_{size}.{ext}") for size in ('thumb', 'card', 'full') for ext in ('webp', 'jpg')]
+        while not all(os.path.exists(path) for path in paths):
+            if pipeline.status(filename) == 'failed':
+                raise RuntimeError(f"processing failed for {filename}")
+            time.sleep(0.005)
+        return response.json['imageUrl'], len(data), responded - started, time.perf_counter() - started
+
+    # Прогрев: запуск процессов пула не должен попадать в замер
+    upload(0)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(upload, range(args.uploads)))
+    elapsed = time.perf_counter() - started
+
+    response_times = [r[2] for r in results]
+    available_times = [r[3] for r in results]
+    print(f"uploads: {args.uploads} of {args.width}x{args.height}, pool workers: {args.workers}, concurrency: {args.concurrency}")
+    print(f"upload response p50: {percentile(response_times, 0.5) * 1000:.1f}ms, p99: {percentile(response_times, 0.99) * 1000:.1f}ms")
+    print(f"upload-to-available p50: {percentile(available_times, 0.5) * 1000:.1f}ms, p99: {percentile(available_times, 0.99) * 1000:.1f}ms, "
+          f"throughput: {args.uploads / elapsed:.1f} images/s")
+
+    first_full = os.path.join(app_module.EVENTS_FOLDER, results[0][0].split('/')[-1])
+    with Image.open(first_full) as full:
+        exif_left = dict(full.getexif())
+        print(f"full variant: {full.size[0]}x{full.size[1]}, EXIF tags left: {len(exif_left)}")
+
+    # Страница ленты: события с загруженными картинками
+    for index, (image_url, _, _, _) in enumerate(results[:args.page_size]):
+        client.post('/api/events', headers=headers, json={'title': f'Bench {index}', 'image': image_url, 'timestamp': index})
+    page = client.get(f'/api/events?limit={args.page_size}').json
+    original_bytes = sum(r[1] for r in results[:args.page_size])
+
+    def variant_bytes(size, fmt):
+        total = 0
+        for card in page:
+            url = card['imageVariants'][size][fmt]
+            total += os.path.getsize(os.path.join(app_module.EVENTS_FOLDER, url.split('/')[-1]))
+        return total
+
+    print(f"feed page of {len(page)} cards: originals {original_bytes / 1024:.0f} KiB")
+    for size in ('thumb', 'card'):
+        for fmt in ('webp', 'jpeg'):
+            total = variant_bytes(size, fmt)
+            print(f"  {size:5s} {fmt:4s}: {total / 1024:8.0f} KiB ({original_bytes / max(total, 1):.0f}x smaller)")
+
+    # Повторный визит: клиент присылает ETag, тела не должно быть
+    card_urls = ['/' + card['imageVariants']['card']['webp'].split('/', 3)[-1] for card in page]
+    first_visit = [client.get(url) for url in card_urls]
+    repeat_visit = [client.get(url, headers={'If-None-Match': first.headers['ETag']}) for url, first in zip(card_urls, first_visit)]
+    not_modified = sum(1 for r in repeat_visit if r.status_code == 304)
+    print(f"repeat page load: {not_modified}/{len(repeat_visit)} not modified, "
+          f"{sum(len(r.data) for r in first_visit) / 1024:.0f} KiB -> {sum(len(r.data) for r in repeat_visit) / 1024:.0f} KiB, "
+          f"Cache-Control: {first_visit[0].headers.get('Cache-Control')}")
+    stats = pipeline.stats()
+    print(f"distinct photos: {len(photos)}, processed: {stats['completed']}, deduplicated: {stats['reused']}")
+    pipeline.shutdown()
+    ok = not exif_left and stats['failed'] == 0 and not_modified == len(repeat_visit)
+    print('OK: variants ready, metadata stripped' if ok else 'FAIL: see above')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Вход под нагрузкой: сколько логинов в секунду и насколько при этом дергается Socket.IO.
+
+Запуск: python benchmarks/bench_logins.py --logins 64 --concurrency 8 --rounds 12
+Сервер поднимается в отдельном процессе через socketio.run (eventlet, как в проде)
+дважды: с хэшированием прямо в запросе (PASSWORD_HASH_WORKERS=0) и в пуле потоков.
+Пока идет серия логинов, отдельный клиент Socket.IO (long-polling) шлет событие с
+подтверждением каждые --probe-interval мс; время до ack - задержка, которую видят сокеты.
+--seed-rounds меньше --rounds показывает миграцию стоимости: хэши пересчитываются при входе.
+"""
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import PollingClient, prepare_app, percentile, wait_for_port
+
+PASSWORD = 'bench-password'
+
+
+def serve(args):
+    import bcrypt as bcrypt_lib
+    app_module = prepare_app('bench_logins.db')
+    app, db = app_module.app, app_module.db
+    from models import User
+    # Один хэш на всех: сид не должен занимать минуты
+    seed_hash = bcrypt_lib.hashpw(PASSWORD.encode(), bcrypt_lib.gensalt(args.seed_rounds)).decode()
+    with app.app_context():
+        for i in range(args.users):
+            db.session.add(User(id=f"user_b{i}", name=f"User {i}", username=f"b{i}", email=f"b{i}@bench", password_hash=seed_hash))
+        db.session.commit()
+    print(os.path.join(os.getcwd(), 'bench_logins.db'), flush=True)
+    app_module.socketio.run(app, host='127.0.0.1', port=args.port, log_output=False)
+
+
+def login(port, index):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    body = json.dumps({'email': f"b{index}@bench", 'password': PASSWORD})
+    started = time.perf_counter()
+    connection.request('POST', '/api/login', body=body, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse(); response.read()
+    connection.close()
+    return response.status, time.perf_counter() - started
+
+
+def run_mode(args, workers, port):
+    env = dict(os.environ, PASSWORD_HASH_WORKERS=str(workers), BCRYPT_LOG_ROUNDS=str(args.rounds))
+    env.pop('DATABASE_URL', None)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port), '--users', str(args.logins),
+                               '--seed-rounds', str(args.seed_rounds)], env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        db_path = server.stdout.readline().strip()
+        wait_for_port(port)
+        probe = PollingClient(port)
+        samples = {'idle': [], 'burst': []}
+        phase = ['idle']
+        stop = threading.Event()
+
+        def run_probe():
+            while not stop.is_set():
+                samples[phase[0]].append(probe.call('join_post', {'postId': 'bench'}))
+                time.sleep(args.probe_interval / 1000)
+
+        probe_thread = threading.Thread(target=run_probe, daemon=True)
+        probe_thread.start()
+        time.sleep(args.idle)
+        phase[0] = 'burst'
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda i: login(port, i), range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set(); probe_thread.join()
+    finally:
+        server.terminate(); server.wait()
+
+    with sqlite3.connect(db_path) as connection:
+        upgraded = connection.execute("SELECT COUNT(*) FROM users WHERE password_hash LIKE ?", (f"$2b${args.rounds:02d}$%",)).fetchone()[0]
+    ok_count = sum(1 for status, _ in results if status == 200)
+    latencies = [latency for _, latency in results]
+    label = 'inline' if workers <= 0 else f'pool({workers})'
+    print(f"[{label}] logins: {ok_count}/{args.logins} ok in {elapsed:.2f}s ({ok_count / elapsed:.1f} logins/s), "
+          f"latency p50: {percentile(latencies, 0.5) * 1000:.0f}ms, p99: {percentile(latencies, 0.99) * 1000:.0f}ms")
+    for name in ('idle', 'burst'):
+        values = samples[name]
+        print(f"[{label}]   socket ack {name:5s}: n={len(values)}, p50: {percentile(values, 0.5) * 1000:.1f}ms, "
+              f"p99: {percentile(values, 0.99) * 1000:.1f}ms, max: {max(values or [0]) * 1000:.1f}ms")
+    if args.seed_rounds != args.rounds:
+        print(f"[{label}]   hashes at cost {args.rounds}: {upgraded}/{args.logins}")
+    return ok_count == args.logins and (args.seed_rounds == args.rounds or upgraded == args.logins), samples['burst']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--seed-rounds', type=int, default=None, help='стоимость хэшей в сиде (по умолчанию = --rounds)')
+    parser.add_argument('--workers', type=int, default=None, help='только этот режим (0 - в запросе)')
+    parser.add_argument('--probe-interval', type=float, default=20, help='мс между пингами сокета')
+    parser.add_argument('--idle', type=float, default=1.0, help='секунд замера без нагрузки')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.seed_rounds is None:
+        args.seed_rounds = args.rounds
+    if args.serve:
+        return serve(args)
+
+    modes = [args.workers] if args.workers is not None else [0, max(os.cpu_count() or 1, 2)]
+    print(f"logins: {args.logins}, concurrency: {args.concurrency}, bcrypt cost: {args.rounds} (seeded at {args.seed_rounds})")
+    ok = True
+    burst_p99 = {}
+    for offset, workers in enumerate(modes):
+        mode_ok, burst = run_mode(args, workers, args.port + offset)
+        ok = ok and mode_ok
+        burst_p99[workers] = percentile(burst, 0.99)
+    if len(modes) == 2:
+        print(f"socket p99 during burst: inline {burst_p99[modes[0]] * 1000:.0f}ms -> pool {burst_p99[modes[1]] * 1000:.0f}ms")
+    print('OK: all logins succeeded' if ok else 'FAIL: see above')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
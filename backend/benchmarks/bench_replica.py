@@ -0,0 +1,189 @@
+"""Чтение с реплики и пул соединений на двух SQLite-файлах: основная БД и ее снимок в роли реплики.
+
+Запуск: TMPDIR=/dev/shm python benchmarks/bench_replica.py --scale 0.05
+Снимок делается после заполнения и обновляется только по команде, поэтому реплика
+"отстает" сколько нужно. Проверяется:
+- GET лент постов, комментариев, уведомлений и рейтингов событий читают только реплику,
+  а лента событий по дате, профиль и все записи - только основную БД;
+- написавший пользователь REPLICA_STICKY_SECONDS видит свой пост (читает основную БД),
+  остальные - нет, пока реплика не догонит;
+- при пуле меньше числа параллельных запросов ожидание соединения видно в
+  eventum_db_pool_wait_seconds на /metrics, а таймаутов нет.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from bench_utils import BACKEND_DIR, prepare_app
+
+STICKY_SECONDS = 1.0
+
+
+def snapshot(app_module, primary_path, replica_path):
+    """Реплика догоняет основную БД: копия файла через backup API SQLite."""
+    with app_module.app.app_context():
+        app_module.db.engines['replica'].dispose()
+    source, target = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close(); target.close()
+
+
+class EngineCounter:
+    """SQL по движкам (основная БД / реплика) во всех потоках."""
+
+    def __init__(self, engines):
+        self.counts = {}
+        self._lock = threading.Lock()
+        for key, engine in engines.items():
+            name = key or 'primary'
+            event.listen(engine, 'before_cursor_execute', self._make_listener(name))
+
+    def _make_listener(self, name):
+        def on_execute(*args):
+            with self._lock:
+                self.counts[name] = self.counts.get(name, 0) + 1
+        return on_execute
+
+    def take(self):
+        with self._lock:
+            counts, self.counts = self.counts, {}
+        return counts.get('primary', 0), counts.get('replica', 0)
+
+
+def metric_value(text, name, labels):
+    match = re.search(rf'^{re.escape(name + labels)} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=0.05)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=25, help='запросов на поток в проверке пула')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='eventum_replica_')
+    primary_path, replica_path = os.path.join(work_dir, 'primary.db'), os.path.join(work_dir, 'replica.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{primary_path}"
+    os.environ['DATABASE_REPLICA_URL'] = f"sqlite:///{replica_path}"
+    os.environ['REPLICA_STICKY_SECONDS'] = str(STICKY_SECONDS)
+    # Пул заведомо меньше числа потоков, чтобы ожидание соединения было видно
+    os.environ['DB_POOL_SIZE'], os.environ['DB_MAX_OVERFLOW'] = '2', '0'
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('BROADCAST_WINDOW', '0')
+    app_module = prepare_app('primary.db')
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import reset_db
+    from flask_jwt_extended import create_access_token
+    from models import Comment, Notification, Post
+    app, db = app_module.app, app_module.db
+
+    with app.app_context():
+        reset_db.seed_database(reset_db.seed_counts(args.scale), log=lambda message: None)
+        writer, reader = 'user_s000050', 'user_s000051'
+        headers = {user: {'Authorization': f"Bearer {create_access_token(identity=user)}"} for user in (writer, reader)}
+        post_id = db.session.query(Comment.post_id).group_by(Comment.post_id).order_by(db.func.count().desc()).limit(1).scalar()
+        root_id = db.session.query(Comment.id).filter(Comment.post_id == post_id, Comment.parent_id.is_(None)).limit(1).scalar()
+        recipient = db.session.query(Notification.recipient_id).limit(1).scalar()
+        headers['recipient'] = {'Authorization': f"Bearer {create_access_token(identity=recipient)}"}
+        post_count = db.session.query(db.func.count(Post.id)).scalar()
+        counter = EngineCounter(db.engines)
+    snapshot(app_module, primary_path, replica_path)
+    client = app.test_client()
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+        if not ok: failures.append(name)
+
+    # Маршрутизация: чей движок выполнял SQL
+    routes = [
+        ('GET /api/posts', '/api/posts', reader, 'replica'),
+        ('GET /api/posts?limit=20', '/api/posts?limit=20', reader, 'replica'),
+        ('GET /api/posts/<id>/comments', f'/api/posts/{post_id}/comments', reader, 'replica'),
+        ('GET /api/posts/<id>/comments/tree', f'/api/posts/{post_id}/comments/tree', reader, 'replica'),
+        ('GET /api/comments/<id>/replies', f'/api/comments/{root_id}/replies', reader, 'replica'),
+        ('GET /api/notifications', '/api/notifications?limit=20', 'recipient', 'replica'),
+        ('GET /api/events?sort=hot', '/api/events?sort=hot&limit=20', reader, 'replica'),
+        ('GET /api/events (date, cached)', '/api/events?limit=20', reader, 'primary'),
+        ('GET /api/user/me', '/api/user/me', reader, 'primary'),
+    ]
+    print(f"{'route':40s} {'primary':>8s} {'replica':>8s}")
+    for name, path, user, expected in routes:
+        app_module.event_cards.invalidate()
+        counter.take()
+        response = client.get(path, headers=headers[user])
+        response.get_data()
+        response.close()
+        primary, replica = counter.take()
+        print(f"{name:40s} {primary:8d} {replica:8d}")
+        # Промахи кэша карточек событий всегда читаются с основной БД
+        if expected == 'replica': ok = replica > 0 and (primary == 0 or name.startswith('GET /api/events'))
+        else: ok = replica == 0 and primary > 0
+        check(f"{name} -> {expected}", response.status_code == 200 and ok, f"status {response.status_code}")
+
+    # Запись - на основной БД; автор видит ее сразу, остальные - после догонки реплики
+    counter.take()
+    response = client.post('/api/posts', json={'content': 'Пост для проверки реплики'}, headers=headers[writer])
+    new_post_id = response.get_json()['id']
+    primary, replica = counter.take()
+    check('POST /api/posts -> primary', response.status_code == 201 and replica == 0 and primary > 0)
+
+    def sees_post(user):
+        result = client.get('/api/posts', headers=headers[user])
+        ids = {p['id'] for p in result.get_json()}
+        result.close()
+        return new_post_id in ids
+
+    check('writer reads own post (sticky primary)', sees_post(writer))
+    check('reader does not see it on the lagging replica', not sees_post(reader))
+    time.sleep(STICKY_SECONDS + 0.1)
+    check('writer is back on the replica after the sticky window', not sees_post(writer))
+    snapshot(app_module, primary_path, replica_path)
+    check('reader sees it once the replica catches up', sees_post(reader))
+    check('replica has every post', len(client.get('/api/posts', headers=headers[reader]).get_json()) == post_count + 1)
+
+    # Пул: threads параллельных чтений на пул из двух соединений
+    errors = []
+
+    def worker():
+        thread_client = app.test_client()
+        for _ in range(args.requests):
+            result = thread_client.get('/api/posts?limit=20&sort=hot', headers=headers[reader])
+            if result.status_code != 200: errors.append(result.status_code)
+            result.close()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in workers: thread.start()
+    for thread in workers: thread.join()
+    elapsed = time.perf_counter() - started
+    metrics = client.get('/metrics').get_data(as_text=True)
+    pool = '{pool="replica"}'
+    waits = metric_value(metrics, 'eventum_db_pool_wait_seconds_count', pool)
+    wait_sum = metric_value(metrics, 'eventum_db_pool_wait_seconds_sum', pool)
+    timeouts = metric_value(metrics, 'eventum_db_pool_timeouts_total', pool)
+    slow_waits = waits - metric_value(metrics, 'eventum_db_pool_wait_seconds_bucket', '{pool="replica",le="0.0005"}')
+    print(f"{args.threads} threads x {args.requests} requests in {elapsed:.2f}s; replica checkouts {waits:.0f}, "
+          f"mean wait {wait_sum / max(waits, 1) * 1000:.2f}ms, waits over 0.5ms {slow_waits:.0f}, timeouts {timeouts:.0f}")
+    check('concurrent reads on a 2-connection pool', not errors, f"{len(errors)} errors")
+    check('pool wait time is exported', waits >= args.threads * args.requests and timeouts == 0)
+    check('pool gauges are exported', 'eventum_db_pool_replica_size 2' in metrics and 'eventum_db_pool_primary_size 2' in metrics)
+
+    print('OK: reads routed to the replica, writes and read-your-writes on the primary' if not failures else f"FAIL: {', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Socket.IO на нескольких процессах: подключенные клиенты и задержка рассылки в комнату.
+
+Запуск: python benchmarks/bench_socketio.py --workers 1,2,4 --clients 200 --messages 50
+Для каждого числа воркеров поднимается локальный брокер (UnixSocketBroker) и N
+процессов socketio.run с SOCKETIO_MESSAGE_QUEUE=unix://... на общей SQLite.
+Клиенты (long-polling) распределяются по воркерам по кругу и входят в комнату поста;
+комментарии публикуются через HTTP всегда в воркер 0, так что доставка остальным
+идет через очередь. Задержка - от отправки POST до получения new_comment клиентом.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_utils import BACKEND_DIR, PollingClient, percentile, prepare_app, wait_for_port
+
+
+def serve(args):
+    os.chdir(args.workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+    app_module.socketio.run(app_module.app, host='127.0.0.1', port=args.port, log_output=False)
+
+
+class Listener:
+    def __init__(self, port):
+        self.client = PollingClient(port)
+        self.client.call('join_post', {'postId': 'post_bench'})
+        self.received = {}
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped:
+            try:
+                packets = self.client.poll()
+            except OSError:
+                return
+            now = time.perf_counter()
+            for name, data in PollingClient.events(packets):
+                if name == 'new_comment':
+                    self.received[data['content']] = now
+
+
+def run(args, workers, token, port_base):
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='eventum_broker_'), 'socketio.sock')
+    from realtime import UnixSocketBroker
+    broker = UnixSocketBroker(socket_path)
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    env = dict(os.environ, SOCKETIO_MESSAGE_QUEUE=f"unix://{socket_path}")
+    ports = [port_base + i for i in range(workers)]
+    servers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port), '--workdir', os.getcwd()], env=env)
+               for port in ports]
+    listeners = []
+    try:
+        for port in ports:
+            wait_for_port(port)
+        started = time.perf_counter()
+        for index in range(args.clients):
+            listeners.append(Listener(ports[index % workers]))
+        connect_seconds = time.perf_counter() - started
+
+        publisher = http.client.HTTPConnection('127.0.0.1', ports[0], timeout=60)
+        sent = {}
+        for index in range(args.messages):
+            content = f"w{workers}-m{index}"
+            sent[content] = time.perf_counter()
+            publisher.request('POST', '/api/posts/post_bench/comments', body=json.dumps({'content': content}),
+                              headers={'Content-Type': 'application/json', 'Authorization': f"Bearer {token}"})
+            publisher.getresponse().read()
+            time.sleep(args.interval / 1000)
+        deadline = time.time() + args.timeout
+        while time.time() < deadline and any(len(listener.received) < args.messages for listener in listeners):
+            time.sleep(0.05)
+    finally:
+        for listener in listeners:
+            listener.stopped = True
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait()
+        broker.shutdown(); broker.server_close()
+
+    latencies = []
+    remote_latencies = []
+    for index, listener in enumerate(listeners):
+        for content, received_at in listener.received.items():
+            latency = received_at - sent[content]
+            latencies.append(latency)
+            if index % workers:
+                remote_latencies.append(latency)
+    expected = args.clients * args.messages
+    print(f"[workers={workers}] clients: {len(listeners)} (connected in {connect_seconds:.1f}s), "
+          f"delivered: {len(latencies)}/{expected}, broker frames: {broker.relayed}")
+    print(f"[workers={workers}]   broadcast latency p50: {percentile(latencies, 0.5) * 1000:.1f}ms, "
+          f"p99: {percentile(latencies, 0.99) * 1000:.1f}ms, max: {max(latencies or [0]) * 1000:.1f}ms")
+    if remote_latencies:
+        print(f"[workers={workers}]   via queue (clients on workers 1..{workers - 1}) p50: "
+              f"{percentile(remote_latencies, 0.5) * 1000:.1f}ms, p99: {percentile(remote_latencies, 0.99) * 1000:.1f}ms")
+    return len(latencies) == expected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default='1,2,4', help='список числа процессов через запятую')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=20, help='мс между комментариями')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args)
+
+    # Общая база для всех процессов: схема и данные создаются здесь, воркеры только подключаются
+    app_module = prepare_app('bench_socketio.db')
+    from models import User, Post
+    from flask_jwt_extended import create_access_token
+    with app_module.app.app_context():
+        app_module.db.session.add(User(id='user_author', name='Author', username='author', email='author@bench', password_hash='x'))
+        app_module.db.session.add(Post(id='post_bench', author_id='user_author', author_name='Author', content='bench'))
+        app_module.db.session.commit()
+        token = create_access_token(identity='user_author')
+
+    print(f"clients: {args.clients}, messages: {args.messages} every {args.interval:.0f}ms, queue: unix socket broker")
+    ok = True
+    for offset, workers in enumerate(int(value) for value in args.workers.split(',')):
+        ok = run(args, workers, token, args.port + offset * 20) and ok
+    print('OK: every client received every broadcast' if ok else 'FAIL: broadcasts lost')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Большие списки: пиковая память и задержка потоковой отдачи против сборки списка целиком.
+
+Запуск: python benchmarks/bench_streaming.py --rows 50000
+Для каждого эндпоинта сравниваются прежний способ (весь результат в список и jsonify)
+и потоковый слой streaming.py: пик памяти Python (tracemalloc), время до первого байта,
+полное время и размер тела без сжатия, с gzip и с brotli. Проверяется, что данные
+совпадают, а пик памяти потока хотя бы вдвое ниже.
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+import tracemalloc
+
+from bench_utils import prepare_app
+
+
+def seed(app_module, rows):
+    db = app_module.db
+    from models import User
+    base = datetime.datetime(2025, 1, 1)
+    events, posts, comments, notifications, tickets = (db.metadata.tables[name] for name in
+                                                       ('events', 'posts', 'comments', 'notifications', 'tickets'))
+    with app_module.app.app_context():
+        db.session.add(User(id='user_bench', name='Bench User', username='bench', email='bench@bench', password_hash='x'))
+        db.session.flush()
+        step = 5000
+        for start in range(0, rows, step):
+            chunk = range(start, min(rows, start + step))
+            db.session.execute(events.insert(), [{
+                "id": f"event_{i:07d}", "title": f"Событие номер {i}", "full_description": "Описание " * 20,
+                "organizer_id": 'user_bench', "organizer_name": 'Bench', "vibe": 'chill', "district": 'Алмалинский',
+                "age_limit": 0, "tags": ['music', 'live'], "categories": ['concert'], "price_value": 1000 + i % 50,
+                "location": 'Алматы', "image": '', "event_timestamp": 1_800_000_000_000 + i * 60_000, "views": i % 100,
+                "added_at": base, "engagement": 0, "hot_score": 0, "trend_score": 0} for i in chunk])
+            db.session.execute(posts.insert(), [{
+                "id": f"post_{i:07d}", "author_id": 'user_bench', "author_name": 'Bench', "content": "Текст поста " * 10,
+                "timestamp": base + datetime.timedelta(seconds=i), "upvotes": i % 7, "downvotes": i % 3, "comment_count": 0,
+                "age_limit": 0, "hot_score": 0, "trend_score": 0} for i in chunk])
+            db.session.execute(comments.insert(), [{
+                "id": f"comment_{i:07d}", "post_id": 'post_0000000', "author_id": 'user_bench', "author_name": 'Bench',
+                "content": "Комментарий " * 8, "depth": 0, "timestamp": base + datetime.timedelta(seconds=i)} for i in chunk])
+            db.session.execute(notifications.insert(), [{
+                "id": f"notif_{i:07d}", "recipient_id": 'user_bench', "type": 'new_event', "content": f"Новое событие {i}",
+                "related_id": f"event_{i:07d}", "is_read": False, "timestamp": base + datetime.timedelta(seconds=i)} for i in chunk])
+            db.session.execute(tickets.insert(), [{
+                "id": f"ticket_{i:07d}", "user_id": 'user_bench', "event_id": f"event_{i:07d}", "quantity": 1,
+                "purchase_date": base + datetime.timedelta(seconds=i)} for i in chunk])
+        db.session.commit()
+
+
+def legacy_body(app_module, path):
+    """Прежняя реализация: весь результат в память, затем jsonify."""
+    from flask import jsonify
+    from comment_tree import comment_to_dict
+    from models import Comment, Notification, Post
+    a = app_module
+    if path == '/api/events':
+        rows = a.build_event_feed_query().all()
+        return jsonify(a.load_event_cards([row.id for row in rows]))
+    if path == '/api/posts':
+        posts = Post.query.order_by(Post.timestamp.desc(), Post.id.desc()).all()
+        return jsonify(a.posts_to_dicts(posts, 'user_bench'))
+    if path.endswith('/comments'):
+        return jsonify([comment_to_dict(c) for c in Comment.query.filter_by(post_id='post_0000000').order_by(Comment.timestamp, Comment.id).all()])
+    if path == '/api/notifications':
+        query = Notification.query.filter_by(recipient_id='user_bench').order_by(Notification.timestamp.desc(), Notification.id.desc())
+        return jsonify([n.to_dict() for n in query.all()])
+    return jsonify(a.load_purchased_tickets('user_bench', missing_title="Unknown"))
+
+
+def measure(run):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for part in run():
+        if first_byte is None and part:
+            first_byte = time.perf_counter() - started
+        size += len(part)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, first_byte or elapsed, elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    app_module = prepare_app('bench_streaming.db')
+    app = app_module.app
+    started = time.perf_counter()
+    seed(app_module, args.rows)
+    print(f"seeded {args.rows} rows per table in {time.perf_counter() - started:.1f}s")
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        headers = {'Authorization': f"Bearer {create_access_token(identity='user_bench')}"}
+
+    paths = ['/api/events', '/api/posts', '/api/posts/post_0000000/comments', '/api/notifications', '/api/tickets/my']
+    client = app.test_client()
+    print(f"{'endpoint':34s} {'mode':8s} {'peak MiB':>9s} {'TTFB ms':>8s} {'total ms':>9s} {'KiB':>9s}")
+    ok = True
+    for path in paths:
+        def run_legacy():
+            # Кэш карточек сбрасывается, чтобы обе реализации честно ходили в БД
+            app_module.event_cards.invalidate()
+            with app.test_request_context(path, headers=headers):
+                yield legacy_body(app_module, path).get_data()
+
+        def make_stream(encoding):
+            def run_stream():
+                app_module.event_cards.invalidate()
+                request_headers = dict(headers, **({'Accept-Encoding': encoding} if encoding else {}))
+                response = client.get(path, headers=request_headers, buffered=False)
+                try:
+                    yield from response.response
+                finally:
+                    response.close()
+            return run_stream
+
+        runs = [('jsonify', run_legacy), ('stream', make_stream(None)), ('gzip', make_stream('gzip')), ('br', make_stream('br'))]
+        results = {}
+        for mode, run in runs:
+            results[mode] = peak, first_byte, elapsed, size = measure(run)
+            print(f"{path:34s} {mode:8s} {peak / 2**20:9.1f} {first_byte * 1000:8.1f} {elapsed * 1000:9.1f} {size / 1024:9.0f}")
+        # Данные те же (jsonify экранирует кириллицу, поэтому сравниваются разобранные тела),
+        # а пик памяти потока ограничен пачкой, а не всем списком
+        same = json.loads(b''.join(run_legacy())) == json.loads(b''.join(make_stream(None)()))
+        if not same or results['stream'][0] * 2 > results['jsonify'][0]:
+            print(f"  FAIL: {path} stream body/peak vs jsonify")
+            ok = False
+    print('OK: streamed bodies match and peak memory is bounded' if ok else 'FAIL: see above')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Итоги организатора: сходятся с сырыми данными под конкурентной нагрузкой и читаются за O(1).
+
+Запуск: TMPDIR=/dev/shm python benchmarks/bench_summaries.py --users 2000 --events 50 --threads 8
+Postgres: DATABASE_URL=postgresql://.../eventum_bench python benchmarks/bench_summaries.py (база пересоздается!)
+
+1. consistency - потоки вперемешку покупают билеты, переключают избранное и смотрят
+   события через HTTP; после сброса буфера просмотров итоги организатора и событий
+   должны совпасть с подсчетом по tickets, favorites и events.views, а
+   rebuild_summaries - не найти расхождений;
+2. scaling - билетов у организатора становится все больше; GET /api/organizer/summary
+   должен оставаться одним запросом с почти постоянной задержкой, в отличие от
+   агрегата по сырым таблицам, который здесь замеряется для сравнения.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import event as sa_event
+
+from bench_utils import BACKEND_DIR, percentile, prepare_app
+
+SCALING_STEPS = (0.01, 0.1, 1.0)
+
+
+def run_threads(threads, jobs, handle):
+    lock = threading.Lock()
+    position = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(jobs): return
+                job = jobs[position[0]]; position[0] += 1
+            handle(job)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers: thread.start()
+    for thread in workers: thread.join()
+    return time.perf_counter() - started
+
+
+def timed(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 0.5) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--actions', type=int, default=6000, help='действий в фазе consistency')
+    parser.add_argument('--repeat', type=int, default=50, help='замеров на шаг в фазе scaling')
+    parser.add_argument('--random-seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+    os.environ.setdefault('SLOW_QUERY_MS', '100000')
+    app_module = prepare_app('bench_summaries.db')
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from flask_jwt_extended import create_access_token
+    from models import Event, EventSummary, Ticket, User, favorites
+    from summaries import load_organizer_summary, rebuild_summaries
+    app, db = app_module.app, app_module.db
+    rng = random.Random(args.random_seed)
+
+    user_ids = [f"user_m{i:06d}" for i in range(args.users)]
+    event_ids = [f"event_m{i:04d}" for i in range(args.events)]
+    prices = {event_id: rng.choice([0, 0, 1500, 2500, 4990.5]) for event_id in event_ids}
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [{"id": user_id, "name": user_id, "username": user_id, "email": f"{user_id}@bench",
+                                                      "password_hash": 'x', "user_type": 'organizer' if user_id == 'organizer' else 'explorer'}
+                                                     for user_id in ['organizer'] + user_ids])
+        db.session.commit()
+        organizer_headers = {'Authorization': f"Bearer {create_access_token(identity='organizer')}"}
+        headers = {user_id: {'Authorization': f"Bearer {create_access_token(identity=user_id)}"} for user_id in user_ids}
+    client = app.test_client()
+    for event_id in event_ids:
+        response = client.post('/api/events', json={'title': event_id, 'priceValue': prices[event_id]}, headers=organizer_headers)
+        assert response.status_code == 201, response.get_json()
+    with app.app_context():
+        # id событиям выдает приложение
+        event_ids = [row.id for row in db.session.query(Event.id).filter(Event.organizer_id == 'organizer').order_by(Event.added_at, Event.id)]
+        prices = {row.id: row.price_value for row in db.session.query(Event.id, Event.price_value)}
+        db.session.remove()
+    failures = []
+
+    # 1. Конкурентные покупки, избранное и просмотры
+    jobs = [(rng.choice(('buy', 'favorite', 'favorite', 'view', 'view', 'view')), rng.choice(user_ids), rng.choice(event_ids), i)
+            for i in range(args.actions)]
+    statuses = {}
+    status_lock = threading.Lock()
+
+    def act(job):
+        kind, user_id, event_id, i = job
+        thread_client = app.test_client()
+        if kind == 'buy':
+            response = thread_client.post('/api/tickets/buy', json={'eventId': event_id, 'quantity': 1 + i % 3}, headers=headers[user_id])
+        elif kind == 'favorite':
+            response = thread_client.post('/api/user/favorite', json={'eventId': event_id}, headers=headers[user_id])
+        else:
+            response = thread_client.post(f"/api/events/{event_id}/view", headers=headers[user_id],
+                                          environ_base={'REMOTE_ADDR': f"10.{i // 62500 % 250}.{i // 250 % 250}.{i % 250 + 1}"})
+        with status_lock:
+            key = f"{kind} {response.status_code}"
+            statuses[key] = statuses.get(key, 0) + 1
+
+    elapsed = run_threads(args.threads, jobs, act)
+    with app.app_context():
+        app_module.view_ingestor.flush()
+        tickets, revenue = db.session.query(db.func.coalesce(db.func.sum(Ticket.quantity), 0),
+                                            db.func.coalesce(db.func.sum(Ticket.quantity * Event.price_value), 0)).join(
+            Event, Event.id == Ticket.event_id).filter(Event.organizer_id == 'organizer').one()
+        saved = db.session.query(db.func.count()).select_from(favorites).join(Event, Event.id == favorites.c.event_id).filter(
+            Event.organizer_id == 'organizer').scalar()
+        views = db.session.query(db.func.coalesce(db.func.sum(Event.views), 0)).filter(Event.organizer_id == 'organizer').scalar()
+        summary = load_organizer_summary('organizer')
+        per_event = {row.event_id: (row.tickets_sold, row.favorites, row.views) for row in EventSummary.query}
+        raw_per_event = {event_id: (0, 0, 0) for event_id in event_ids}
+        for event_id, sold in db.session.query(Ticket.event_id, db.func.sum(Ticket.quantity)).group_by(Ticket.event_id):
+            raw_per_event[event_id] = (sold, 0, 0)
+        for event_id, count in db.session.query(favorites.c.event_id, db.func.count()).group_by(favorites.c.event_id):
+            raw_per_event[event_id] = (raw_per_event[event_id][0], count, 0)
+        for event_id, count in db.session.query(Event.id, Event.views):
+            raw_per_event[event_id] = raw_per_event[event_id][:2] + (count or 0,)
+        rebuilt = rebuild_summaries(); db.session.commit()
+        db.session.remove()
+    print(f"consistency {args.actions} actions in {elapsed:.2f}s ({args.actions / elapsed:.0f}/s): " +
+          ', '.join(f"{key}: {count}" for key, count in sorted(statuses.items())))
+    print(f"{'':11s} summary: tickets {summary['ticketsSold']}, revenue {summary['revenue']}, favorites {summary['favorites']}, views {summary['views']}")
+    print(f"{'':11s} raw:     tickets {tickets}, revenue {round(revenue, 2)}, favorites {saved}, views {views}; rebuild drift {rebuilt['drifted']}")
+    if (summary['ticketsSold'], summary['favorites'], summary['views']) != (tickets, saved, views) or abs(summary['revenue'] - revenue) > 0.01:
+        failures.append('organizer summary differs from raw tables')
+    if per_event != raw_per_event: failures.append('event summaries differ from raw tables')
+    if rebuilt['drifted']: failures.append(f"rebuild found {rebuilt['drifted']} drifted events")
+    if any(key.endswith(' 500') for key in statuses): failures.append('5xx responses')
+
+    # 2. Задержка дашборда при росте числа билетов
+    pairs = [(user_id, event_id) for event_id in event_ids for user_id in user_ids]
+    with app.app_context():
+        sold_pairs = set(db.session.query(Ticket.user_id, Ticket.event_id))
+        db.session.remove()
+    pairs = [pair for pair in pairs if pair not in sold_pairs]
+    rng.shuffle(pairs)
+    statements = []
+    with app.app_context():
+        sa_event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+
+    def raw_dashboard():
+        with app.app_context():
+            db.session.query(db.func.sum(Ticket.quantity), db.func.sum(Ticket.quantity * Event.price_value)).join(
+                Event, Event.id == Ticket.event_id).filter(Event.organizer_id == 'organizer').one()
+            db.session.remove()
+
+    inserted = 0
+    latencies = []
+    print(f"{'tickets':>10s} {'summary p50 ms':>15s} {'queries':>8s} {'raw scan p50 ms':>16s}")
+    for fraction in SCALING_STEPS:
+        target = int(len(pairs) * fraction)
+        with app.app_context():
+            batch = [{"id": f"tick_m{i:08d}", "event_id": event_id, "user_id": user_id, "quantity": 1}
+                     for i, (user_id, event_id) in enumerate(pairs[inserted:target], start=inserted)]
+            for start in range(0, len(batch), 5000):
+                db.session.execute(Ticket.__table__.insert(), batch[start:start + 5000])
+            rebuild_summaries(); db.session.commit(); db.session.remove()
+        inserted = target
+        statements.clear()
+        response = client.get('/api/organizer/summary', headers=organizer_headers)
+        queries = len(statements)
+        summary_ms = timed(args.repeat, lambda: client.get('/api/organizer/summary', headers=organizer_headers))
+        raw_ms = timed(max(3, args.repeat // 10), raw_dashboard)
+        print(f"{response.get_json()['ticketsSold']:10d} {summary_ms:15.2f} {queries:8d} {raw_ms:16.2f}")
+        latencies.append(summary_ms)
+        if queries != 1: failures.append(f"summary took {queries} queries")
+    if latencies[-1] > latencies[0] * 2 + 1.0:
+        failures.append(f"summary latency grew with tickets: {latencies[0]:.2f}ms -> {latencies[-1]:.2f}ms")
+
+    for failure in failures: print(f"  FAIL: {failure}")
+    print('OK: summaries match raw data and stay O(1)' if not failures else 'FAIL: see above')
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Распродажа билетов при высокой конкуренции: нет перепродажи, брони истекают, повторы идемпотентны.
+
+Запуск: TMPDIR=/dev/shm python benchmarks/bench_tickets.py --users 4000 --capacity 2000 --threads 16
+Postgres: DATABASE_URL=postgresql://.../eventum_bench python benchmarks/bench_tickets.py (база пересоздается!)
+
+Три фазы на одном событии каждая, спрос втрое выше вместимости:
+1. drop - покупки через /api/tickets/buy с Idempotency-Key, часть клиентов повторяет
+   запрос с тем же ключом (в том числе параллельно с первой попыткой);
+2. holds - брони на секунду, половина выкупается, остальные брошены; после истечения
+   новая волна покупателей забирает освободившиеся места;
+3. inventory - inventory.purchase напрямую, без HTTP: пропускная способность самого
+   условного UPDATE.
+После каждой фазы: проданное == сумме билетов <= capacity, удержанных мест не осталось,
+на каждый ключ идемпотентности - не больше одного билета, ответов 5xx нет.
+
+На SQLite вся база блокируется одним писателем: под нагрузкой запросы ждут блокировку,
+и после нескольких неудачных попыток сервер отвечает 503 с Retry-After. Клиенты
+бенчмарка, как и настоящие, повторяют такой запрос (с тем же Idempotency-Key);
+503 после BUSY_RETRIES повторов считается ошибкой.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from bench_utils import BACKEND_DIR, prepare_app
+
+HOLD_SECONDS = 1
+BUSY_RETRIES = 20
+
+
+def run_threads(threads, jobs, handle):
+    """Раздает jobs потокам из общей очереди; возвращает время выполнения."""
+    lock = threading.Lock()
+    position = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(jobs): return
+                job = jobs[position[0]]; position[0] += 1
+            handle(job)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers: thread.start()
+    for thread in workers: thread.join()
+    return time.perf_counter() - started
+
+
+def post_until_served(client, url, results, **kwargs):
+    """POST с повтором ответов 503 (база занята), как у клиента, уважающего Retry-After."""
+    for attempt in range(BUSY_RETRIES):
+        response = client.post(url, **kwargs)
+        if response.status_code != 503:
+            break
+        results.record_busy()
+        time.sleep(0.05 * (attempt + 1))
+    return response
+
+
+def status_code(status):
+    # Статусы фазы броней записаны как "hold 201"
+    return int(str(status).split()[-1]) if str(status).split()[-1].isdigit() else None
+
+
+class Results:
+    def __init__(self):
+        self.statuses = {}
+        self.tickets_by_key = {}
+        self.busy = 0
+        self._lock = threading.Lock()
+
+    def record_busy(self):
+        with self._lock:
+            self.busy += 1
+
+    def record(self, status, key=None, ticket_id=None):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if key and ticket_id: self.tickets_by_key.setdefault(key, set()).add(ticket_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=4000)
+    parser.add_argument('--capacity', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--retry-share', type=float, default=0.2, help='доля покупок, повторенных с тем же ключом')
+    parser.add_argument('--random-seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+    os.environ['TICKET_HOLD_SECONDS'] = str(HOLD_SECONDS)
+    # Освобождение броней проверяется на пути покупки, а не фоновой задачей
+    os.environ.setdefault('HOLD_RELEASE_INTERVAL', '3600')
+    app_module = prepare_app('bench_tickets.db')
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from flask_jwt_extended import create_access_token
+    from inventory import InventoryError, purchase, release_expired_holds
+    from models import Event, Ticket, User
+    from database import is_lock_conflict
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    app, db = app_module.app, app_module.db
+    rng = random.Random(args.random_seed)
+
+    user_ids = [f"user_t{i:06d}" for i in range(args.users)]
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [{"id": user_id, "name": user_id, "username": user_id, "email": f"{user_id}@bench",
+                                                      "password_hash": 'x'} for user_id in ['organizer'] + user_ids])
+        for name, capacity in (('drop', args.capacity), ('holds', args.capacity // 4), ('inventory', args.capacity)):
+            db.session.add(Event(id=f"event_{name}", title=name, organizer_id='organizer', capacity=capacity, event_timestamp=0))
+        db.session.commit()
+        headers = {user_id: {'Authorization': f"Bearer {create_access_token(identity=user_id)}"} for user_id in user_ids}
+    failures = []
+
+    def verify(phase, event_id, results=None, elapsed=None, attempts=None):
+        with app.app_context():
+            capacity, sold, held = db.session.query(Event.capacity, Event.tickets_sold, Event.tickets_held).filter(Event.id == event_id).one()
+            ticket_sum, ticket_rows = db.session.query(db.func.coalesce(db.func.sum(Ticket.quantity), 0), db.func.count(Ticket.id)).filter(
+                Ticket.event_id == event_id).one()
+            db.session.remove()
+        rate = f", {attempts / elapsed:.0f} attempts/s" if elapsed else ''
+        statuses = ', '.join(f"{status}: {count}" for status, count in sorted((results.statuses if results else {}).items(), key=str))
+        print(f"{phase:10s} capacity {capacity}, sold {sold}, ticket sum {ticket_sum} in {ticket_rows} rows, held {held}{rate}")
+        if results and results.busy: statuses += f"; retried after 503/lock conflict: {results.busy}"
+        if statuses: print(f"{'':10s} {statuses}")
+        problems = []
+        if sold != ticket_sum: problems.append(f"sold {sold} != tickets {ticket_sum}")
+        if sold + held > capacity: problems.append(f"oversold: {sold} + {held} held > {capacity}")
+        if held: problems.append(f"{held} seats still held")
+        if results:
+            if any((status_code(status) or 0) >= 500 for status in results.statuses): problems.append('5xx responses')
+            duplicated = [key for key, ids in results.tickets_by_key.items() if len(ids) > 1]
+            if duplicated: problems.append(f"{len(duplicated)} idempotency keys produced several tickets")
+        for problem in problems: print(f"  FAIL: {phase}: {problem}")
+        failures.extend(problems)
+        return sold
+
+    # 1. Распродажа через HTTP с повторами
+    orders = [{"user": user_id, "key": uuid.uuid4().hex, "quantity": rng.choice([1, 1, 1, 2, 2, 3, 4])} for user_id in user_ids]
+    jobs = orders + rng.sample(orders, int(len(orders) * args.retry_share))
+    rng.shuffle(jobs)
+    drop_results = Results()
+
+    def buy(order):
+        client = app.test_client()
+        response = post_until_served(client, '/api/tickets/buy', drop_results, json={"eventId": 'event_drop', "quantity": order["quantity"]},
+                                     headers=dict(headers[order["user"]], **{'Idempotency-Key': order["key"]}))
+        body = response.get_json(silent=True) or {}
+        drop_results.record(response.status_code, order["key"], body.get('ticket', {}).get('id'))
+
+    elapsed = run_threads(args.threads, jobs, buy)
+    verify('drop', 'event_drop', drop_results, elapsed, len(jobs))
+    if drop_results.statuses.get(409, 0) == 0: failures.append('drop: demand never exceeded capacity')
+
+    # 2. Брони: половина выкупается, остальные истекают и возвращаются следующей волне
+    hold_capacity = args.capacity // 4
+    holders, late_buyers = user_ids[:hold_capacity * 2], user_ids[hold_capacity * 2:hold_capacity * 4]
+    hold_quantities = {user_id: rng.choice([1, 2]) for user_id in holders}
+    hold_results = Results()
+
+    def hold_and_maybe_buy(user_id):
+        client = app.test_client()
+        response = post_until_served(client, '/api/tickets/holds', hold_results,
+                                     json={"eventId": 'event_holds', "quantity": hold_quantities[user_id]}, headers=headers[user_id])
+        hold_results.record(f"hold {response.status_code}")
+        if response.status_code == 201 and int(user_id[-6:]) % 2 == 0:
+            bought = post_until_served(client, '/api/tickets/buy', hold_results,
+                                       json={"eventId": 'event_holds', "holdId": response.get_json()['id']}, headers=headers[user_id])
+            hold_results.record(bought.status_code)
+
+    def late_buy(user_id):
+        response = post_until_served(app.test_client(), '/api/tickets/buy', hold_results, json={"eventId": 'event_holds', "quantity": 1},
+                                     headers=headers[user_id])
+        hold_results.record(response.status_code)
+
+    elapsed = run_threads(args.threads, holders, hold_and_maybe_buy)
+    with app.app_context():
+        sold_before, held_before = db.session.query(Event.tickets_sold, Event.tickets_held).filter(Event.id == 'event_holds').one()
+        db.session.remove()
+    time.sleep(HOLD_SECONDS + 0.2)
+    elapsed += run_threads(args.threads, late_buyers, late_buy)
+    with app.app_context():
+        # Брони, которые ни одна покупка не задела, освобождает фоновая задача; здесь - ее шаг вручную
+        release_expired_holds(); db.session.commit(); db.session.remove()
+    sold_after = verify('holds', 'event_holds', hold_results, elapsed, len(holders) + len(late_buyers))
+    print(f"{'':10s} before expiry: sold {sold_before}, held {held_before}; late buyers got {sold_after - sold_before} seats")
+    if not held_before or sold_after <= sold_before: failures.append('holds: abandoned seats were not resold')
+
+    # 3. Сама операция списания, без HTTP и JWT
+    inventory_results = Results()
+
+    def buy_direct(user_id):
+        with app.app_context():
+            try:
+                # Тот же повтор при конфликте блокировок, что у представления покупки
+                for attempt in range(BUSY_RETRIES):
+                    try:
+                        purchase(user_id, 'event_inventory', 1); db.session.commit()
+                        inventory_results.record(201)
+                        break
+                    except OperationalError as e:
+                        db.session.rollback()
+                        if not is_lock_conflict(e): raise
+                        inventory_results.record_busy()
+                        time.sleep(0.05 * (attempt + 1))
+                else:
+                    inventory_results.record(503)
+            except InventoryError as e:
+                db.session.rollback(); inventory_results.record(e.status_code)
+            except IntegrityError:
+                db.session.rollback(); inventory_results.record('duplicate')
+            finally:
+                db.session.remove()
+
+    elapsed = run_threads(args.threads, user_ids, buy_direct)
+    verify('inventory', 'event_inventory', inventory_results, elapsed, len(user_ids))
+
+    print('OK: no overselling, holds released, retries idempotent' if not failures else 'FAIL: see above')
+    return 0 if not failures else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prepare_app(db_name):
+    """Поднимает app.py на отдельной БД. Без DATABASE_URL берется временный SQLite-файл.
+
+    Импорт app должен идти после этой функции: URI читается при импорте.
+    """
+    work_dir = tempfile.mkdtemp(prefix='eventum_bench_')
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, db_name)}"
+    # app.py создает папки uploads относительно текущей директории
+    os.chdir(work_dir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+    return app_module
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+class PollingClient:
+    """Минимальный клиент Socket.IO поверх Engine.IO long-polling (только стандартная библиотека).
+
+    Два HTTP-соединения: одно висит в long-poll, второе отправляет пакеты,
+    так что чтение можно вести из отдельного потока.
+    """
+
+    def __init__(self, port, host='127.0.0.1', timeout=60):
+        self.sid = None
+        self._poll_connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        self._send_connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        self.sid = json.loads(self._request(self._poll_connection, 'GET')[1:])['sid']
+        self.send('40')
+        self.poll()
+        self.ack_id = 0
+
+    def _request(self, connection, method, body=None):
+        path = '/socket.io/?EIO=4&transport=polling' + (f'&sid={self.sid}' if self.sid else '')
+        connection.request(method, path, body=body.encode() if body else None,
+                           headers={'Content-Type': 'text/plain;charset=UTF-8'} if body else {})
+        return connection.getresponse().read().decode()
+
+    def send(self, packet):
+        self._request(self._send_connection, 'POST', packet)
+
+    def poll(self):
+        packets = self._request(self._poll_connection, 'GET').split('\x1e')
+        if '2' in packets:
+            self.send('3')
+        return packets
+
+    @staticmethod
+    def events(packets):
+        """(имя, данные) для пакетов-событий '42[...]'."""
+        for packet in packets:
+            if packet.startswith('42['):
+                name, *args = json.loads(packet[2:])
+                yield name, args[0] if args else None
+
+    def call(self, event, data):
+        """Событие с подтверждением; возвращает время до ack в секундах."""
+        self.ack_id += 1
+        started = time.perf_counter()
+        self.send(f'42{self.ack_id}' + json.dumps([event, data]))
+        while not any(packet.startswith(f'43{self.ack_id}') for packet in self.poll()):
+            pass
+        return time.perf_counter() - started
+
+    def close(self):
+        try:
+            self.send('41')
+        finally:
+            self._poll_connection.close()
+            self._send_connection.close()
@@ -0,0 +1,87 @@
+"""Устойчивая скорость приема просмотров через POST /api/events/<id>/view.
+
+Запуск: python benchmarks/bench_views.py --mode buffered --seconds 10 --workers 8
+Сравнение с записью каждого просмотра: --mode direct
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import prepare_app, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['buffered', 'direct'], default='buffered')
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    os.environ['VIEW_INGEST_MODE'] = args.mode
+    os.environ['VIEW_FLUSH_INTERVAL'] = str(args.flush_interval)
+    app_module = prepare_app(f"bench_views_{args.mode}.db")
+    app, db, ingestor = app_module.app, app_module.db, app_module.view_ingestor
+    from models import User, Event, EventView
+
+    with app.app_context():
+        db.session.add(User(id='user_org', name='Org', username='org', email='org@bench', password_hash='x'))
+        event_ids = [f"event_b{i}" for i in range(args.events)]
+        for event_id in event_ids:
+            db.session.add(Event(id=event_id, title=event_id, organizer_id='user_org', event_timestamp=0))
+        db.session.commit()
+
+    # Фоновый сброс в обычном потоке вместо green thread socketio
+    stop = threading.Event()
+
+    def flush_loop():
+        while not stop.wait(args.flush_interval):
+            with app.app_context():
+                ingestor.flush()
+                db.session.remove()
+
+    if args.mode == 'buffered':
+        ingestor._flusher_started = True
+        threading.Thread(target=flush_loop, daemon=True).start()
+
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+
+    def run_worker(worker_index):
+        client = app.test_client()
+        sequence = 0
+        while time.perf_counter() < deadline:
+            sequence += 1
+            # Каждый запрос - новый анонимный зритель, чтобы не упираться в дедупликацию и лимит по IP
+            ip_address = f"10.{worker_index}.{(sequence >> 8) & 255}.{sequence & 255}"
+            event_id = event_ids[sequence % len(event_ids)]
+            started = time.perf_counter()
+            client.post(f"/api/events/{event_id}/view", environ_base={'REMOTE_ADDR': ip_address})
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(run_worker, range(args.workers)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    with app.app_context():
+        ingestor.flush()
+        total_views = db.session.query(db.func.sum(Event.views)).scalar() or 0
+        stored_rows = EventView.query.count()
+
+    stats = ingestor.stats()
+    print(f"mode: {args.mode}, requests: {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} views/s)")
+    print(f"latency p50: {percentile(latencies, 0.5) * 1000:.2f}ms, p99: {percentile(latencies, 0.99) * 1000:.2f}ms")
+    print(f"flushes: {stats['flushes']}, Event.views total: {total_views}, event_views rows: {stored_rows}")
+    consistent = total_views == stored_rows
+    print('OK: counters match stored views' if consistent else 'FAIL: counters drifted from stored views')
+    return 0 if consistent else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Параллельные голоса за один пост: проверяет, что счетчики сходятся точно.
+
+Запуск: python benchmarks/bench_votes.py --voters 500 --votes 3000 --workers 16
+
+На SQLite все голоса ждут одну блокировку базы; после нескольких неудачных попыток
+сервер отвечает 503 с Retry-After, и голосующий повторяет тот же голос, как настоящий
+клиент. Ошибкой считается любой другой ответ и 503 после BUSY_RETRIES повторов.
+"""
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import prepare_app, percentile
+
+BUSY_RETRIES = 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--voters', type=int, default=500)
+    parser.add_argument('--votes', type=int, default=3000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app_module = prepare_app('bench_votes.db')
+    app, db = app_module.app, app_module.db
+    from models import User, Post, PostVote
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        author = User(id='user_author', name='Author', username='author', email='author@bench', password_hash='x')
+        db.session.add(author)
+        db.session.add(Post(id='post_hot', author_id=author.id, author_name=author.name, content='hot'))
+        voter_ids = [f"user_v{i}" for i in range(args.voters)]
+        for voter_id in voter_ids:
+            db.session.add(User(id=voter_id, name=voter_id, username=voter_id, email=f"{voter_id}@bench", password_hash='x'))
+        db.session.commit()
+        tokens = {voter_id: create_access_token(identity=voter_id) for voter_id in voter_ids}
+
+    # Каждый голосующий целиком живет в одном потоке, поэтому его итоговый голос известен заранее,
+    # а голоса разных людей идут вперемешку и бьют в одну строку posts
+    rng = random.Random(args.seed)
+    plans = {voter_id: [] for voter_id in voter_ids}
+    for _ in range(args.votes):
+        plans[rng.choice(voter_ids)].append(rng.choice(['up', 'down']))
+
+    expected = {}
+    for voter_id, plan in plans.items():
+        current = None
+        for vote_type in plan:
+            current = None if current == vote_type else vote_type
+        expected[voter_id] = current
+
+    latencies = []
+    errors = []
+    busy = []
+
+    def run_voter(voter_id):
+        client = app.test_client()
+        headers = {'Authorization': f"Bearer {tokens[voter_id]}"}
+        for vote_type in plans[voter_id]:
+            started = time.perf_counter()
+            for attempt in range(BUSY_RETRIES):
+                response = client.post('/api/posts/post_hot/vote', json={'type': vote_type}, headers=headers)
+                if response.status_code != 503:
+                    break
+                busy.append(1)
+                time.sleep(0.05 * (attempt + 1))
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(run_voter, voter_ids))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        post = db.session.get(Post, 'post_hot')
+        stored_up = PostVote.query.filter_by(post_id='post_hot', vote_type='up').count()
+        stored_down = PostVote.query.filter_by(post_id='post_hot', vote_type='down').count()
+        upvotes, downvotes = post.upvotes, post.downvotes
+    expected_up = sum(1 for v in expected.values() if v == 'up')
+    expected_down = sum(1 for v in expected.values() if v == 'down')
+
+    print(f"votes: {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} votes/s), errors: {len(errors)}, retried after 503: {len(busy)}")
+    print(f"latency p50: {percentile(latencies, 0.5) * 1000:.1f}ms, p99: {percentile(latencies, 0.99) * 1000:.1f}ms")
+    print(f"counters: up={upvotes} down={downvotes}; rows: up={stored_up} down={stored_down}; expected: up={expected_up} down={expected_down}")
+    exact = (upvotes, downvotes) == (stored_up, stored_down) == (expected_up, expected_down)
+    if errors: print(f"FAIL: {len(errors)} votes answered {sorted(set(errors))}")
+    print('OK: counts are exact' if exact else 'FAIL: lost or duplicated votes')
+    return 0 if exact and not errors else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Проверка числа SQL-запросов на сериализацию профиля: оно не должно зависеть от размера коллекций.
+
+Запуск: python benchmarks/check_query_counts.py
+"""
+import sys
+
+from sqlalchemy import event
+
+from bench_utils import prepare_app
+
+
+def seed_user(db, models, suffix, collection_size):
+    User, Event, Ticket, Interest = models.User, models.Event, models.Ticket, models.Interest
+    user = User(id=f"user_{suffix}", name=f"User {suffix}", username=suffix, email=f"{suffix}@check", password_hash='x')
+    db.session.add(user)
+    for i in range(collection_size):
+        organizer = User(id=f"user_{suffix}_org{i}", name='Org', username=f"{suffix}_org{i}", email=f"{suffix}_org{i}@check", password_hash='x')
+        event_obj = Event(id=f"event_{suffix}_{i}", title=f"Event {i}", organizer_id=organizer.id, event_timestamp=i)
+        db.session.add_all([organizer, event_obj])
+        db.session.add(Ticket(event_id=event_obj.id, user_id=user.id, quantity=1))
+        user.saved_events.append(event_obj)
+        user.following.append(organizer)
+        interest = db.session.get(Interest, f"interest_{i}") or Interest(name=f"interest_{i}")
+        user.interests.append(interest)
+    db.session.commit()
+    return user.id
+
+
+def count_statements(app, db, func):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', on_execute)
+        try:
+            func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', on_execute)
+    return len(statements)
+
+
+def main():
+    app_module = prepare_app('check_query_counts.db')
+    app, db = app_module.app, app_module.db
+    import models
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        small_id = seed_user(db, models, 'small', 1)
+        large_id = seed_user(db, models, 'large', 40)
+        tokens = {user_id: create_access_token(identity=user_id) for user_id in (small_id, large_id)}
+
+    failures = []
+    for fields in ('', 'interests', 'savedEventIds,followingOrganizerIds', 'all'):
+        counts = {}
+        for user_id in (small_id, large_id):
+            client = app.test_client()
+            headers = {'Authorization': f"Bearer {tokens[user_id]}"}
+
+            def request_profile():
+                response = client.get(f"/api/user/me?fields={fields}", headers=headers)
+                assert response.status_code == 200, response.data
+
+            counts[user_id] = count_statements(app, db, request_profile)
+        label = fields or '(slim)'
+        print(f"GET /api/user/me fields={label}: 1 item -> {counts[small_id]} queries, 40 items -> {counts[large_id]} queries")
+        if counts[small_id] != counts[large_id]:
+            failures.append(label)
+
+    if failures:
+        print(f"FAIL: query count grows with collection size for: {', '.join(failures)}")
+        return 1
+    print('OK: query count is independent of collection size')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
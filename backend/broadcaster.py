@@ -0,0 +1,132 @@
+import threading
+import time
+
+# Раз в столько обновлений из памяти убираются комнаты без очереди и без недавних кадров
+SWEEP_EVERY = 1000
+
+
+class RoomState:
+    __slots__ = ('last_frame_at', 'scheduled', 'vote', 'comments', 'dropped')
+
+    def __init__(self):
+        self.last_frame_at = 0.0
+        self.scheduled = False
+        self.vote = None
+        self.comments = []
+        self.dropped = 0
+
+
+class RoomBroadcaster:
+    """Склеивает частые обновления комнаты поста в редкие кадры.
+
+    Тихая комната получает кадр сразу (передний фронт окна). Если кадр уже
+    уходил меньше interval назад, обновления копятся до конца окна: голоса за
+    пост схлопываются в одни итоги, комментарии уходят одним кадром; каждого
+    вида - не чаще max_frames_per_second кадров в секунду на комнату.
+    Backpressure: в очереди комнаты не больше max_pending комментариев, лишние
+    (самые старые) выбрасываются, и кадр сообщает клиенту, сколько перезагрузить.
+    window=0 - без склейки, каждый вызов сразу уходит кадром.
+    """
+
+    def __init__(self, socketio, window=0.1, max_frames_per_second=10, max_pending=200):
+        self.socketio = socketio
+        self.window = window
+        self.max_frames_per_second = max_frames_per_second
+        self.max_pending = max_pending
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.frames = 0
+        self.dropped = 0
+
+    @property
+    def interval(self):
+        if self.window <= 0:
+            return 0.0
+        return max(self.window, 1.0 / self.max_frames_per_second if self.max_frames_per_second else 0.0)
+
+    def vote_update(self, post_id, user_id, vote, delta, upvotes, downvotes):
+        room = str(post_id)
+        with self._lock:
+            self.updates += 1
+            state = self._rooms.setdefault(room, RoomState())
+            entry = state.vote
+            if entry is None:
+                entry = state.vote = {"postId": post_id, "votes": {}, "delta": {"upvotes": 0, "downvotes": 0}}
+            # Итоги абсолютные: в кадр идут последние, изменения голосов складываются
+            entry["votes"][user_id] = vote
+            entry["userId"], entry["vote"] = user_id, vote
+            entry["upvotes"], entry["downvotes"] = upvotes, downvotes
+            entry["delta"]["upvotes"] += delta.get('upvotes', 0)
+            entry["delta"]["downvotes"] += delta.get('downvotes', 0)
+            due = self._schedule(room, state)
+        if due:
+            self._flush(room)
+
+    def new_comment(self, post_id, comment):
+        room = str(post_id)
+        with self._lock:
+            self.updates += 1
+            state = self._rooms.setdefault(room, RoomState())
+            state.comments.append(comment)
+            if len(state.comments) > self.max_pending:
+                overflow = len(state.comments) - self.max_pending
+                del state.comments[:overflow]
+                state.dropped += overflow
+                self.dropped += overflow
+            due = self._schedule(room, state)
+        if due:
+            self._flush(room)
+
+    def _schedule(self, room, state):
+        """Под блокировкой: True - отправить сразу, иначе ставит отложенный сброс (один на комнату)."""
+        if self.updates % SWEEP_EVERY == 0:
+            self._sweep()
+        if state.scheduled:
+            return False
+        wait = state.last_frame_at + self.interval - time.monotonic()
+        if wait <= 0:
+            return True
+        state.scheduled = True
+        self.socketio.start_background_task(self._flush_later, room, wait)
+        return False
+
+    def _flush_later(self, room, wait):
+        self.socketio.sleep(wait)
+        self._flush(room)
+
+    def _flush(self, room):
+        with self._lock:
+            state = self._rooms.get(room)
+            if state is None:
+                return
+            vote, comments, dropped = state.vote, state.comments, state.dropped
+            state.vote, state.comments, state.dropped = None, [], 0
+            state.scheduled = False
+            state.last_frame_at = time.monotonic()
+            self.frames += (1 if vote else 0) + (1 if comments or dropped else 0)
+        if vote:
+            self.socketio.emit('vote_update', vote, room=room)
+        if len(comments) == 1 and not dropped:
+            # Одиночный комментарий - в прежнем формате
+            self.socketio.emit('new_comment', comments[0], room=room)
+        elif comments or dropped:
+            self.socketio.emit('new_comments', {"postId": room, "comments": comments, "dropped": dropped}, room=room)
+
+    def _sweep(self):
+        # Следующий кадр такой комнаты все равно ушел бы сразу, состояние не нужно
+        idle_before = time.monotonic() - self.interval
+        for room in [room for room, state in self._rooms.items()
+                     if not state.scheduled and not (state.vote or state.comments or state.dropped) and state.last_frame_at < idle_before]:
+            del self._rooms[room]
+
+    def flush_all(self):
+        with self._lock:
+            rooms = [room for room, state in self._rooms.items() if state.vote or state.comments or state.dropped]
+        for room in rooms:
+            self._flush(room)
+
+    def stats(self):
+        with self._lock:
+            return {"updates": self.updates, "frames": self.frames, "saved": self.updates - self.frames,
+                    "dropped": self.dropped, "rooms": len(self._rooms), "interval": self.interval}
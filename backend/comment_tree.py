@@ -0,0 +1,74 @@
+from sqlalchemy import func, tuple_
+
+from models import db, Comment
+from pagination import split_page
+
+MAX_TREE_DEPTH = 5
+MAX_REPLY_LIMIT = 50
+
+
+def comment_to_dict(c):
+    return {
+        "id": c.id, "postId": c.post_id, "authorId": c.author_id, "authorName": c.author_name,
+        "timestamp": c.timestamp.isoformat(), "content": c.content, "parentId": c.parent_id,
+        "depth": c.depth, "upvotes": c.upvotes, "downvotes": c.downvotes
+    }
+
+
+def comment_cursor_key(c):
+    return [c.timestamp.isoformat(), c.id]
+
+
+def page_comments(query, limit, cursor):
+    """Страница комментариев по ключу (timestamp, id) от старых к новым."""
+    query = query.order_by(Comment.timestamp, Comment.id)
+    if cursor:
+        query = query.filter(tuple_(Comment.timestamp, Comment.id) > tuple_(*cursor))
+    return split_page(query.limit(limit + 1).all(), limit, comment_cursor_key)
+
+
+def load_children(parent_ids, reply_limit):
+    """Первые reply_limit + 1 ответов для каждого родителя одним запросом по индексу (parent_id, timestamp, id)."""
+    position = func.row_number().over(partition_by=Comment.parent_id, order_by=(Comment.timestamp, Comment.id)).label('position')
+    ranked = db.select(Comment.id, position).where(Comment.parent_id.in_(parent_ids)).subquery()
+    rows = db.session.query(Comment).join(ranked, ranked.c.id == Comment.id).filter(ranked.c.position <= reply_limit + 1).order_by(Comment.parent_id, Comment.timestamp, Comment.id).all()
+    children = {}
+    for c in rows:
+        children.setdefault(c.parent_id, []).append(c)
+    return children
+
+
+def find_parents_with_replies(parent_ids):
+    rows = db.session.query(Comment.parent_id).filter(Comment.parent_id.in_(parent_ids)).distinct().all()
+    return {row.parent_id for row in rows}
+
+
+def build_tree(roots, depth, reply_limit):
+    """Достраивает ответы к roots уровень за уровнем: один запрос на уровень плюс одна проверка
+    последнего уровня. Узел без загруженных ответов получает hasMoreReplies и repliesCursor
+    для /api/comments/<id>/replies."""
+    nodes = {c.id: dict(comment_to_dict(c), replies=[], hasMoreReplies=False, repliesCursor=None) for c in roots}
+    result = [nodes[c.id] for c in roots]
+    level_ids = [c.id for c in roots]
+    for _ in range(depth):
+        if not level_ids:
+            break
+        children = load_children(level_ids, reply_limit)
+        next_level_ids = []
+        for parent_id, replies in children.items():
+            shown, replies_cursor = split_page(replies, reply_limit, comment_cursor_key)
+            parent = nodes[parent_id]
+            for c in shown:
+                node = dict(comment_to_dict(c), replies=[], hasMoreReplies=False, repliesCursor=None)
+                nodes[c.id] = node
+                parent['replies'].append(node)
+                next_level_ids.append(c.id)
+            if replies_cursor:
+                parent['hasMoreReplies'] = True
+                parent['repliesCursor'] = replies_cursor
+        level_ids = next_level_ids
+    if level_ids:
+        # Ниже предельной глубины ответы не грузим, только отмечаем, что они есть
+        for parent_id in find_parents_with_replies(level_ids):
+            nodes[parent_id]['hasMoreReplies'] = True
+    return result
@@ -0,0 +1,217 @@
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger('eventum.database')
+
+REPLICA_BIND = 'replica'
+# Ожидание соединения обычно измеряется микросекундами, поэтому корзины мельче, чем у времени запросов
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# SQLSTATE Postgres, после которых транзакцию можно просто повторить: lock_not_available, deadlock_detected, serialization_failure
+RETRYABLE_SQLSTATES = ('55P03', '40P01', '40001')
+
+
+def engine_options(uri, pool_class, pool_size=10, max_overflow=20, pool_timeout=10, pool_recycle=1800, pre_ping=True):
+    """Параметры create_engine для SQLALCHEMY_ENGINE_OPTIONS / SQLALCHEMY_BINDS."""
+    options = {"pool_pre_ping": pre_ping}
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # SQLite в памяти Flask-SQLAlchemy держит на StaticPool: размеры пула к нему не применимы
+        return options
+    options.update(
+        poolclass=pool_class, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        # LIFO: запросы крутятся на нескольких теплых соединениях, лишние простаивают и закрываются по recycle
+        pool_use_lifo=True,
+    )
+    return options
+
+
+def make_driver_cooperative(async_mode, uris):
+    """Под eventlet ожидание соединения и ответа БД не должно блокировать хаб.
+
+    Очередь пула ждет на threading.Condition - зеленом только после monkey_patch
+    (gunicorn --worker-class eventlet делает его сам). psycopg2 - C-расширение,
+    его ожидание сокета переводится на хаб отдельно.
+    """
+    if async_mode != 'eventlet':
+        return
+    from eventlet import patcher
+    if not patcher.is_monkey_patched('thread'):
+        logger.warning("eventlet is not monkey-patched: waiting for a DB pool connection will block all green threads")
+    if any(make_url(uri).get_backend_name() == 'postgresql' for uri in uris if uri):
+        from eventlet.support import psycopg2_patcher
+        psycopg2_patcher.make_psycopg_green()
+
+
+class PoolMetrics:
+    def __init__(self, registry):
+        self.wait = registry.histogram('db_pool_wait_seconds', 'Time to check out a DB connection, including opening a new one',
+                                       ('pool',), POOL_WAIT_BUCKETS)
+        self.timeouts = registry.counter('db_pool_timeouts_total', 'Checkouts that gave up after pool_timeout', ('pool',))
+
+    def pool_class(self, name):
+        """QueuePool, замеряющий выдачу соединений; recreate() сохраняет класс, а значит и замеры."""
+        metrics = self
+
+        class TimedQueuePool(QueuePool):
+            def _do_get(self):
+                started = time.perf_counter()
+                try:
+                    return super()._do_get()
+                except sa_exc.TimeoutError:
+                    metrics.timeouts.inc(pool=name)
+                    raise
+                finally:
+                    metrics.wait.observe(time.perf_counter() - started, pool=name)
+
+        return TimedQueuePool
+
+
+def pool_stats(engines):
+    stats = {}
+    for key, engine in engines.items():
+        pool, name = engine.pool, key or 'primary'
+        if not isinstance(pool, QueuePool):
+            continue
+        stats[f"{name}Size"] = pool.size()
+        stats[f"{name}CheckedOut"] = pool.checkedout()
+        stats[f"{name}Overflow"] = max(0, pool.overflow())
+    return stats
+
+
+def is_lock_conflict(error):
+    """Транзакция не дождалась блокировки (SQLite: "database is locked") или проиграла дедлок."""
+    if not isinstance(error, sa_exc.OperationalError):
+        return False
+    return getattr(error.orig, 'pgcode', None) in RETRYABLE_SQLSTATES or 'database is locked' in str(error.orig)
+
+
+def retry_lock_conflicts(session, sleep, attempts=3, delay=0.05):
+    """Декоратор пишущего представления: при конфликте блокировок транзакция откатывается и представление выполняется заново.
+
+    Подходит представлениям, которые можно повторить с начала. Если блокировку не
+    удалось взять и с последней попытки, клиент получает 503 с Retry-After, а не 500.
+    Ставится под @jwt_required.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return view(*args, **kwargs)
+                except sa_exc.OperationalError as e:
+                    session.rollback()
+                    if not is_lock_conflict(e):
+                        raise
+                    if attempt < attempts - 1: sleep(delay * (attempt + 1))
+            logger.warning(f"{view.__name__}: lock conflict after {attempts} attempts")
+            response = jsonify({"error": "Database is busy, try again"})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        return wrapper
+    return decorator
+
+
+def reads_from_replica():
+    return has_request_context() and g.get('db_route') == 'replica'
+
+
+class RoutingSession(Session):
+    """SELECT в запросах, помеченных ReadRouter, выполняются на реплике; flush, DML и text() - на основной БД."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and isinstance(clause, Select) and reads_from_replica():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReadRouter:
+    """Какие запросы читают с реплики.
+
+    GET-представления с @replica_reads читают с реплики, все остальное - с
+    основной БД. Пользователь, у которого был успешный пишущий запрос, еще
+    sticky_seconds читает с основной БД и видит свои изменения, даже если реплика
+    отстает. Отметки о записи живут в памяти процесса: при нескольких воркерах
+    они действуют, только пока запросы пользователя попадают в тот же воркер.
+    """
+
+    def __init__(self, enabled=False, sticky_seconds=5.0):
+        self.enabled = enabled
+        self.sticky_seconds = sticky_seconds
+        self._last_write = {}
+        self._lock = threading.Lock()
+        self._replica_requests = 0
+        self._pinned_requests = 0
+
+    def init_app(self, app):
+        if self.enabled:
+            app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:
+            # Маршрут без jwt_required (регистрация, вход) - пользователь неизвестен
+            return response
+        if identity:
+            now = time.monotonic()
+            with self._lock:
+                self._last_write[identity] = now
+                if len(self._last_write) > 10000:
+                    self._last_write = {key: at for key, at in self._last_write.items() if now - at < self.sticky_seconds}
+        return response
+
+    def is_pinned(self, identity):
+        if not identity:
+            return False
+        at = self._last_write.get(identity)
+        return at is not None and time.monotonic() - at < self.sticky_seconds
+
+    def replica_reads(self, view):
+        """Декоратор представления; ставится под @jwt_required, чтобы знать пользователя."""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.enabled and request.method in SAFE_METHODS:
+                pinned = self.is_pinned(get_jwt_identity())
+                with self._lock:
+                    if pinned: self._pinned_requests += 1
+                    else: self._replica_requests += 1
+                if not pinned: g.db_route = 'replica'
+            return view(*args, **kwargs)
+        return wrapper
+
+    def use_primary(self):
+        """До конца запроса читать с основной БД (ответ кэшируется или сравнивается по ETag)."""
+        g.db_route = 'primary'
+
+    @contextlib.contextmanager
+    def primary(self):
+        if not has_request_context():
+            yield
+            return
+        previous = g.get('db_route')
+        g.db_route = 'primary'
+        try:
+            yield
+        finally:
+            g.db_route = previous
+
+    def stats(self):
+        return {"enabled": self.enabled, "replicaRequests": self._replica_requests,
+                "pinnedRequests": self._pinned_requests, "recentWriters": len(self._last_write)}
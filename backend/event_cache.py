@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class EventCardCache:
+    """LRU-кэш готовых карточек событий и собранных страниц ленты.
+
+    Любая запись, меняющая карточку, вызывает invalidate(): карточки
+    выбрасываются, версия ленты растет, и все старые ETag перестают совпадать.
+    Кэш живет в памяти процесса; при нескольких воркерах on_invalidate
+    рассылает сброс остальным (ETag у каждого воркера свои).
+
+    Просмотры меняются постоянно и инвалидацию не вызывают: add_views дописывает
+    их в закэшированные карточки, не трогая версию и страницы. Поэтому в
+    собранной странице и за ее ETag число просмотров - на момент сборки страницы.
+    """
+
+    def __init__(self, max_cards=5000, max_pages=256):
+        self.max_cards = max_cards
+        self.max_pages = max_pages
+        self._cards = OrderedDict()
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        # boot_id не дает ETag от прошлого запуска совпасть с новой версией 0
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._version = 0
+        self.on_invalidate = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def etag(self, key, version=None):
+        if version is None:
+            version = self._version
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return f'"{self._boot_id}-{version}-{digest}"'
+
+    def get_cards(self, event_ids):
+        found = {}
+        with self._lock:
+            for event_id in event_ids:
+                card = self._cards.get(event_id)
+                if card is None:
+                    self.misses += 1
+                    continue
+                self._cards.move_to_end(event_id)
+                found[event_id] = card
+                self.hits += 1
+        return found
+
+    def put_card(self, event_id, card, version):
+        with self._lock:
+            # Карточка, собранная до инвалидации, могла устареть
+            if version != self._version:
+                return
+            self._cards[event_id] = card
+            self._cards.move_to_end(event_id)
+            while len(self._cards) > self.max_cards:
+                self._cards.popitem(last=False)
+                self.evictions += 1
+
+    def get_page(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put_page(self, key, page, version):
+        with self._lock:
+            if version != self._version:
+                return
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, event_ids=None, broadcast=True):
+        """Сбрасывает указанные карточки (или все при event_ids=None) и страницы ленты."""
+        if event_ids is not None:
+            event_ids = list(event_ids)
+        with self._lock:
+            if event_ids is None:
+                self._cards.clear()
+            else:
+                for event_id in event_ids:
+                    self._cards.pop(event_id, None)
+            self._pages.clear()
+            self._version += 1
+        if broadcast and self.on_invalidate is not None:
+            self.on_invalidate({"eventIds": event_ids})
+
+    def add_views(self, counts):
+        """Прибавляет сброшенные просмотры ({event_id: n}) к карточкам в кэше этого процесса."""
+        with self._lock:
+            for event_id, count in counts.items():
+                card = self._cards.get(event_id)
+                # Карточку заменяем копией: уже выданную ссылку могут сериализовать параллельно
+                if card is not None: self._cards[event_id] = {**card, "views": card["views"] + count}
+
+    def invalidate_organizer(self, organizer_id, broadcast=True):
+        """Аватар организатора денормализован в карточки его событий."""
+        with self._lock:
+            stale_ids = [event_id for event_id, card in self._cards.items() if card.get('organizerId') == organizer_id]
+        self.invalidate(stale_ids, broadcast=False)
+        # Другие воркеры ищут карточки организатора в своих кэшах
+        if broadcast and self.on_invalidate is not None:
+            self.on_invalidate({"organizerId": organizer_id})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cards": len(self._cards), "pages": len(self._pages), "version": self._version,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions
+            }
@@ -0,0 +1,193 @@
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from PIL import Image, ImageOps
+
+# Производные размеры: длинная сторона в пикселях
+VARIANTS = {'thumb': 160, 'card': 640, 'full': 1600}
+FORMATS = {'webp': ('WEBP', {"quality": 80, "method": 4}), 'jpg': ('JPEG', {"quality": 82, "optimize": True, "progressive": True})}
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+MAX_PIXELS = 40_000_000
+# Основной URL записи - полноразмерный JPEG: старые клиенты продолжают работать с одним полем
+PRIMARY_SUFFIX = '_full.jpg'
+VARIANT_NAME_RE = re.compile(r'^(?P<base>[\w.-]+)_full\.jpg$')
+
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def validate_image(data):
+    """Проверяет, что байты - картинка допустимого формата и размера. Декодирует только заголовок."""
+    if not data:
+        raise InvalidImage("Empty file")
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise InvalidImage("File too large")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format
+            width, height = image.size
+            image.verify()
+    except Image.DecompressionBombError:
+        raise InvalidImage("Image too large")
+    except Exception:
+        raise InvalidImage("Not an image")
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImage("Unsupported image format")
+    if width * height > MAX_PIXELS:
+        raise InvalidImage("Image too large")
+    return image_format
+
+
+def variant_filename(base, size, extension):
+    return f"{base}_{size}.{extension}"
+
+
+def variant_urls(url):
+    """Карта {размер: {webp, jpeg}} для URL, выпущенного конвейером; для остальных URL - None."""
+    if not url:
+        return None
+    prefix, _, filename = url.rpartition('/')
+    match = VARIANT_NAME_RE.match(filename)
+    if not match:
+        return None
+    base = match.group('base')
+    return {size: {"webp": f"{prefix}/{variant_filename(base, size, 'webp')}", "jpeg": f"{prefix}/{variant_filename(base, size, 'jpg')}"}
+            for size in VARIANTS}
+
+
+def variant_paths(folder, filename):
+    """Все файлы производных для имени основного файла (для удаления)."""
+    match = VARIANT_NAME_RE.match(filename)
+    if not match:
+        return [os.path.join(folder, filename)]
+    base = match.group('base')
+    return [os.path.join(folder, variant_filename(base, size, extension)) for size in VARIANTS for extension in FORMATS]
+
+
+def render_variants(raw_path, target_dir, base):
+    """Выполняется в процессе пула: поворот по EXIF, удаление метаданных, ресайз и кодирование.
+
+    Метаданные не переносятся, потому что сохраняется заново собранная
+    картинка без exif/icc. Файлы пишутся под временными именами и
+    переименовываются, так что клиент никогда не получит недописанный файл.
+    """
+    started = time.perf_counter()
+    written = {}
+    try:
+        with Image.open(raw_path) as source:
+            source.seek(0)
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            for size, max_side in VARIANTS.items():
+                resized = image.copy()
+                resized.thumbnail((max_side, max_side), Image.LANCZOS)
+                for extension, (image_format, options) in FORMATS.items():
+                    frame = resized
+                    if image_format == 'JPEG' and has_alpha:
+                        frame = Image.new('RGB', resized.size, (255, 255, 255))
+                        frame.paste(resized, mask=resized.getchannel('A'))
+                    filename = variant_filename(base, size, extension)
+                    tmp_path = os.path.join(target_dir, f".{filename}.{os.getpid()}.tmp")
+                    frame.save(tmp_path, image_format, **options)
+                    written[filename] = os.path.getsize(tmp_path)
+                    os.replace(tmp_path, os.path.join(target_dir, filename))
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+    return {"files": written, "seconds": time.perf_counter() - started}
+
+
+class ImagePipeline:
+    """Очередь обработки загрузок в пуле процессов.
+
+    Запрос только проверяет файл, кладет его во временную папку (она не
+    раздается) и сразу возвращает URL производных; файлы появляются, когда
+    задача в пуле завершится. workers=0 - обработка прямо в запросе
+    (для отладки и тестов).
+    """
+
+    def __init__(self, tmp_dir, workers=2):
+        self.tmp_dir = tmp_dir
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.completed = 0
+        self.failed = 0
+        self.reused = 0
+        os.makedirs(tmp_dir, exist_ok=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: воркеры не наследуют соединения с БД и состояние eventlet родителя
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def submit(self, data, target_dir, base, reuse=False):
+        """Ставит обработку в очередь и возвращает имя основного файла (…_full.jpg).
+
+        reuse=True - такой файл уже загружали: если производные готовы или
+        готовятся, повторно ничего не считается.
+        """
+        if reuse:
+            with self._lock:
+                job = self._jobs.get(base, {})
+                # Та же картинка могла уйти в другую папку (аватар и обложка события) - это не повтор
+                pending = job.get("status") == "processing" and job.get("targetDir") == target_dir
+            if pending or all(os.path.exists(path) for path in variant_paths(target_dir, base + PRIMARY_SUFFIX)):
+                self.reused += 1
+                return base + PRIMARY_SUFFIX
+        # Имя сырого файла уникально: две одновременные загрузки одного содержимого не мешают друг другу
+        raw_path = os.path.join(self.tmp_dir, f"{base}_{os.getpid()}_{threading.get_ident()}_{time.monotonic_ns()}.upload")
+        with open(raw_path, 'wb') as raw_file:
+            raw_file.write(data)
+        if self.workers <= 0:
+            self._finish(base, target_dir, render_variants(raw_path, target_dir, base), None)
+            return base + PRIMARY_SUFFIX
+        with self._lock:
+            self._jobs[base] = {"status": "processing", "submittedAt": time.time(), "targetDir": target_dir}
+        future = self._get_executor().submit(render_variants, raw_path, target_dir, base)
+        future.add_done_callback(lambda f: self._finish(base, target_dir, None if f.exception() else f.result(), f.exception()))
+        return base + PRIMARY_SUFFIX
+
+    def _finish(self, base, target_dir, result, error):
+        with self._lock:
+            if error is not None:
+                self.failed += 1
+                self._jobs[base] = {"status": "failed", "error": str(error)}
+            else:
+                self.completed += 1
+                # Запись могла уже принадлежать задаче той же картинки для другой папки
+                if self._jobs.get(base, {}).get("targetDir") in (None, target_dir):
+                    self._jobs.pop(base, None)
+
+    def status(self, filename):
+        """processing / failed / ready (задачи в памяти не хранятся после успешного завершения)."""
+        match = VARIANT_NAME_RE.match(filename)
+        if not match:
+            return None
+        with self._lock:
+            job = self._jobs.get(match.group('base'))
+        return job["status"] if job else "ready"
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "pending": sum(1 for j in self._jobs.values() if j["status"] == "processing"),
+                    "completed": self.completed, "failed": self.failed, "reused": self.reused}
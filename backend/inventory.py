@@ -0,0 +1,188 @@
+import datetime
+import hashlib
+import json
+
+from models import db, Event, Ticket, TicketHold, IdempotencyKey
+
+# Просроченные брони освобождаются пачками, чтобы одна транзакция не держала блокировки долго
+RELEASE_BATCH = 500
+MAX_IDEMPOTENCY_KEY = 100
+NO_SYNC = {'synchronize_session': False}
+
+
+class InventoryError(Exception):
+    def __init__(self, message, status_code, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+def parse_quantity(value, maximum):
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= maximum:
+        raise InventoryError(f"Quantity must be an integer from 1 to {maximum}", 400)
+    return value
+
+
+def parse_capacity(value):
+    """None (или отсутствие) - без ограничения мест."""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise InventoryError("Capacity must be a non-negative integer or null", 400)
+    return value
+
+
+def has_room(quantity):
+    return db.or_(Event.capacity.is_(None), Event.tickets_sold + Event.tickets_held + quantity <= Event.capacity)
+
+
+def take_inventory(event_id, quantity, column):
+    """Атомарно прибавляет quantity к tickets_sold или tickets_held, если места есть.
+
+    Один условный UPDATE: проверка и списание не разделены чтением, поэтому
+    параллельные покупки не продают лишнего. Блокируется только строка события
+    и только до конца транзакции - вызывающий делает этот шаг последним перед commit.
+    Возвращает строку с названием события или None, если мест не хватило.
+    """
+    stmt = db.update(Event).where(Event.id == event_id, has_room(quantity)).values({column: column + quantity}).returning(Event.title)
+    return db.session.execute(stmt.execution_options(**NO_SYNC)).first()
+
+
+def availability(event_id):
+    row = db.session.query(Event.capacity, Event.tickets_sold, Event.tickets_held).filter(Event.id == event_id).first()
+    if row is None:
+        return None
+    capacity, sold, held = row
+    available = None if capacity is None else max(0, capacity - sold - held)
+    return {"eventId": event_id, "capacity": capacity, "sold": sold, "held": held, "available": available}
+
+
+def unavailable(info):
+    """Почему условный UPDATE ничего не изменил: события нет (info is None) или места кончились."""
+    if info is None:
+        return InventoryError("Event not found", 404)
+    # held > 0: часть мест в бронях, после их истечения места могут появиться
+    return InventoryError("Sold out", 409, available=info["available"], held=info["held"])
+
+
+def set_capacity(event_id, capacity):
+    """Новая вместимость не может быть меньше уже проданных и удерживаемых билетов."""
+    stmt = db.update(Event).where(Event.id == event_id)
+    if capacity is not None:
+        stmt = stmt.where(Event.tickets_sold + Event.tickets_held <= capacity)
+    return db.session.execute(stmt.values(capacity=capacity).execution_options(**NO_SYNC)).rowcount == 1
+
+
+def create_hold(user_id, event_id, quantity, ttl, now=None):
+    """Откладывает места на ttl. Повторная бронь того же события - IntegrityError (unique_event_user_hold)."""
+    now = now or datetime.datetime.utcnow()
+    hold = TicketHold(event_id=event_id, user_id=user_id, quantity=quantity, created_at=now, expires_at=now + ttl)
+    db.session.add(hold); db.session.flush()
+    if take_inventory(event_id, quantity, Event.tickets_held) is None:
+        raise unavailable(availability(event_id))
+    return hold
+
+
+def active_hold(user_id, event_id, now=None):
+    now = now or datetime.datetime.utcnow()
+    return TicketHold.query.filter(TicketHold.user_id == user_id, TicketHold.event_id == event_id, TicketHold.expires_at > now).first()
+
+
+def return_held(released):
+    # В порядке id событий: параллельные освобождения блокируют строки в одном порядке и не ждут друг друга по кругу
+    for event_id in sorted(released):
+        stmt = db.update(Event).where(Event.id == event_id).values(tickets_held=Event.tickets_held - released[event_id])
+        db.session.execute(stmt.execution_options(**NO_SYNC))
+
+
+def delete_holds(*criteria):
+    """Удаляет брони и возвращает их места. Строку брони удаляет ровно одна транзакция, поэтому места не вернутся дважды."""
+    stmt = db.delete(TicketHold).where(*criteria).returning(TicketHold.event_id, TicketHold.quantity)
+    rows = db.session.execute(stmt.execution_options(**NO_SYNC)).all()
+    released = {}
+    for event_id, quantity in rows:
+        released[event_id] = released.get(event_id, 0) + quantity
+    return_held(released)
+    return len(rows)
+
+
+def release_hold(user_id, hold_id):
+    return delete_holds(TicketHold.id == hold_id, TicketHold.user_id == user_id) == 1
+
+
+def release_expired_holds(event_id=None, now=None, batch=RELEASE_BATCH):
+    """Освобождает до batch просроченных броней (commit - за вызывающим). Возвращает число броней."""
+    now = now or datetime.datetime.utcnow()
+    expired = db.select(TicketHold.id).where(TicketHold.expires_at <= now)
+    if event_id is not None: expired = expired.where(TicketHold.event_id == event_id)
+    return delete_holds(TicketHold.id.in_(expired.limit(batch)), TicketHold.expires_at <= now)
+
+
+def purchase(user_id, event_id, quantity, hold_id=None, now=None):
+    """Покупка в одной короткой транзакции (commit - за вызывающим).
+
+    С hold_id билеты переходят из живой брони пользователя, без нее - списываются
+    условным UPDATE. Второй билет того же пользователя на событие - IntegrityError
+    (unique_event_user_ticket). Возвращает билет и название события: его отдает тот же UPDATE.
+    """
+    now = now or datetime.datetime.utcnow()
+    if hold_id:
+        hold = db.session.execute(db.delete(TicketHold).where(
+            TicketHold.id == hold_id, TicketHold.user_id == user_id, TicketHold.event_id == event_id, TicketHold.expires_at > now
+        ).returning(TicketHold.quantity).execution_options(**NO_SYNC)).first()
+        if hold is None:
+            raise InventoryError("Hold expired or not found", 410)
+        quantity = hold.quantity
+    else:
+        # Быстрый отказ без записи, когда мест заведомо нет: после распродажи таких запросов большинство.
+        # Решает все равно условный UPDATE ниже, это чтение - только подсказка
+        info = availability(event_id)
+        if info is None or (info["available"] is not None and info["available"] < quantity):
+            raise unavailable(info)
+    ticket = Ticket(event_id=event_id, user_id=user_id, quantity=quantity, purchase_date=now)
+    db.session.add(ticket); db.session.flush()
+    if hold_id:
+        stmt = db.update(Event).where(Event.id == event_id).values(
+            tickets_held=Event.tickets_held - quantity, tickets_sold=Event.tickets_sold + quantity).returning(Event.title)
+        event = db.session.execute(stmt.execution_options(**NO_SYNC)).first()
+        if event is None:
+            raise unavailable(None)
+    else:
+        event = take_inventory(event_id, quantity, Event.tickets_sold)
+        if event is None:
+            raise unavailable(availability(event_id))
+    return ticket, event.title
+
+
+def request_fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def find_response(user_id, key):
+    return db.session.get(IdempotencyKey, (user_id, key))
+
+
+def remember_response(user_id, key, fingerprint, status_code, body):
+    """Сохраняется в той же транзакции, что и покупка: ответ есть тогда и только тогда, когда покупка состоялась."""
+    db.session.add(IdempotencyKey(user_id=user_id, key=key, fingerprint=fingerprint, status_code=status_code, response=body))
+
+
+def prune_idempotency_keys(max_age, now=None):
+    now = now or datetime.datetime.utcnow()
+    return IdempotencyKey.query.filter(IdempotencyKey.created_at < now - max_age).delete(synchronize_session=False)
+
+
+def hold_release_loop(app, sleep, interval, idempotency_ttl):
+    while True:
+        sleep(interval)
+        with app.app_context():
+            try:
+                while True:
+                    released = release_expired_holds(); db.session.commit()
+                    if released < RELEASE_BATCH: break
+                prune_idempotency_keys(idempotency_ttl); db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"Ticket hold release failed: {e}")
+            finally:
+                db.session.remove()
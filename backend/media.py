@@ -0,0 +1,108 @@
+import datetime
+import hashlib
+import os
+import re
+
+from sqlalchemy.exc import IntegrityError
+
+from images import variant_paths
+from models import db, MediaObject
+
+# Имя файла - хэш исходных байтов, поэтому содержимое по URL никогда не меняется
+DIGEST_LENGTH = 32
+CONTENT_ADDRESSED_RE = re.compile(r'^[0-9a-f]{%d}_(thumb|card|full)\.(webp|jpg)$' % DIGEST_LENGTH)
+MEDIA_URL_RE = re.compile(r'/uploads/(?P<folder>avatars|events)/(?P<digest>[0-9a-f]{%d})_full\.jpg$' % DIGEST_LENGTH)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Загрузка, к которой так и не привязали запись, или освобожденный файл живут еще сутки
+GC_GRACE = datetime.timedelta(hours=24)
+GC_BATCH = 500
+
+
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+
+
+def is_content_addressed(filename):
+    return CONTENT_ADDRESSED_RE.match(filename) is not None
+
+
+def media_key(url):
+    """(folder, digest) для URL из хранилища по хэшу, None для внешних и старых URL."""
+    match = MEDIA_URL_RE.search(url or '')
+    if not match:
+        return None
+    return match.group('folder'), match.group('digest')
+
+
+def register_upload(folder, digest, size_bytes):
+    """Заводит объект или продлевает ему жизнь, если такой файл уже загружали. Коммит - за вызывающим."""
+    now = datetime.datetime.utcnow()
+    touched = MediaObject.query.filter_by(folder=folder, digest=digest).update({MediaObject.updated_at: now}, synchronize_session=False)
+    if touched:
+        return False
+    try:
+        # Savepoint: параллельная загрузка того же файла не откатывает остальную транзакцию
+        with db.session.begin_nested():
+            db.session.add(MediaObject(folder=folder, digest=digest, refcount=0, size_bytes=size_bytes, created_at=now, updated_at=now))
+    except IntegrityError:
+        return False
+    return True
+
+
+def acquire(url):
+    key = media_key(url)
+    if key is None:
+        return
+    MediaObject.query.filter_by(folder=key[0], digest=key[1]).update(
+        {MediaObject.refcount: MediaObject.refcount + 1, MediaObject.updated_at: datetime.datetime.utcnow()}, synchronize_session=False)
+
+
+def release(url):
+    key = media_key(url)
+    if key is None:
+        return
+    MediaObject.query.filter(MediaObject.folder == key[0], MediaObject.digest == key[1], MediaObject.refcount > 0).update(
+        {MediaObject.refcount: MediaObject.refcount - 1, MediaObject.updated_at: datetime.datetime.utcnow()}, synchronize_session=False)
+
+
+def swap_reference(old_url, new_url):
+    if old_url == new_url:
+        return
+    acquire(new_url)
+    release(old_url)
+
+
+def collect_garbage(folder_paths, grace=GC_GRACE, now=None):
+    """Удаляет файлы объектов без ссылок старше grace. folder_paths: {'avatars': путь, 'events': путь}."""
+    if now is None:
+        now = datetime.datetime.utcnow()
+    removed = 0
+    candidates = db.session.query(MediaObject.folder, MediaObject.digest).filter(
+        MediaObject.refcount == 0, MediaObject.updated_at < now - grace).limit(GC_BATCH).all()
+    for folder, digest in candidates:
+        # Условный DELETE: если объект успели снова загрузить или привязать, он останется
+        deleted = MediaObject.query.filter(
+            MediaObject.folder == folder, MediaObject.digest == digest,
+            MediaObject.refcount == 0, MediaObject.updated_at < now - grace
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted != 1:
+            continue
+        for path in variant_paths(folder_paths[folder], f"{digest}_full.jpg"):
+            if os.path.exists(path):
+                os.remove(path)
+        removed += 1
+    return removed
+
+
+def gc_loop(app, sleep, interval, folder_paths):
+    while True:
+        sleep(interval)
+        with app.app_context():
+            try:
+                collect_garbage(folder_paths)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"Media GC failed: {e}")
+            finally:
+                db.session.remove()
@@ -0,0 +1,255 @@
+import bisect
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('eventum.metrics')
+
+# Границы корзин гистограмм времени (секунды), как у клиентов Prometheus по умолчанию
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+N_PLUS_ONE_MODES = ('off', 'log', 'raise')
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _snake(name):
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in items)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Счетчики по корзинам (без накопления), сумма и число наблюдений
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Метрики процесса в текстовом формате Prometheus (без prometheus_client).
+
+    Каждый воркер gunicorn отдает свои значения: при нескольких процессах
+    Prometheus должен опрашивать каждый из них.
+    """
+
+    def __init__(self, prefix='eventum'):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(f"{self.prefix}_{name}", help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(f"{self.prefix}_{name}", help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, component, stats_func):
+        """Числовые поля словаря stats() компонента становятся gauge eventum_<component>_<поле>."""
+        self._collectors.append((component, stats_func))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for component, stats_func in self._collectors:
+            try:
+                stats = stats_func()
+            except Exception as e:
+                logger.warning(f"Metrics collector {component} failed: {e}")
+                continue
+            for key, value in sorted(stats.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.prefix}_{component}_{_snake(key)}"
+                lines.extend([f"# TYPE {name} gauge", f"{name} {value}"])
+        return '\n'.join(lines) + '\n'
+
+
+def redact_parameters(parameters, executemany=False):
+    """Вместо значений - их типы (и длина строк): в журнал не попадают пароли, email и токены."""
+    if executemany:
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return {key: _redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact_value(value) for value in parameters]
+    return _redact_value(parameters)
+
+
+def _redact_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+class RequestProfiler:
+    """Время запросов по маршрутам, SQL на запрос, журнал медленных запросов и поиск N+1.
+
+    SQL считается через события движка SQLAlchemy и приписывается запросу
+    Flask, в потоке которого выполнялся (через g). Запросы фоновых задач идут
+    только в общие счетчики с route="background". Потоковый ответ учитывается
+    при закрытии, поэтому выборки во время отдачи тела тоже попадают в запрос.
+
+    N+1: один и тот же текст SQL, выполненный в запросе n_plus_one_threshold
+    раз и больше. mode='log' пишет предупреждение (один раз на текст SQL в
+    запросе), 'raise' бросает NPlusOneError прямо из цикла - для тестов.
+    """
+
+    def __init__(self, registry, slow_query_seconds=0.2, n_plus_one_threshold=10, n_plus_one_mode='off'):
+        if n_plus_one_mode not in N_PLUS_ONE_MODES:
+            raise ValueError(f"n_plus_one_mode must be one of {N_PLUS_ONE_MODES}")
+        self.slow_query_seconds = slow_query_seconds
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.n_plus_one_mode = n_plus_one_mode
+        self.requests = registry.counter('http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+        self.request_seconds = registry.histogram('http_request_duration_seconds', 'HTTP request duration', ('method', 'route'))
+        self.request_queries = registry.histogram('http_request_db_queries', 'SQL statements per HTTP request', ('route',), QUERY_COUNT_BUCKETS)
+        self.request_db_seconds = registry.histogram('http_request_db_seconds', 'SQL time per HTTP request', ('route',))
+        self.queries = registry.counter('db_queries_total', 'SQL statements', ('route',))
+        self.query_seconds = registry.histogram('db_query_duration_seconds', 'SQL statement duration', ('route',))
+        self.slow_queries = registry.counter('db_slow_queries_total', 'SQL statements slower than the threshold', ('route',))
+        self.n_plus_one = registry.counter('db_n_plus_one_total', 'Repeated identical SQL in one request', ('route',))
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        # На классе Engine: учитываются все движки процесса, включая созданные позже
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _route():
+        rule = request.url_rule
+        return rule.rule if rule is not None else 'unmatched'
+
+    def _before_request(self):
+        g.profile = {"started": time.perf_counter(), "queries": 0, "db_seconds": 0.0, "statements": {}, "flagged": set()}
+
+    def _after_request(self, response):
+        profile = g.get('profile')
+        if profile is None:
+            return response
+        method, route, status = request.method, self._route(), response.status_code
+
+        def finish():
+            self.requests.inc(method=method, route=route, status=status)
+            self.request_seconds.observe(time.perf_counter() - profile["started"], method=method, route=route)
+            self.request_queries.observe(profile["queries"], route=route)
+            self.request_db_seconds.observe(profile["db_seconds"], route=route)
+
+        if response.is_streamed:
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        profile = g.get('profile') if has_request_context() else None
+        route = self._route() if profile is not None else 'background'
+        self.queries.inc(route=route)
+        self.query_seconds.observe(elapsed, route=route)
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries.inc(route=route)
+            logger.warning(f"Slow query {elapsed * 1000:.0f}ms [{route}]: {' '.join(statement.split())} "
+                           f"params={redact_parameters(parameters, executemany)}")
+        if profile is None:
+            return
+        profile["queries"] += 1
+        profile["db_seconds"] += elapsed
+        if self.n_plus_one_mode == 'off' or executemany:
+            return
+        repeats = profile["statements"][statement] = profile["statements"].get(statement, 0) + 1
+        if repeats >= self.n_plus_one_threshold and statement not in profile["flagged"]:
+            profile["flagged"].add(statement)
+            self.n_plus_one.inc(route=route)
+            message = f"Possible N+1 in {request.method} {route}: {repeats}x {' '.join(statement.split())}"
+            if self.n_plus_one_mode == 'raise':
+                raise NPlusOneError(message)
+            logger.warning(message)
+
+
+def instrument_socketio(socketio, registry):
+    """Счетчик кадров Socket.IO по имени события (все emit процесса проходят через server.emit)."""
+    emits = registry.counter('socketio_emits_total', 'Socket.IO frames emitted by event name', ('event',))
+    server = socketio.server
+    original_emit = server.emit
+
+    def counting_emit(event_name, *args, **kwargs):
+        emits.inc(event=event_name)
+        return original_emit(event_name, *args, **kwargs)
+
+    server.emit = counting_emit
+    return emits
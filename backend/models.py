@@ -1,15 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from datetime import datetime
 import uuid
+from database import RoutingSession
 
-db = SQLAlchemy()
+# Сессия сама выбирает основную БД или реплику (database.ReadRouter)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 
 # Таблицы связей
 follows = db.Table('follows',
     db.Column('follower_id', db.String(50), db.ForeignKey('users.id'), primary_key=True),
-    db.Column('organizer_id', db.String(50), db.ForeignKey('users.id'), primary_key=True)
+    db.Column('organizer_id', db.String(50), db.ForeignKey('users.id'), primary_key=True),
+    # Рассылка идет по подписчикам организатора в порядке follower_id
+    db.Index('idx_follows_organizer', 'organizer_id', 'follower_id')
 )
 
 user_interests = db.Table('user_interests',
@@ -19,7 +24,9 @@ user_interests = db.Table('user_interests',
 
 favorites = db.Table('favorites',
     db.Column('user_id', db.String(50), db.ForeignKey('users.id'), primary_key=True),
-    db.Column('event_id', db.String(50), db.ForeignKey('events.id'), primary_key=True)
+    db.Column('event_id', db.String(50), db.ForeignKey('events.id'), primary_key=True),
+    # Время добавления нужно для почасовой статистики избранного
+    db.Column('created_at', db.DateTime, default=datetime.utcnow, index=True)
 )
 
 class Interest(db.Model):
@@ -73,6 +80,38 @@ class Event(db.Model):
     image = db.Column(db.String(500))
     views = db.Column(db.Integer, default=0)
     # stats = db.Column(db.Integer, default=0)
+    # Взвешенная вовлеченность и баллы лент hot/trending (см. ranking.py)
+    engagement = db.Column(db.Float, default=0.0, nullable=False)
+    hot_score = db.Column(db.Float, default=0.0, nullable=False)
+    trend_score = db.Column(db.Float, default=0.0, nullable=False)
+    # Продажи (см. inventory.py): capacity NULL - без ограничения; проданные и удерживаемые билеты
+    # меняются только условным UPDATE, поэтому sold + held никогда не превышает capacity
+    capacity = db.Column(db.Integer)
+    tickets_sold = db.Column(db.Integer, default=0, nullable=False)
+    tickets_held = db.Column(db.Integer, default=0, nullable=False)
+
+    # Индексы под ленту: ключ курсора (event_timestamp, id) плюс частые фильтры
+    __table_args__ = (
+        db.Index('idx_event_feed', 'event_timestamp', 'id'),
+        db.Index('idx_event_district_feed', 'district', 'event_timestamp', 'id'),
+        db.Index('idx_event_vibe_feed', 'vibe', 'event_timestamp', 'id'),
+        db.Index('idx_event_price_feed', 'price_value', 'event_timestamp'),
+        db.Index('idx_event_age_feed', 'age_limit', 'event_timestamp'),
+        db.Index('idx_event_organizer', 'organizer_id', 'event_timestamp'),
+        db.Index('idx_event_hot', 'hot_score', 'id'),
+        db.Index('idx_event_trending', 'trend_score', 'id'),
+    )
+
+# Теги и категории событий в плоском виде, чтобы фильтровать по индексу, а не по JSON
+class EventLabel(db.Model):
+    __tablename__ = 'event_labels'
+    event_id = db.Column(db.String(50), db.ForeignKey('events.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)  # 'tag' или 'category'
+    value = db.Column(db.String(100), primary_key=True)
+
+    __table_args__ = (
+        db.Index('idx_event_label_lookup', 'kind', 'value', 'event_id'),
+    )
 
 class EventView(db.Model):
     __tablename__ = 'event_views'
@@ -86,6 +125,8 @@ class EventView(db.Model):
     __table_args__ = (
         db.UniqueConstraint('event_id', 'user_id', name='unique_event_user_view'),
         db.Index('idx_event_view_time', 'event_id', 'viewed_at'),
+        db.Index('idx_event_view_ip', 'event_id', 'ip_address', 'viewed_at'),
+        db.Index('idx_event_view_viewed_at', 'viewed_at'),
     )
     
     user = db.relationship('User', backref='event_views')
@@ -103,9 +144,19 @@ class Post(db.Model):
     upvotes = db.Column(db.Integer, default=0)
     downvotes = db.Column(db.Integer, default=0)
     age_limit = db.Column(db.Integer, default=0)
+    # Счетчик поддерживается при добавлении комментария, чтобы лента не грузила сами комментарии
+    comment_count = db.Column(db.Integer, default=0, nullable=False)
+    hot_score = db.Column(db.Float, default=0.0, nullable=False)
+    trend_score = db.Column(db.Float, default=0.0, nullable=False)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade="all, delete-orphan")
     votes = db.relationship('PostVote', backref='post', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('idx_post_feed', 'timestamp', 'id'),
+        db.Index('idx_post_hot', 'hot_score', 'id'),
+        db.Index('idx_post_trending', 'trend_score', 'id'),
+    )
+
 class PostVote(db.Model):
     __tablename__ = 'post_votes'
     id = db.Column(db.Integer, primary_key=True)
@@ -134,6 +185,12 @@ class Comment(db.Model):
     
     author = db.relationship('User', backref='comments')
 
+    # Корневые комментарии поста и ответы на комментарий читаются по индексу в порядке (timestamp, id)
+    __table_args__ = (
+        db.Index('idx_comment_thread', 'post_id', 'parent_id', 'timestamp', 'id'),
+        db.Index('idx_comment_parent', 'parent_id', 'timestamp', 'id'),
+    )
+
 class Ticket(db.Model):
     __tablename__ = 'tickets'
     id = db.Column(db.String(50), primary_key=True, default=lambda: f"tick_{uuid.uuid4().hex[:8]}")
@@ -145,4 +202,177 @@ class Ticket(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('event_id', 'user_id', name='unique_event_user_ticket'),
-    )
\ No newline at end of file
+        db.Index('idx_ticket_purchase', 'purchase_date'),
+    )
+
+# Билеты, отложенные на время оплаты: пока бронь жива, они входят в events.tickets_held
+class TicketHold(db.Model):
+    __tablename__ = 'ticket_holds'
+    id = db.Column(db.String(50), primary_key=True, default=lambda: f"hold_{uuid.uuid4().hex[:10]}")
+    event_id = db.Column(db.String(50), db.ForeignKey('events.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.String(50), db.ForeignKey('users.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'user_id', name='unique_event_user_hold'),
+        db.Index('idx_ticket_hold_expiry', 'expires_at'),
+    )
+
+    def to_dict(self):
+        return {"id": self.id, "eventId": self.event_id, "quantity": self.quantity, "expiresAt": self.expires_at.isoformat()}
+
+# Ответы на покупки с заголовком Idempotency-Key: повтор того же запроса получает сохраненный ответ
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    user_id = db.Column(db.String(50), db.ForeignKey('users.id'), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# Агрегаты просмотров, добавлений в избранное и продаж по часам и по дням
+class EventStatsHourly(db.Model):
+    __tablename__ = 'event_stats_hourly'
+    event_id = db.Column(db.String(50), db.ForeignKey('events.id', ondelete='CASCADE'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    favorites = db.Column(db.Integer, default=0, nullable=False)
+    tickets = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_stats_hourly_bucket', 'bucket'),
+    )
+
+class EventStatsDaily(db.Model):
+    __tablename__ = 'event_stats_daily'
+    event_id = db.Column(db.String(50), db.ForeignKey('events.id', ondelete='CASCADE'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    favorites = db.Column(db.Integer, default=0, nullable=False)
+    tickets = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_stats_daily_bucket', 'bucket'),
+    )
+
+# Итоги за все время по событию и по организатору (см. summaries.py): меняются в транзакциях покупки,
+# избранного и просмотров, поэтому финансы и профиль организатора читают одну строку, а не билеты
+class EventSummary(db.Model):
+    __tablename__ = 'event_summaries'
+    event_id = db.Column(db.String(50), db.ForeignKey('events.id', ondelete='CASCADE'), primary_key=True)
+    organizer_id = db.Column(db.String(50), nullable=False)
+    tickets_sold = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    favorites = db.Column(db.Integer, default=0, nullable=False)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_event_summary_organizer', 'organizer_id', 'event_id'),
+    )
+
+class OrganizerSummary(db.Model):
+    __tablename__ = 'organizer_summaries'
+    organizer_id = db.Column(db.String(50), db.ForeignKey('users.id'), primary_key=True)
+    events = db.Column(db.Integer, default=0, nullable=False)
+    tickets_sold = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    favorites = db.Column(db.Integer, default=0, nullable=False)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# До какого момента сырые данные уже свернуты в агрегаты
+class RollupWatermark(db.Model):
+    __tablename__ = 'rollup_watermarks'
+    source = db.Column(db.String(50), primary_key=True)
+    processed_until = db.Column(db.DateTime, nullable=False)
+
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+    id = db.Column(db.String(50), primary_key=True)
+    recipient_id = db.Column(db.String(50), db.ForeignKey('users.id'), nullable=False)
+    type = db.Column(db.String(20), nullable=False) 
+    content = db.Column(db.String(255), nullable=False)
+    related_id = db.Column(db.String(50), nullable=True)
+    is_read = db.Column(db.Boolean, default=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Счетчик непрочитанных и "прочитать все" обходятся одним индексом
+        db.Index('idx_notification_unread', 'recipient_id', 'is_read', 'timestamp'),
+        # Лента уведомлений пользователя с keyset-пагинацией
+        db.Index('idx_notification_feed', 'recipient_id', 'timestamp', 'id'),
+    )
+
+    def to_dict(self):
+        ts_str = self.timestamp.isoformat() if self.timestamp else datetime.utcnow().isoformat()
+        return {
+            "id": self.id,
+            "recipientId": self.recipient_id,
+            "type": self.type,
+            "content": self.content,
+            "relatedId": self.related_id,
+            "isRead": self.is_read,
+            "timestamp": ts_str
+        }
+
+# Задача рассылки уведомлений подписчикам; last_follower_id - курсор, до которого рассылка уже записана
+class NotificationJob(db.Model):
+    __tablename__ = 'notification_jobs'
+    id = db.Column(db.String(50), primary_key=True, default=lambda: f"notif_{uuid.uuid4().hex[:10]}")
+    organizer_id = db.Column(db.String(50), db.ForeignKey('users.id'), nullable=False)
+    event_id = db.Column(db.String(50), nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    content = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed
+    total = db.Column(db.Integer)
+    sent = db.Column(db.Integer, default=0, nullable=False)
+    last_follower_id = db.Column(db.String(50))
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_notification_job_status', 'status', 'updated_at'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id, "eventId": self.event_id, "status": self.status,
+            "total": self.total, "sent": self.sent, "error": self.error
+        }
+
+# Поисковый документ на событие или пост. В Postgres поиск идет по tsv (GIN),
+# в SQLite id документа - rowid в виртуальной таблице FTS5 search_fts
+class SearchDocument(db.Model):
+    __tablename__ = 'search_documents'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'event' или 'post'
+    ref_id = db.Column(db.String(50), nullable=False)
+    title = db.Column(db.String(255))
+    tsv = db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'ref_id', name='unique_search_document'),
+        db.Index('idx_search_tsv', 'tsv', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
+# Загруженная картинка по хэшу содержимого; refcount - сколько записей (аватары, события) на нее ссылается.
+# Файлы удаляет только сборщик мусора, когда refcount = 0 дольше грейс-периода
+class MediaObject(db.Model):
+    __tablename__ = 'media_objects'
+    folder = db.Column(db.String(20), primary_key=True)  # 'avatars' или 'events'
+    digest = db.Column(db.String(64), primary_key=True)
+    refcount = db.Column(db.Integer, default=0, nullable=False)
+    size_bytes = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_media_gc', 'refcount', 'updated_at'),
+    )
@@ -0,0 +1,183 @@
+import datetime
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func
+
+from models import db, Notification, NotificationJob, follows
+
+# Зависшая задача (воркер упал посреди рассылки) снова берется в работу через это время
+STALE_JOB_AFTER = datetime.timedelta(minutes=5)
+# Сбой рассылки (база недоступна, дедлок) повторяется: id уведомлений детерминированы, повтор не создает дублей
+MAX_JOB_ATTEMPTS = 5
+
+
+def notification_id(job_id, recipient_id):
+    # Детерминированный id: повтор пачки после сбоя не создаст дубликатов, а разные рассылки не пересекаются
+    return f"{job_id}_{recipient_id}"
+
+
+class NotificationFanout:
+    """Фоновая рассылка уведомлений подписчикам пачками.
+
+    Запрос создания события только ставит NotificationJob в очередь. Воркер
+    идет по подписчикам в порядке follower_id, на каждую пачку делает один
+    bulk insert, сдвигает курсор задачи в той же транзакции и отправляет один
+    socket-кадр сразу во все комнаты пачки. Раз в resume_interval воркер
+    подбирает из базы задачи, поставленные до рестарта, брошенные упавшим
+    процессом и отложенные на повтор после ошибки.
+    """
+
+    def __init__(self, chunk_size=1000, poll_interval=0.5, resume_interval=30.0):
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.resume_interval = resume_interval
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def enqueue(self, job_id):
+        self._queue.append(job_id)
+
+    def ensure_worker(self, app, socketio):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._worker_loop, app, socketio)
+
+    def _worker_loop(self, app, socketio):
+        # Как и остальные фоновые циклы, первый проход - не сразу на старте, а через интервал
+        resume_at = time.monotonic() + self.resume_interval
+        while True:
+            if time.monotonic() >= resume_at:
+                resume_at = time.monotonic() + self.resume_interval
+                with app.app_context():
+                    try:
+                        self._resume_unfinished()
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.warning(f"Notification fan-out resume failed: {e}")
+                    finally:
+                        db.session.remove()
+            if not self._queue:
+                socketio.sleep(self.poll_interval)
+                continue
+            job_id = self._queue.popleft()
+            with app.app_context():
+                try:
+                    self.process(job_id, socketio)
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.warning(f"Notification fan-out {job_id} failed: {e}")
+                    self._release_failed(job_id, str(e))
+                finally:
+                    db.session.remove()
+
+    def _resume_unfinished(self):
+        stale_before = datetime.datetime.utcnow() - STALE_JOB_AFTER
+        stale = db.and_(NotificationJob.status == 'running', NotificationJob.updated_at < stale_before)
+        # Задача, на которой процесс падал уже MAX_JOB_ATTEMPTS раз, больше не берется
+        NotificationJob.query.filter(stale, NotificationJob.attempts >= MAX_JOB_ATTEMPTS).update(
+            {NotificationJob.status: 'failed', NotificationJob.error: 'worker stopped during fan-out'}, synchronize_session=False)
+        db.session.commit()
+        jobs = NotificationJob.query.with_entities(NotificationJob.id).filter(
+            db.or_(NotificationJob.status == 'queued', stale)).order_by(NotificationJob.created_at).all()
+        queued = set(self._queue)
+        for job in jobs:
+            if job.id not in queued: self._queue.append(job.id)
+
+    def _claim(self, job_id):
+        # Условный UPDATE: при нескольких процессах задачу возьмет только один
+        now = datetime.datetime.utcnow()
+        claimed = NotificationJob.query.filter(
+            NotificationJob.id == job_id,
+            db.or_(NotificationJob.status == 'queued',
+                   db.and_(NotificationJob.status == 'running', NotificationJob.updated_at < now - STALE_JOB_AFTER))
+        ).update({NotificationJob.status: 'running', NotificationJob.attempts: NotificationJob.attempts + 1, NotificationJob.updated_at: now},
+                 synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _release_failed(self, job_id, error):
+        """После ошибки задача возвращается в очередь (ее подберет _resume_unfinished), пока не исчерпаны попытки."""
+        try:
+            NotificationJob.query.filter(NotificationJob.id == job_id, NotificationJob.status == 'running').update(
+                {NotificationJob.status: db.case((NotificationJob.attempts >= MAX_JOB_ATTEMPTS, 'failed'), else_='queued'),
+                 NotificationJob.error: error[:1000], NotificationJob.updated_at: datetime.datetime.utcnow()},
+                synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    def process(self, job_id, socketio):
+        if not self._claim(job_id):
+            return
+        job = db.session.get(NotificationJob, job_id)
+        if job.total is None:
+            job.total = db.session.query(func.count()).select_from(follows).filter(follows.c.organizer_id == job.organizer_id).scalar()
+            db.session.commit()
+        while True:
+            query = db.session.query(follows.c.follower_id).filter(follows.c.organizer_id == job.organizer_id)
+            if job.last_follower_id:
+                query = query.filter(follows.c.follower_id > job.last_follower_id)
+            follower_ids = [row.follower_id for row in query.order_by(follows.c.follower_id).limit(self.chunk_size)]
+            if not follower_ids:
+                job.status = 'done'; job.updated_at = datetime.datetime.utcnow()
+                db.session.commit()
+                return
+            if job.attempts > 1:
+                # Повтор: пачка могла записаться, а commit не дойти до ответа - уже созданные уведомления пропускаем
+                existing = {row.id for row in db.session.query(Notification.id).filter(
+                    Notification.id.in_([notification_id(job.id, follower_id) for follower_id in follower_ids]))}
+                new_ids = [follower_id for follower_id in follower_ids if notification_id(job.id, follower_id) not in existing]
+            else:
+                new_ids = follower_ids
+            if new_ids: db.session.execute(Notification.__table__.insert(), [
+                {"id": notification_id(job.id, follower_id), "recipient_id": follower_id, "type": job.type,
+                 "content": job.content, "related_id": job.event_id, "is_read": False, "timestamp": job.created_at}
+                for follower_id in new_ids
+            ])
+            job.last_follower_id = follower_ids[-1]
+            job.sent = (job.sent or 0) + len(follower_ids)
+            job.updated_at = datetime.datetime.utcnow()
+            db.session.commit()
+            # Общий кадр на всю пачку: id уведомления клиент собирает как idPrefix + свой userId
+            payload = {
+                "id": None, "idPrefix": notification_id(job.id, ''), "recipientId": None, "type": job.type,
+                "content": job.content, "relatedId": job.event_id, "isRead": False, "timestamp": job.created_at.isoformat()
+            }
+            if new_ids: socketio.emit('new_notification', payload, to=[f"user_{follower_id}" for follower_id in new_ids])
+            socketio.sleep(0)
+
+
+def prune_notifications(max_age, max_per_user, now=None):
+    """Удаляет уведомления старше max_age и все, что не входит в max_per_user последних у пользователя."""
+    if max_per_user < 1:
+        raise ValueError("max_per_user must be at least 1")
+    if now is None:
+        now = datetime.datetime.utcnow()
+    removed = Notification.query.filter(Notification.timestamp < now - max_age).delete(synchronize_session=False)
+    # Лишние у всех пользователей - одним DELETE: номер уведомления в ленте получателя по idx_notification_feed
+    ranked = db.select(Notification.id, func.row_number().over(
+        partition_by=Notification.recipient_id, order_by=(Notification.timestamp.desc(), Notification.id.desc())
+    ).label('position')).subquery()
+    removed += Notification.query.filter(
+        Notification.id.in_(db.select(ranked.c.id).where(ranked.c.position > max_per_user))
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def retention_loop(app, sleep, interval, max_age, max_per_user):
+    while True:
+        sleep(interval)
+        with app.app_context():
+            try:
+                prune_notifications(max_age, max_per_user)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"Notification retention failed: {e}")
+            finally:
+                db.session.remove()
@@ -0,0 +1,72 @@
+import base64
+import datetime
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки последней записи в непрозрачную строку."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Обратная операция к encode_cursor. Для битого курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list):
+        return None
+    return values
+
+
+def decode_keyset_cursor(cursor, key_types):
+    """Курсор вида [ключ сортировки, id]: ключ - значение одного из key_types, id - строка. Для битого курсора возвращает None."""
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2:
+        return None
+    key, row_id = values
+    # bool - тоже int, но ключом сортировки не бывает
+    if isinstance(key, bool) or not isinstance(key, key_types) or not isinstance(row_id, str):
+        return None
+    return values
+
+
+def decode_time_cursor(cursor):
+    """Курсор вида [isoformat-время, id]. Для битого курсора возвращает None."""
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2 or not isinstance(values[1], str):
+        return None
+    try:
+        return [datetime.datetime.fromisoformat(values[0]), values[1]]
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_limit(raw_value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        limit = int(raw_value)
+    except (TypeError, ValueError):
+        return default
+    if limit < 1:
+        return default
+    return min(limit, maximum)
+
+
+def is_paginated(args):
+    """Пагинация включается явно, чтобы старые клиенты получали полный список."""
+    return 'limit' in args or 'cursor' in args
+
+
+def split_page(rows, limit, key_func):
+    """Из limit + 1 строк отделяет страницу и строит курсор на следующую."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key_func(page[-1]))
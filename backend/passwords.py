@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import greenlet
+
+from models import bcrypt
+
+# bcrypt отпускает GIL, поэтому обычные потоки считают хэши параллельно с циклом событий
+DEFAULT_ROUNDS = 12
+
+
+def hash_rounds(password_hash):
+    """Стоимость из строки вида $2b$12$...; None для не-bcrypt значений."""
+    parts = (password_hash or '').split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def in_green_thread():
+    try:
+        from eventlet.greenthread import GreenThread
+    except ImportError:
+        return False
+    return isinstance(greenlet.getcurrent(), GreenThread)
+
+
+class PasswordHasher:
+    """Хэширование паролей вне цикла событий.
+
+    Под eventlet вызов уходит в eventlet.tpool: настоящий поток считает хэш,
+    а зеленый поток запроса засыпает и не держит хаб, так что Socket.IO
+    продолжает обслуживаться. Вне eventlet (тесты, gunicorn с потоками) -
+    ограниченный ThreadPoolExecutor. workers=0 - прямо в запросе.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=4):
+        self.rounds = rounds
+        self.workers = workers
+        self._executor = None
+        self._tpool_ready = False
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+
+    def _run(self, function, *args):
+        if self.workers <= 0:
+            return function(*args)
+        if in_green_thread():
+            from eventlet import tpool
+            with self._lock:
+                if not self._tpool_ready:
+                    # Размер пула tpool задается до первого вызова
+                    tpool.set_num_threads(self.workers)
+                    self._tpool_ready = True
+            return tpool.execute(function, *args)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            executor = self._executor
+        return executor.submit(function, *args).result()
+
+    def hash(self, password):
+        self.hashed += 1
+        return self._run(bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        self.verified += 1
+        try:
+            return self._run(bcrypt.check_password_hash, password_hash, password)
+        except ValueError:
+            # Строка не bcrypt (например, учетка из сида) - вход не проходит
+            return False
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def upgrade(self, user, password):
+        """После успешного входа: пересчитывает хэш, если стоимость в конфиге изменилась. Коммит - за вызывающим."""
+        if not self.needs_rehash(user.password_hash):
+            return False
+        user.password_hash = self.hash(password)
+        self.rehashed += 1
+        return True
+
+    def stats(self):
+        return {"rounds": self.rounds, "workers": self.workers, "hashed": self.hashed,
+                "verified": self.verified, "rehashed": self.rehashed}
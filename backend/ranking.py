@@ -0,0 +1,130 @@
+import datetime
+import math
+
+from sqlalchemy import bindparam, func
+
+from models import db, Event, Post, Ticket, favorites
+
+# Оба балла не требуют периодического пересчета: "затухание" выражено через время,
+# поэтому порядок строк меняется только при новых сигналах, и хватает обычного индекса.
+#
+# hot      = sign(e) * log10(max(|e|, 1)) + (t_создания - EPOCH) / HOT_SCALE
+#            каждые HOT_SCALE секунд новизны весят как десятикратный рост вовлеченности
+# trending = ln(сумма w_i * exp((t_i - EPOCH) / TREND_TAU)) - скорость активности
+#            с экспоненциальным затуханием; хранится в лог-шкале и копится через logaddexp
+EPOCH = datetime.datetime(2024, 1, 1)
+HOT_SCALE = 45000.0
+TREND_TAU = 6 * 3600.0
+
+# Вклад сигналов: пост - голоса и комментарии, событие - просмотры, избранное и билеты
+COMMENT_WEIGHT = 2.0
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 5.0
+TICKET_WEIGHT = 10.0
+
+UPDATE_CHUNK = 500
+
+
+def seconds_since_epoch(moment):
+    return (moment - EPOCH).total_seconds()
+
+
+def hot_score(engagement, created_at):
+    order = math.log10(max(abs(engagement), 1.0))
+    sign = 1 if engagement > 0 else -1 if engagement < 0 else 0
+    return round(sign * order + seconds_since_epoch(created_at) / HOT_SCALE, 7)
+
+
+def add_trend(current, weight, at):
+    """Добавляет активность веса weight в момент at к лог-сумме current."""
+    if weight <= 0:
+        return current
+    point = math.log(weight) + seconds_since_epoch(at) / TREND_TAU
+    if current is None:
+        return point
+    high, low = max(current, point), min(current, point)
+    return high + math.log1p(math.exp(low - high))
+
+
+def post_engagement(upvotes, downvotes, comment_count):
+    return (upvotes or 0) - (downvotes or 0) + COMMENT_WEIGHT * (comment_count or 0)
+
+
+def initial_scores(created_at):
+    # Новая запись стартует с единичной активностью, чтобы сразу попадать в "trending"
+    return hot_score(0, created_at), add_trend(None, 1.0, created_at)
+
+
+def bump_posts(trend_weights, at=None):
+    """Пересчитывает баллы постов после изменения их счетчиков.
+
+    Вызывается в той же транзакции после UPDATE счетчиков: строка уже
+    заблокирована, поэтому чтение и запись баллов не теряют параллельные обновления.
+    """
+    if not trend_weights:
+        return
+    at = at or datetime.datetime.utcnow()
+    rows = db.session.query(Post.id, Post.upvotes, Post.downvotes, Post.comment_count, Post.timestamp, Post.trend_score).filter(
+        Post.id.in_(list(trend_weights))).all()
+    updates = [{"b_id": row.id,
+                "b_hot": hot_score(post_engagement(row.upvotes, row.downvotes, row.comment_count), row.timestamp or at),
+                "b_trend": add_trend(row.trend_score, trend_weights[row.id], at)} for row in rows]
+    if updates:
+        posts = Post.__table__
+        db.session.execute(posts.update().where(posts.c.id == bindparam('b_id')).values(
+            hot_score=bindparam('b_hot'), trend_score=bindparam('b_trend')), updates)
+
+
+def bump_events(engagement_deltas, at=None):
+    """Добавляет вовлеченность событиям ({event_id: вес}, вес может быть отрицательным)."""
+    deltas = {event_id: delta for event_id, delta in engagement_deltas.items() if delta}
+    if not deltas:
+        return
+    at = at or datetime.datetime.utcnow()
+    event_ids = list(deltas)
+    events = Event.__table__
+    for start in range(0, len(event_ids), UPDATE_CHUNK):
+        chunk = event_ids[start:start + UPDATE_CHUNK]
+        # Сначала атомарный инкремент: он же блокирует строки до конца транзакции
+        db.session.execute(events.update().where(events.c.id == bindparam('b_id')).values(
+            engagement=events.c.engagement + bindparam('b_delta')),
+            [{"b_id": event_id, "b_delta": deltas[event_id]} for event_id in chunk])
+        rows = db.session.query(Event.id, Event.engagement, Event.added_at, Event.trend_score).filter(Event.id.in_(chunk)).all()
+        updates = [{"b_id": row.id, "b_hot": hot_score(row.engagement, row.added_at or at),
+                    "b_trend": add_trend(row.trend_score, deltas[row.id], at)} for row in rows]
+        if updates:
+            db.session.execute(events.update().where(events.c.id == bindparam('b_id')).values(
+                hot_score=bindparam('b_hot'), trend_score=bindparam('b_trend')), updates)
+
+
+def rebuild_rankings():
+    """Пересчет баллов из счетчиков (для строк, созданных до появления рейтинга, или после сбоя).
+
+    История активности не хранится, поэтому вся вовлеченность считается
+    пришедшей в момент создания записи.
+    """
+    posts = Post.__table__
+    updates = []
+    for row in db.session.query(Post.id, Post.upvotes, Post.downvotes, Post.comment_count, Post.timestamp):
+        created_at = row.timestamp or EPOCH
+        engagement = post_engagement(row.upvotes, row.downvotes, row.comment_count)
+        hot, trend = initial_scores(created_at)
+        updates.append({"b_id": row.id, "b_hot": hot_score(engagement, created_at), "b_trend": add_trend(trend, engagement, created_at)})
+    if updates:
+        db.session.execute(posts.update().where(posts.c.id == bindparam('b_id')).values(
+            hot_score=bindparam('b_hot'), trend_score=bindparam('b_trend')), updates)
+    favorite_counts = dict(db.session.query(favorites.c.event_id, func.count()).group_by(favorites.c.event_id).all())
+    ticket_counts = dict(db.session.query(Ticket.event_id, func.coalesce(func.sum(Ticket.quantity), 0)).group_by(Ticket.event_id).all())
+    events = Event.__table__
+    event_updates = []
+    for row in db.session.query(Event.id, Event.views, Event.added_at):
+        created_at = row.added_at or EPOCH
+        engagement = (VIEW_WEIGHT * (row.views or 0) + FAVORITE_WEIGHT * favorite_counts.get(row.id, 0)
+                      + TICKET_WEIGHT * int(ticket_counts.get(row.id, 0)))
+        hot, trend = initial_scores(created_at)
+        event_updates.append({"b_id": row.id, "b_engagement": engagement, "b_hot": hot_score(engagement, created_at),
+                              "b_trend": add_trend(trend, engagement, created_at)})
+    if event_updates:
+        db.session.execute(events.update().where(events.c.id == bindparam('b_id')).values(
+            engagement=bindparam('b_engagement'), hot_score=bindparam('b_hot'), trend_score=bindparam('b_trend')), event_updates)
+    return len(updates), len(event_updates)
@@ -0,0 +1,226 @@
+import json
+import os
+import socketserver
+import threading
+
+import socketio
+
+# Служебные события между воркерами идут по той же очереди, что и Socket.IO,
+# но клиентам не доставляются
+CLUSTER_ROOM = '__cluster'
+CLUSTER_PREFIX = '__cluster:'
+RECONNECT_DELAY = 1.0
+
+
+class ClusterMixin:
+    """Добавляет менеджеру Socket.IO обработчики служебных событий (сброс кэшей и т.п.)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cluster_handlers = {}
+
+    def _handle_emit(self, message):
+        event = message.get('event') or ''
+        if not event.startswith(CLUSTER_PREFIX):
+            return super()._handle_emit(message)
+        # Свой процесс уже применил изменение до отправки
+        if message.get('host_id') == self.host_id:
+            return
+        handler = self.cluster_handlers.get(event[len(CLUSTER_PREFIX):])
+        if handler is not None:
+            data = message.get('data') or [None]
+            handler(data[0])
+
+
+def green_modules(async_mode):
+    """socket и lock, совместимые с режимом сервера: без monkey_patch обычный сокет заблокировал бы хаб eventlet."""
+    if async_mode == 'eventlet':
+        from eventlet.green import socket as green_socket
+        from eventlet.semaphore import Semaphore
+        return green_socket, Semaphore
+    import socket as native_socket
+    return native_socket, threading.Lock
+
+
+class UnixSocketManager(ClusterMixin, socketio.PubSubManager):
+    """Очередь через локальный брокер на Unix-сокете (flask socketio-broker).
+
+    Для нескольких процессов на одной машине без Redis. Одно соединение на
+    процесс: чтение в фоновой задаче менеджера, запись - под блокировкой.
+    Сообщения - JSON по строке; при обрыве соединение переподключается,
+    а сообщения, отправленные в этот момент, теряются (как у RedisManager).
+    """
+    name = 'unix'
+
+    def __init__(self, path, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = path
+        self._connection = None
+        self._reader = None
+        self._write_lock = None
+
+    def _ensure_connection(self):
+        if self._write_lock is None:
+            # Публикация возможна и до initialize() (emit из HTTP-запроса до первого сокета)
+            self._socket_module, lock_class = green_modules(self.server.async_mode)
+            self._write_lock = lock_class()
+        # Под блокировкой: чтение и запись не должны открыть два соединения
+        with self._write_lock:
+            if self._connection is None:
+                connection = self._socket_module.socket(self._socket_module.AF_UNIX, self._socket_module.SOCK_STREAM)
+                connection.connect(self.path)
+                connection.sendall((self.channel + '\n').encode())
+                self._connection, self._reader = connection, connection.makefile('rb')
+            return self._connection, self._reader
+
+    def _reset(self):
+        connection, self._connection, self._reader = self._connection, None, None
+        if connection is not None:
+            try: connection.close()
+            except OSError: pass
+
+    def _publish(self, data):
+        frame = (json.dumps(data, separators=(',', ':')) + '\n').encode()
+        for attempt in range(2):
+            try:
+                connection, _ = self._ensure_connection()
+                with self._write_lock:
+                    connection.sendall(frame)
+                return
+            except OSError as e:
+                self._reset()
+                if attempt:
+                    self._get_logger().error(f"Cannot publish to {self.path}: {e}")
+
+    def _listen(self):
+        while True:
+            try:
+                _, reader = self._ensure_connection()
+                line = reader.readline()
+                if not line:
+                    raise OSError('broker closed the connection')
+                yield line.decode()
+            except OSError as e:
+                self._get_logger().warning(f"Socket.IO broker {self.path} unavailable: {e}")
+                self._reset()
+                self.server.sleep(RECONNECT_DELAY)
+
+
+# Каналы памяти процесса: {имя: [очереди подписчиков]}
+_memory_channels = {}
+_memory_lock = threading.Lock()
+
+
+class MemoryManager(ClusterMixin, socketio.PubSubManager):
+    """Очередь в памяти процесса: несколько серверов Socket.IO в одном процессе (тесты)."""
+    name = 'memory'
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        with _memory_lock:
+            subscribers = list(_memory_channels.get(self.channel, []))
+        for queue in subscribers:
+            queue.put(json.dumps(data))
+
+    def _listen(self):
+        queue = self.server.eio.create_queue()
+        with _memory_lock:
+            _memory_channels.setdefault(self.channel, []).append(queue)
+        while True:
+            yield queue.get()
+
+
+def make_client_manager(url, channel='socketio'):
+    """Менеджер Socket.IO по URL очереди; пустой URL - None (один процесс, комнаты в памяти).
+
+    unix:///путь/к/сокету - локальный брокер, memory:// - очередь в памяти процесса,
+    redis://, valkey://, kafka://, zmq+tcp:// и любые URL kombu (amqp:// и т.п.) -
+    стандартные менеджеры python-socketio (нужна соответствующая библиотека).
+    """
+    if not url:
+        return None
+    scheme = url.split('://', 1)[0]
+    if scheme == 'unix':
+        return UnixSocketManager(url[len('unix://'):], channel=channel)
+    if scheme == 'memory':
+        return MemoryManager(channel=url[len('memory://'):] or channel)
+    if scheme.startswith(('redis', 'valkey')):
+        base = socketio.RedisManager
+    elif scheme == 'kafka':
+        base = socketio.KafkaManager
+    elif scheme.startswith('zmq'):
+        base = socketio.ZmqManager
+    else:
+        base = socketio.KombuManager
+    manager_class = type(f"Cluster{base.__name__}", (ClusterMixin, base), {})
+    return manager_class(url, channel=channel)
+
+
+class ClusterBus:
+    """Служебные сообщения между воркерами; без очереди - ничего не делает."""
+
+    def __init__(self, socketio_server):
+        self.socketio = socketio_server
+
+    @property
+    def enabled(self):
+        return isinstance(self.socketio.server.manager, ClusterMixin)
+
+    def start(self):
+        """Запускает прослушивание очереди, не дожидаясь первого подключения клиента Socket.IO."""
+        server = self.socketio.server
+        if self.enabled and not server.manager_initialized:
+            server.manager_initialized = True
+            server.manager.initialize()
+
+    def subscribe(self, name, handler):
+        if self.enabled:
+            self.socketio.server.manager.cluster_handlers[name] = handler
+
+    def publish(self, name, data):
+        if self.enabled:
+            self.socketio.emit(CLUSTER_PREFIX + name, data, to=CLUSTER_ROOM)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        broker = self.server
+        channel = self.rfile.readline().strip().decode()
+        lock = threading.Lock()
+        with broker.lock:
+            broker.channels.setdefault(channel, {})[self] = lock
+        try:
+            for line in self.rfile:
+                with broker.lock:
+                    peers = list(broker.channels[channel].items())
+                # Отправителю тоже: ответы на ack адресуются по host_id, свои emit менеджер пропускает сам
+                for peer, peer_lock in peers:
+                    try:
+                        with peer_lock:
+                            peer.wfile.write(line)
+                            peer.wfile.flush()
+                    except OSError:
+                        pass
+                broker.relayed += 1
+        finally:
+            with broker.lock:
+                broker.channels[channel].pop(self, None)
+
+
+class UnixSocketBroker(socketserver.ThreadingUnixStreamServer):
+    """Рассылает каждую строку всем подключенным процессам того же канала."""
+    daemon_threads = True
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, _BrokerHandler)
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.relayed = 0
+
+    def connections(self):
+        with self.lock:
+            return sum(len(peers) for peers in self.channels.values())
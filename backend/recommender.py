@@ -0,0 +1,450 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from models import db, Event, EventView, Ticket, User, favorites, follows, user_interests
+
+CANDIDATES_PER_USER = 200
+REFRESH_BATCH = 200
+# Вклад сигналов в итоговый балл
+INTEREST_WEIGHT = 3.0
+FOLLOW_WEIGHT = 2.0
+CO_ENGAGEMENT_WEIGHT = 1.5
+POPULARITY_WEIGHT = 0.5
+SOON_WEIGHT = 0.5
+SOON_DAYS = 30.0
+# Вес взаимодействия: покупка билета > избранное > просмотр
+ENGAGEMENT_WEIGHTS = {'ticket': 3.0, 'favorite': 2.0, 'view': 1.0}
+MAX_CO_USERS = 2000
+DAY_MS = 24 * 3600 * 1000
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def user_age(birth_date):
+    try:
+        born = datetime.date.fromisoformat(birth_date)
+    except (TypeError, ValueError):
+        return None
+    today = datetime.date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def event_labels(tags, categories):
+    return sorted({str(v).strip().lower() for v in (tags or []) + (categories or []) if str(v).strip()})
+
+
+class EventCatalog:
+    """Признаки предстоящих событий в массивах NumPy.
+
+    matrix - плотная матрица событие x метка (теги и категории в нижнем
+    регистре), строки нормированы на корень из числа меток. Строки и столбцы
+    выделяются с запасом и растут удвоением, поэтому upsert не копирует всю
+    матрицу на каждое событие; строка удаленного события гасится в active и
+    отдается следующему upsert. Прошедшие события уходят при перечитывании каталога.
+    """
+
+    MIN_CAPACITY = 64
+
+    def __init__(self):
+        self.labels = {}
+        self.organizers = {}
+        self.index = {}
+        self.free = []
+        self.ids = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.organizer_codes = np.zeros(0, dtype=np.int32)
+        self.timestamps = np.zeros(0, dtype=np.int64)
+        self.views = np.zeros(0, dtype=np.float32)
+        self.age_limits = np.zeros(0, dtype=np.int32)
+        self.active = np.zeros(0, dtype=bool)
+        self.max_popularity = 0.0
+
+    def __len__(self):
+        return len(self.index)
+
+    def _organizer_code(self, organizer_id):
+        return self.organizers.setdefault(organizer_id, len(self.organizers))
+
+    def _label_columns(self, labels):
+        for label in labels:
+            if label not in self.labels: self.labels[label] = len(self.labels)
+        if len(self.labels) > self.matrix.shape[1]:
+            columns = max(self.MIN_CAPACITY, self.matrix.shape[1] * 2, len(self.labels))
+            self.matrix = np.pad(self.matrix, ((0, 0), (0, columns - self.matrix.shape[1])))
+        return [self.labels[label] for label in labels]
+
+    def _grow(self, rows):
+        """Добавляет rows свободных строк в конец всех массивов."""
+        self.free.extend(range(len(self.ids) + rows - 1, len(self.ids) - 1, -1))
+        self.ids.extend([None] * rows)
+        self.matrix = np.pad(self.matrix, ((0, rows), (0, 0)))
+        self.organizer_codes = np.pad(self.organizer_codes, (0, rows))
+        self.timestamps = np.pad(self.timestamps, (0, rows))
+        self.views = np.pad(self.views, (0, rows))
+        self.age_limits = np.pad(self.age_limits, (0, rows))
+        self.active = np.pad(self.active, (0, rows))
+
+    def load(self, rows):
+        """rows: (id, organizer_id, tags, categories, event_timestamp, views, age_limit)."""
+        self.__init__()
+        rows = list(rows)
+        self._grow(max(self.MIN_CAPACITY, len(rows)))
+        for row in rows:
+            self.upsert(row)
+
+    def upsert(self, row):
+        position = self.index.get(row[0])
+        if position is None:
+            if not self.free: self._grow(max(self.MIN_CAPACITY, len(self.ids)))
+            position = self.free.pop()
+            self.index[row[0]] = position
+            self.ids[position] = row[0]
+        cols = self._label_columns(event_labels(row[2], row[3]))
+        self.matrix[position] = 0.0
+        if cols:
+            self.matrix[position, cols] = 1.0 / np.sqrt(len(cols))
+        self.organizer_codes[position] = self._organizer_code(row[1])
+        self.timestamps[position] = row[4] or 0
+        self.views[position] = row[5] or 0
+        self.age_limits[position] = row[6] or 0
+        self.active[position] = True
+        # Максимум только растет: после удаления самого популярного события его сбросит перечитывание каталога
+        self.max_popularity = max(self.max_popularity, float(np.log1p(self.views[position])))
+        return position
+
+    def remove(self, event_id):
+        position = self.index.pop(event_id, None)
+        if position is not None:
+            self.active[position] = False
+            self.ids[position] = None
+            self.free.append(position)
+
+    def base_scores(self, current_ms):
+        """Не зависящая от пользователя часть балла: популярность и близость даты."""
+        popularity = np.log1p(self.views)
+        if self.max_popularity > 0:
+            popularity = popularity / self.max_popularity
+        days_ahead = np.maximum(self.timestamps - current_ms, 0) / DAY_MS
+        return POPULARITY_WEIGHT * popularity + SOON_WEIGHT * np.exp(-days_ahead / SOON_DAYS)
+
+    def base_score(self, position, current_ms):
+        """base_scores для одной строки, без прохода по всему каталогу."""
+        popularity = float(np.log1p(self.views[position]))
+        if self.max_popularity > 0:
+            popularity /= self.max_popularity
+        days_ahead = max(int(self.timestamps[position]) - current_ms, 0) / DAY_MS
+        return POPULARITY_WEIGHT * popularity + SOON_WEIGHT * float(np.exp(-days_ahead / SOON_DAYS))
+
+    def is_live(self, event_id, current_ms):
+        position = self.index.get(event_id)
+        return position is not None and self.timestamps[position] >= current_ms
+
+
+def engagement_rows(column_name, values):
+    """(user_id, event_id, вес) из избранного, билетов и просмотров авторизованных пользователей."""
+    sources = (
+        ('favorite', favorites.c.user_id, favorites.c.event_id),
+        ('ticket', Ticket.user_id, Ticket.event_id),
+        ('view', EventView.user_id, EventView.event_id),
+    )
+    rows = []
+    for kind, user_column, event_column in sources:
+        column = user_column if column_name == 'user_id' else event_column
+        query = db.session.query(user_column, event_column).filter(column.in_(values), user_column.isnot(None))
+        rows.extend((user_id, event_id, kind) for user_id, event_id in query)
+    return rows
+
+
+def load_profiles(user_ids):
+    """Сигналы пачки пользователей фиксированным числом запросов, независимо от размера пачки."""
+    profiles = {user_id: {"interests": set(), "followed": set(), "seeds": {}, "tickets": set(), "co": {}, "age": None}
+                for user_id in user_ids}
+    if not user_ids:
+        return profiles
+    for user_id, birth_date in db.session.query(User.id, User.birth_date).filter(User.id.in_(user_ids)):
+        profiles[user_id]["age"] = user_age(birth_date)
+    for user_id, name in db.session.query(user_interests.c.user_id, user_interests.c.interest_name).filter(user_interests.c.user_id.in_(user_ids)):
+        profiles[user_id]["interests"].add(name.strip().lower())
+    for follower_id, organizer_id in db.session.query(follows.c.follower_id, follows.c.organizer_id).filter(follows.c.follower_id.in_(user_ids)):
+        profiles[follower_id]["followed"].add(organizer_id)
+    for user_id, event_id, kind in engagement_rows('user_id', user_ids):
+        seeds = profiles[user_id]["seeds"]
+        seeds[event_id] = max(seeds.get(event_id, 0.0), ENGAGEMENT_WEIGHTS[kind])
+        if kind == 'ticket':
+            profiles[user_id]["tickets"].add(event_id)
+    # Совместное вовлечение: что еще выбирали люди, взаимодействовавшие с теми же событиями
+    seed_events = {event_id for profile in profiles.values() for event_id in profile["seeds"]}
+    if not seed_events:
+        return profiles
+    users_by_event = {}
+    co_users = set()
+    for user_id, event_id, _ in engagement_rows('event_id', list(seed_events)):
+        if len(co_users) >= MAX_CO_USERS and user_id not in co_users:
+            continue
+        users_by_event.setdefault(event_id, set()).add(user_id)
+        co_users.add(user_id)
+    engaged_by_user = {}
+    if co_users:
+        for user_id, event_id, kind in engagement_rows('user_id', list(co_users)):
+            events = engaged_by_user.setdefault(user_id, {})
+            events[event_id] = max(events.get(event_id, 0.0), ENGAGEMENT_WEIGHTS[kind])
+    for user_id, profile in profiles.items():
+        neighbours = set()
+        for event_id in profile["seeds"]:
+            neighbours |= users_by_event.get(event_id, set())
+        neighbours.discard(user_id)
+        co = profile["co"]
+        for neighbour in neighbours:
+            for event_id, weight in engaged_by_user.get(neighbour, {}).items():
+                if event_id not in profile["seeds"]:
+                    co[event_id] = co.get(event_id, 0.0) + weight
+    return profiles
+
+
+class Recommender:
+    """Рекомендации "Для вас" с заранее посчитанными списками кандидатов.
+
+    Сигналы пользователя (интересы, подписки, избранное, билеты, просмотры)
+    меняются через mark_dirty: фоновый цикл пересчитывает помеченных
+    пользователей пачками, одним матричным умножением на пачку. Новое или
+    измененное событие сразу попадает в каталог, а в закэшированные списки его
+    досчитывает тот же фоновый цикл, без полного пересчета списков. Кэш у каждого процесса свой, поэтому списки дополнительно
+    живут не дольше ttl.
+    """
+
+    def __init__(self, max_users=10000, ttl_seconds=600, refresh_interval=2.0, catalog_reload_seconds=600):
+        self.max_users = max_users
+        self.ttl = ttl_seconds
+        self.refresh_interval = refresh_interval
+        self.catalog_reload_seconds = catalog_reload_seconds
+        self.catalog = EventCatalog()
+        self._catalog_loaded_at = None
+        self._lists = OrderedDict()
+        self._dirty = set()
+        self._changed_events = set()
+        self._lock = threading.RLock()
+        self._started = False
+        self.computed = 0
+        self.served_from_cache = 0
+
+    # --- Каталог событий ---
+
+    def _catalog_rows(self, query):
+        return query.with_entities(Event.id, Event.organizer_id, Event.tags, Event.categories,
+                                   Event.event_timestamp, Event.views, Event.age_limit).all()
+
+    def reload_catalog(self):
+        # Прошедшие события рекомендовать нельзя: в каталог они не загружаются
+        rows = self._catalog_rows(Event.query.filter(Event.event_timestamp >= now_ms()))
+        with self._lock:
+            self.catalog.load(rows)
+            self._catalog_loaded_at = time.monotonic()
+
+    def _ensure_catalog(self):
+        if self._catalog_loaded_at is None:
+            self.reload_catalog()
+
+    def event_changed(self, event):
+        """Событие создано или изменено: обновляем каталог, списки досчитает фоновый цикл."""
+        with self._lock:
+            if self._catalog_loaded_at is None:
+                return
+            if (event.event_timestamp or 0) < now_ms():
+                self.catalog.remove(event.id)
+            else:
+                self.catalog.upsert((event.id, event.organizer_id, event.tags, event.categories,
+                                     event.event_timestamp, event.views, event.age_limit))
+            self._changed_events.add(event.id)
+
+    def event_removed(self, event_id):
+        with self._lock:
+            self.catalog.remove(event_id)
+            self._changed_events.add(event_id)
+
+    def merge_changed_events(self):
+        """Досчитывает измененные события во все закэшированные списки (удаленные - убирает)."""
+        with self._lock:
+            event_ids, self._changed_events = self._changed_events, set()
+        for event_id in event_ids:
+            # Блокировка - на одно событие, запросы успевают проходить между ними
+            with self._lock:
+                position = self.catalog.index.get(event_id)
+                base = self.catalog.base_score(position, now_ms()) if position is not None else None
+                for entry in self._lists.values():
+                    self._merge(entry, event_id, self._score_one(entry["profile"], position, base) if position is not None else None)
+        return len(event_ids)
+
+    # --- Подсчет ---
+
+    def _allowed_mask(self, profile, user_id, current_ms):
+        catalog = self.catalog
+        mask = catalog.active & (catalog.timestamps >= current_ms)
+        if user_id is not None and user_id in catalog.organizers:
+            mask &= catalog.organizer_codes != catalog.organizers[user_id]
+        if profile["age"] is not None:
+            mask &= catalog.age_limits <= profile["age"]
+        for event_id in profile["tickets"]:
+            position = catalog.index.get(event_id)
+            if position is not None:
+                mask[position] = False
+        return mask
+
+    def _score_one(self, profile, position, base):
+        catalog = self.catalog
+        if not catalog.active[position] or catalog.timestamps[position] < now_ms():
+            return None
+        if profile["age"] is not None and catalog.age_limits[position] > profile["age"]:
+            return None
+        event_id = catalog.ids[position]
+        if event_id in profile["tickets"] or catalog.organizer_codes[position] == catalog.organizers.get(profile["user_id"], -1):
+            return None
+        cols = [catalog.labels[label] for label in profile["interests"] if label in catalog.labels]
+        score = base + INTEREST_WEIGHT * float(catalog.matrix[position, cols].sum()) if cols else base
+        followed_codes = {catalog.organizers[o] for o in profile["followed"] if o in catalog.organizers}
+        if catalog.organizer_codes[position] in followed_codes:
+            score += FOLLOW_WEIGHT
+        if profile["co"] and event_id in profile["co"]:
+            score += CO_ENGAGEMENT_WEIGHT * profile["co"][event_id] / max(profile["co"].values())
+        return float(score)
+
+    def score_batch(self, profiles):
+        """Списки кандидатов для пачки пользователей: интересы x метки одним умножением матриц."""
+        catalog = self.catalog
+        keys = list(profiles)
+        current_ms = now_ms()
+        interest_matrix = np.zeros((len(keys), catalog.matrix.shape[1]), dtype=np.float32)
+        for row, key in enumerate(keys):
+            cols = [catalog.labels[label] for label in profiles[key]["interests"] if label in catalog.labels]
+            interest_matrix[row, cols] = 1.0
+        interest_scores = interest_matrix @ catalog.matrix.T
+        base = catalog.base_scores(current_ms)
+        results = {}
+        for row, key in enumerate(keys):
+            profile = profiles[key]
+            scores = base + INTEREST_WEIGHT * interest_scores[row]
+            followed_codes = [catalog.organizers[o] for o in profile["followed"] if o in catalog.organizers]
+            if followed_codes:
+                scores = scores + FOLLOW_WEIGHT * np.isin(catalog.organizer_codes, followed_codes)
+            co_positions = [(catalog.index[e], w) for e, w in profile["co"].items() if e in catalog.index]
+            if co_positions:
+                positions, weights = zip(*co_positions)
+                co_vector = np.zeros(len(catalog.ids), dtype=np.float32)
+                co_vector[list(positions)] = weights
+                scores = scores + CO_ENGAGEMENT_WEIGHT * co_vector / co_vector.max()
+            scores = np.where(self._allowed_mask(profile, key, current_ms), scores, -np.inf)
+            allowed = int(np.isfinite(scores).sum())
+            top_n = min(CANDIDATES_PER_USER, allowed)
+            if top_n == 0:
+                results[key] = {"ids": [], "scores": {}}
+                continue
+            top = np.argpartition(-scores, top_n - 1)[:top_n]
+            top = top[np.lexsort((top, -scores[top]))]
+            ids = [catalog.ids[i] for i in top]
+            results[key] = {"ids": ids, "scores": {catalog.ids[i]: float(scores[i]) for i in top}}
+        return results
+
+    def _merge(self, entry, event_id, score):
+        scores = entry["scores"]
+        if score is None and event_id not in scores:
+            return
+        scores.pop(event_id, None)
+        if score is not None:
+            if len(scores) >= CANDIDATES_PER_USER and score <= min(scores.values()):
+                entry["ids"] = [i for i in entry["ids"] if i != event_id]
+                return
+            scores[event_id] = score
+            if len(scores) > CANDIDATES_PER_USER:
+                del scores[min(scores, key=scores.get)]
+        entry["ids"] = sorted(scores, key=lambda i: (-scores[i], i))
+
+    def refresh(self, user_ids):
+        """Пересчитывает списки пачки пользователей (None - анонимный список по популярности)."""
+        self._ensure_catalog()
+        real_ids = [user_id for user_id in user_ids if user_id is not None]
+        profiles = load_profiles(real_ids)
+        for user_id in user_ids:
+            if user_id is None:
+                profiles[None] = {"interests": set(), "followed": set(), "seeds": {}, "tickets": set(), "co": {}, "age": None}
+        for user_id, profile in profiles.items():
+            profile["user_id"] = user_id
+        with self._lock:
+            results = self.score_batch(profiles)
+            computed_at = time.monotonic()
+            for user_id, result in results.items():
+                result["profile"] = profiles[user_id]
+                result["computed_at"] = computed_at
+                self._lists[user_id] = result
+                self._lists.move_to_end(user_id)
+                self._dirty.discard(user_id)
+            while len(self._lists) > self.max_users:
+                self._lists.popitem(last=False)
+            self.computed += len(results)
+
+    def mark_dirty(self, user_id):
+        with self._lock:
+            if user_id in self._lists:
+                self._dirty.add(user_id)
+
+    def recommend(self, user_id, offset, limit):
+        """Страница id событий и смещение следующей страницы (None, если дальше пусто)."""
+        self._ensure_catalog()
+        with self._lock:
+            entry = self._lists.get(user_id)
+            fresh = entry is not None and time.monotonic() - entry["computed_at"] < self.ttl
+            if fresh:
+                self._lists.move_to_end(user_id)
+                self.served_from_cache += 1
+        if not fresh:
+            self.refresh([user_id])
+            with self._lock:
+                entry = self._lists[user_id]
+        current_ms = now_ms()
+        with self._lock:
+            live_ids = [event_id for event_id in entry["ids"] if self.catalog.is_live(event_id, current_ms)]
+        page = live_ids[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(live_ids) else None
+        return page, next_offset
+
+    # --- Фоновое обновление ---
+
+    def ensure_worker(self, app, socketio):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._worker_loop, app, socketio.sleep)
+
+    def _worker_loop(self, app, sleep):
+        while True:
+            sleep(self.refresh_interval)
+            with app.app_context():
+                try:
+                    self.refresh_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.warning(f"Recommendation refresh failed: {e}")
+                finally:
+                    db.session.remove()
+
+    def refresh_pending(self):
+        """Перечитывает каталог раз в catalog_reload_seconds (просмотры, прошедшие события), досчитывает
+        измененные события в списки и пересчитывает помеченных пользователей."""
+        if self._catalog_loaded_at is None or time.monotonic() - self._catalog_loaded_at > self.catalog_reload_seconds:
+            self.reload_catalog()
+        self.merge_changed_events()
+        with self._lock:
+            pending = list(self._dirty)
+        for start in range(0, len(pending), REFRESH_BATCH):
+            self.refresh(pending[start:start + REFRESH_BATCH])
+        return len(pending)
+
+    def stats(self):
+        with self._lock:
+            return {"events": len(self.catalog), "labels": len(self.catalog.labels), "cachedUsers": len(self._lists),
+                    "dirty": len(self._dirty), "changedEvents": len(self._changed_events), "computed": self.computed, "servedFromCache": self.served_from_cache}
@@ -1,5 +1,9 @@
-import psycopg2
+import argparse
+import bisect
+import datetime
+import itertools
 import os
+import random
 import shutil
 
 # Настройки подключения
@@ -45,6 +49,7 @@ def clear_media_files():
 
 def drop_tables():
     """Удаляет таблицы полностью, чтобы Flask пересоздал их с новыми колонками."""
+    import psycopg2
     conn = None
     try:
         conn = psycopg2.connect(
@@ -61,7 +66,18 @@ def drop_tables():
         # Список таблиц для удаления
         tables_to_drop = [
             "notifications", # Добавил эту таблицу, она есть в app.py
+            "notification_jobs",
+            "event_stats_hourly",
+            "event_stats_daily",
+            "rollup_watermarks",
+            "event_summaries",
+            "organizer_summaries",
             "event_views",
+            "event_labels",
+            "search_documents",
+            "media_objects",
+            "ticket_holds",
+            "idempotency_keys",
             "tickets",
             "comments",
             "post_votes",
@@ -92,13 +108,261 @@ def drop_tables():
             cur.close()
             conn.close()
 
+# --- Синтетические данные ---
+
+# Объемы по умолчанию; --scale умножает все сразу
+SEED_DEFAULTS = {
+    "users": 2000, "events": 3000, "posts": 4000, "comments": 30000, "votes": 40000,
+    "follows": 10000, "favorites": 16000, "tickets": 8000, "views": 60000, "notifications": 20000,
+}
+# Пароль всех сгенерированных пользователей (для входа в бенчмарках)
+SEED_PASSWORD = "password"
+ORGANIZER_SHARE = 0.1
+MAX_SEED_DEPTH = 5
+DISTRICTS = ["Алмалинский", "Бостандыкский", "Медеуский", "Ауэзовский", "Наурызбайский", "Жетысуский", "Турксибский", "Алатауский"]
+VIBES = ["chill", "party", "family", "romantic", "active", "intellectual"]
+CATEGORIES = ["concert", "theatre", "exhibition", "sport", "education", "festival", "standup", "kids", "food", "cinema"]
+TAGS = ["music", "live", "rock", "jazz", "art", "free", "outdoor", "networking", "tech", "workshop", "family", "night",
+        "dance", "books", "photo", "running", "yoga", "games", "quiz", "market"]
+WORDS = ["концерт", "вечер", "город", "музыка", "друзья", "выставка", "встреча", "лекция", "фестиваль", "джаз", "горы",
+         "кофе", "кино", "театр", "спорт", "парк", "идея", "билеты", "новый", "лучший", "субботу", "вместе", "Алматы"]
+
+
+class Skewed:
+    """Выбор по степенному закону: i-й по популярности элемент весит 1 / (i + 1) ** alpha.
+
+    Порядок популярности перемешан, чтобы "вирусные" строки не совпадали с первыми id.
+    """
+
+    def __init__(self, rng, items, alpha=1.1):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(itertools.accumulate(1.0 / (i + 1) ** alpha for i in range(len(self.items))))
+
+    def pick(self):
+        return self.items[bisect.bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+    def distinct_pairs(self, owners, count, owner_alpha=None):
+        """count уникальных пар (владелец, элемент); владелец равномерный или тоже со скосом."""
+        owner_pick = Skewed(self.rng, owners, owner_alpha).pick if owner_alpha else (lambda: self.rng.choice(owners))
+        pairs = set()
+        limit = min(count, len(owners) * len(self.items))
+        attempts = 0
+        while len(pairs) < limit and attempts < limit * 20:
+            attempts += 1
+            pairs.add((owner_pick(), self.pick()))
+        return sorted(pairs)
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def insert_rows(db, table, rows, batch=5000):
+    for start in range(0, len(rows), batch):
+        db.session.execute(table.insert(), rows[start:start + batch])
+
+
+def seed_database(counts, seed=42, log=print):
+    """Заполняет пустую базу синтетикой с реалистичным скосом. Вызывается внутри app_context.
+
+    Подписчики организаторов и популярность событий и постов распределены по
+    степенному закону: несколько "вирусных" постов собирают большую часть
+    голосов и комментариев, а у топовых организаторов тысячи подписчиков.
+    Счетчики (голоса, комментарии, просмотры) согласованы со строками; в конце
+    пересобираются метки, поисковый индекс, агрегаты статистики, рейтинги и итоги организаторов.
+    """
+    import app as app_module
+    from models import db, User, Event, EventLabel, Post, PostVote, Comment, Ticket, EventView, Notification, favorites, follows
+    from ranking import rebuild_rankings
+    from rollups import run_rollup
+    from summaries import rebuild_summaries
+
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    now_ms = int(now.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    password_hash = app_module.password_hasher.hash(SEED_PASSWORD)
+
+    def ago(days):
+        return now - datetime.timedelta(seconds=rng.random() * days * 86400)
+
+    user_ids = [f"user_s{i:06d}" for i in range(max(counts["users"], 2))]
+    organizer_ids = user_ids[:max(1, int(len(user_ids) * ORGANIZER_SHARE))]
+    names = {}
+    user_rows = []
+    for i, user_id in enumerate(user_ids):
+        names[user_id] = f"{rng.choice(['Айгерим', 'Данияр', 'Алия', 'Тимур', 'Мадина', 'Ерлан', 'Асель', 'Нурлан'])} {i}"
+        user_rows.append({"id": user_id, "name": names[user_id], "username": f"seed{i}", "email": f"seed{i}@seed.local",
+                          "password_hash": password_hash, "user_type": 'organizer' if i < len(organizer_ids) else 'explorer',
+                          "subscription_status": 'none', "location": 'Алматы', "birth_date": '1995-01-01', "bio": sentence(rng, 3, 12)})
+    insert_rows(db, User.__table__, user_rows)
+    log(f"Пользователи: {len(user_rows)} (организаторов {len(organizer_ids)})")
+
+    # Подписки: у организаторов степенной закон числа подписчиков
+    follow_pairs = Skewed(rng, organizer_ids, alpha=1.2).distinct_pairs(user_ids, counts["follows"])
+    insert_rows(db, follows, [{"follower_id": f, "organizer_id": o} for f, o in follow_pairs if f != o])
+    log(f"Подписки: {len(follow_pairs)}")
+
+    organizer_pick = Skewed(rng, organizer_ids, alpha=1.0)
+    event_rows, label_rows = [], []
+    for i in range(counts["events"]):
+        organizer_id = organizer_pick.pick()
+        tags = rng.sample(TAGS, rng.randint(1, 4))
+        categories = rng.sample(CATEGORIES, rng.randint(1, 2))
+        event_id = f"event_s{i:06d}"
+        event_rows.append({
+            "id": event_id, "title": sentence(rng, 2, 5), "full_description": sentence(rng, 20, 80),
+            "organizer_id": organizer_id, "organizer_name": names[organizer_id], "organizer_avatar": '',
+            "time_range": '19:00 - 22:00', "vibe": rng.choice(VIBES), "district": rng.choice(DISTRICTS),
+            "age_limit": rng.choice([0, 0, 0, 6, 12, 16, 18]), "tags": tags, "categories": categories,
+            "price_value": float(rng.choice([0, 0, 2000, 3000, 5000, 8000, 15000])), "location": 'Алматы', "image": '',
+            # Треть событий уже прошла, остальные - в ближайшие четыре месяца
+            "event_timestamp": now_ms + int((rng.random() * 180 - 60) * 86400 * 1000),
+            "added_at": ago(90), "views": 0, "engagement": 0.0, "hot_score": 0.0, "trend_score": 0.0,
+        })
+        label_rows.extend({"event_id": event_id, "kind": 'tag', "value": tag} for tag in tags)
+        label_rows.extend({"event_id": event_id, "kind": 'category', "value": category} for category in categories)
+    event_ids = [row["id"] for row in event_rows]
+    event_popularity = Skewed(rng, event_ids, alpha=1.1)
+
+    # Просмотры за последние 30 дней; счетчик events.views совпадает с числом строк
+    view_rows, view_counts, viewed = [], {}, set()
+    for _ in range(counts["views"] if event_ids else 0):
+        event_id = event_popularity.pick()
+        view_counts[event_id] = view_counts.get(event_id, 0) + 1
+        viewer = rng.choice(user_ids) if rng.random() < 0.6 else None
+        # Авторизованный пользователь учитывается один раз на событие, повторный просмотр - анонимный
+        if viewer and (event_id, viewer) in viewed: viewer = None
+        if viewer: viewed.add((event_id, viewer))
+        view_rows.append({"event_id": event_id, "user_id": viewer, "ip_address": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                          "user_agent": 'seed', "viewed_at": ago(30)})
+    for row in event_rows:
+        row["views"] = view_counts.get(row["id"], 0)
+    insert_rows(db, Event.__table__, event_rows)
+    insert_rows(db, EventLabel.__table__, label_rows)
+    insert_rows(db, EventView.__table__, view_rows)
+    log(f"События: {len(event_rows)}, просмотров: {len(view_rows)}")
+
+    favorite_pairs = event_popularity.distinct_pairs(user_ids, counts["favorites"], owner_alpha=0.8) if event_ids else []
+    insert_rows(db, favorites, [{"user_id": u, "event_id": e, "created_at": ago(30)} for u, e in favorite_pairs])
+    # Один билет (с количеством) на пару пользователь-событие
+    ticket_pairs = event_popularity.distinct_pairs(user_ids, counts["tickets"]) if event_ids else []
+    ticket_rows = [{"id": f"tick_s{i:07d}", "event_id": event_id, "user_id": user_id,
+                    "quantity": rng.choice([1, 1, 1, 2, 2, 3, 4]), "purchase_date": ago(60)}
+                   for i, (user_id, event_id) in enumerate(ticket_pairs)]
+    insert_rows(db, Ticket.__table__, ticket_rows)
+    # Счетчик продаж совпадает с билетами; у платных событий вместимость с запасом вдвое, бесплатные - без ограничения
+    sold = {}
+    for row in ticket_rows:
+        sold[row["event_id"]] = sold.get(row["event_id"], 0) + row["quantity"]
+    paid = {row["id"] for row in event_rows if row["price_value"] > 0}
+    events_table = Event.__table__
+    for start in range(0, len(event_rows), 5000):
+        db.session.execute(events_table.update().where(events_table.c.id == db.bindparam('event_id')).values(
+            tickets_sold=db.bindparam('sold'), capacity=db.bindparam('seat_limit')
+        ), [{"event_id": row["id"], "sold": sold.get(row["id"], 0),
+             "seat_limit": sold.get(row["id"], 0) * 2 + 20 if row["id"] in paid else None} for row in event_rows[start:start + 5000]])
+    log(f"Избранное: {len(favorite_pairs)}, билеты: {len(ticket_rows)}")
+
+    # Посты: авторы и популярность со скосом; голоса и комментарии достаются в основном "вирусным"
+    author_pick = Skewed(rng, user_ids, alpha=0.9)
+    post_rows = []
+    for i in range(counts["posts"]):
+        author_id = author_pick.pick()
+        post_rows.append({"id": f"post_s{i:06d}", "author_id": author_id, "author_name": names[author_id],
+                          "category_slug": rng.choice(CATEGORIES), "category_name": None, "content": sentence(rng, 5, 60),
+                          "timestamp": ago(60), "upvotes": 0, "downvotes": 0, "age_limit": 0, "comment_count": 0,
+                          "hot_score": 0.0, "trend_score": 0.0})
+    posts_by_id = {row["id"]: row for row in post_rows}
+    post_popularity = Skewed(rng, list(posts_by_id), alpha=1.2) if post_rows else None
+    vote_rows = []
+    for user_id, post_id in (post_popularity.distinct_pairs(user_ids, counts["votes"]) if post_rows else []):
+        vote_type = 'up' if rng.random() < 0.8 else 'down'
+        posts_by_id[post_id]['upvotes' if vote_type == 'up' else 'downvotes'] += 1
+        vote_rows.append({"user_id": user_id, "post_id": post_id, "vote_type": vote_type})
+    comment_rows, comments_by_post = [], {}
+    for i in range(counts["comments"] if post_rows else 0):
+        post_id = post_popularity.pick()
+        post = posts_by_id[post_id]
+        siblings = comments_by_post.setdefault(post_id, [])
+        # Треть комментариев - ответы на уже существующие, чтобы в дереве была глубина
+        parent = rng.choice(siblings) if siblings and rng.random() < 0.35 else None
+        if parent and parent["depth"] >= MAX_SEED_DEPTH: parent = None
+        after = parent["timestamp"] if parent else post["timestamp"]
+        author_id = rng.choice(user_ids)
+        row = {"id": f"comm_s{i:07d}", "post_id": post_id, "author_id": author_id, "author_name": names[author_id],
+               "content": sentence(rng, 2, 30), "parent_id": parent["id"] if parent else None,
+               "depth": parent["depth"] + 1 if parent else 0, "upvotes": 0, "downvotes": 0,
+               "timestamp": min(now, after + datetime.timedelta(seconds=rng.randint(1, 86400)))}
+        siblings.append(row)
+        comment_rows.append(row)
+        post["comment_count"] += 1
+    insert_rows(db, Post.__table__, post_rows)
+    insert_rows(db, PostVote.__table__, vote_rows)
+    insert_rows(db, Comment.__table__, comment_rows)
+    log(f"Посты: {len(post_rows)}, голоса: {len(vote_rows)}, комментарии: {len(comment_rows)}")
+
+    # Уведомления: больше всего у подписчиков популярных организаторов
+    recipients = Skewed(rng, user_ids, alpha=0.8)
+    notification_rows = [{"id": f"notif_s{i:07d}", "recipient_id": recipients.pick(), "type": 'new_event',
+                          "content": f"Новое событие: {sentence(rng, 2, 5)}",
+                          "related_id": rng.choice(event_ids) if event_ids else None,
+                          "is_read": rng.random() < 0.7, "timestamp": ago(60)}
+                         for i in range(counts["notifications"])]
+    insert_rows(db, Notification.__table__, notification_rows)
+    db.session.commit()
+    log(f"Уведомления: {len(notification_rows)}")
+
+    app_module.search_index.prepare()
+    indexed = app_module.search_index.rebuild()
+    db.session.commit()
+    rollup = run_rollup(datetime.timedelta(days=app_module.app.config['RAW_VIEW_RETENTION_DAYS']))
+    rebuild_rankings()
+    summaries = rebuild_summaries()
+    db.session.commit()
+    log(f"Поиск: {indexed} документов, агрегатов статистики: {rollup['buckets']}, итогов организаторов: {summaries['organizers']}")
+    return {"users": len(user_rows), "events": len(event_rows), "posts": len(post_rows), "comments": len(comment_rows),
+            "votes": len(vote_rows), "follows": len(follow_pairs), "favorites": len(favorite_pairs),
+            "tickets": len(ticket_rows), "views": len(view_rows), "notifications": len(notification_rows)}
+
+
+def seed_counts(scale=1.0, **overrides):
+    counts = {name: int(value * scale) for name, value in SEED_DEFAULTS.items()}
+    counts.update({name: value for name, value in overrides.items() if value is not None})
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сброс базы и медиафайлов; с --seed - заполнение синтетикой")
+    parser.add_argument('--seed', action='store_true', help="после сброса создать таблицы и сгенерировать данные")
+    parser.add_argument('--no-reset', action='store_true',
+                        help="не трогать Postgres и uploads (например, для DATABASE_URL=sqlite:///...)")
+    parser.add_argument('--scale', type=float, default=1.0, help="множитель объемов по умолчанию")
+    parser.add_argument('--random-seed', type=int, default=42)
+    for name in SEED_DEFAULTS:
+        parser.add_argument(f'--{name}', type=int, help=f"по умолчанию {SEED_DEFAULTS[name]} * scale")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    print("=== Полный сброс базы данных и медиафайлов ===")
-    
-    # 1. Очищаем медиафайлы
-    clear_media_files()
-    
-    # 2. Удаляем таблицы (чтобы пересоздать структуру)
-    drop_tables()
-    
-    print("\n=== Готово! Теперь запусти app.py, и таблицы создадутся с новыми полями ===")
\ No newline at end of file
+    args = parse_args()
+    if not args.no_reset:
+        print("=== Полный сброс базы данных и медиафайлов ===")
+
+        # 1. Очищаем медиафайлы
+        clear_media_files()
+
+        # 2. Удаляем таблицы (чтобы пересоздать структуру)
+        drop_tables()
+
+    if args.seed:
+        import app as app_module
+        counts = seed_counts(args.scale, **{name: getattr(args, name) for name in SEED_DEFAULTS})
+        with app_module.app.app_context():
+            app_module.db.create_all()
+            print("\n=== Генерация данных ===")
+            seed_database(counts, seed=args.random_seed)
+        print(f"\n=== Готово! Пароль всех пользователей: {SEED_PASSWORD} ===")
+    else:
+        print("\n=== Готово! Теперь запусти app.py, и таблицы создадутся с новыми полями ===")
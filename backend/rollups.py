@@ -0,0 +1,140 @@
+import datetime
+
+from sqlalchemy import func, tuple_
+
+from models import db, Event, EventView, Ticket, favorites, EventStatsHourly, EventStatsDaily, RollupWatermark
+
+WATERMARK_SOURCE = 'event_stats'
+# Строки, записанные с опозданием (буфер просмотров, долгие транзакции), успевают попасть в свое окно
+ROLLUP_LAG = datetime.timedelta(minutes=2)
+HOURLY_RETENTION = datetime.timedelta(days=90)
+KEY_CHUNK = 500
+
+# metric -> (колонка события, колонка времени, агрегат)
+SOURCES = {
+    'views': (EventView.event_id, EventView.viewed_at, func.count()),
+    'favorites': (favorites.c.event_id, favorites.c.created_at, func.count()),
+    'tickets': (Ticket.event_id, Ticket.purchase_date, func.coalesce(func.sum(Ticket.quantity), 0)),
+}
+METRICS = tuple(SOURCES.keys())
+
+
+def hour_bucket(column):
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc('hour', column)
+    return func.strftime('%Y-%m-%d %H:00:00', column)
+
+
+def to_datetime(value):
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value.replace(tzinfo=None)
+
+
+def collect_hourly_deltas(since, until):
+    """Свертка новых сырых строк в окне [since, until) по событиям и часам."""
+    deltas = {}
+    for metric, (event_column, time_column, aggregate) in SOURCES.items():
+        bucket = hour_bucket(time_column).label('bucket')
+        rows = db.session.query(event_column, bucket, aggregate).filter(
+            time_column >= since, time_column < until, time_column.isnot(None)
+        ).group_by(event_column, bucket).all()
+        for event_id, bucket_value, amount in rows:
+            key = (event_id, to_datetime(bucket_value))
+            deltas.setdefault(key, dict.fromkeys(METRICS, 0))[metric] += int(amount or 0)
+    return deltas
+
+
+def to_daily(hourly_deltas):
+    daily = {}
+    for (event_id, bucket), values in hourly_deltas.items():
+        key = (event_id, bucket.replace(hour=0))
+        target = daily.setdefault(key, dict.fromkeys(METRICS, 0))
+        for metric in METRICS:
+            target[metric] += values[metric]
+    return daily
+
+
+def apply_deltas(model, deltas):
+    keys = list(deltas.keys())
+    for start in range(0, len(keys), KEY_CHUNK):
+        chunk = keys[start:start + KEY_CHUNK]
+        existing = {(row.event_id, row.bucket): row for row in model.query.filter(tuple_(model.event_id, model.bucket).in_(chunk))}
+        for key in chunk:
+            row = existing.get(key)
+            if row is None:
+                row = model(event_id=key[0], bucket=key[1], **dict.fromkeys(METRICS, 0))
+                db.session.add(row)
+            for metric in METRICS:
+                setattr(row, metric, (getattr(row, metric) or 0) + deltas[key][metric])
+
+
+def drop_deleted_events(deltas):
+    event_ids = list({event_id for event_id, _ in deltas})
+    alive = set()
+    for start in range(0, len(event_ids), KEY_CHUNK):
+        chunk = event_ids[start:start + KEY_CHUNK]
+        alive.update(row.id for row in db.session.query(Event.id).filter(Event.id.in_(chunk)))
+    return {key: values for key, values in deltas.items() if key[0] in alive}
+
+
+def run_rollup(raw_retention, now=None):
+    """Досчитывает агрегаты с прошлого водяного знака и чистит старые сырые просмотры.
+
+    Все делается одной транзакцией: при ошибке водяной знак не сдвигается и окно
+    будет свернуто повторно.
+    """
+    if now is None:
+        now = datetime.datetime.utcnow()
+    # Блокировка строки: при нескольких воркерах окно сворачивает только один, второй увидит новый знак
+    watermark = RollupWatermark.query.filter_by(source=WATERMARK_SOURCE).with_for_update().first()
+    since = watermark.processed_until if watermark else datetime.datetime(1970, 1, 1)
+    until = now - ROLLUP_LAG
+    if until <= since:
+        return {"buckets": 0, "prunedViews": 0}
+    try:
+        hourly = drop_deleted_events(collect_hourly_deltas(since, until))
+        apply_deltas(EventStatsHourly, hourly)
+        apply_deltas(EventStatsDaily, to_daily(hourly))
+        if watermark is None:
+            watermark = RollupWatermark(source=WATERMARK_SOURCE, processed_until=until)
+            db.session.add(watermark)
+        watermark.processed_until = until
+        # Удаляются только уже свернутые строки
+        prune_before = min(until, now - raw_retention)
+        pruned = EventView.query.filter(EventView.viewed_at < prune_before).delete(synchronize_session=False)
+        EventStatsHourly.query.filter(EventStatsHourly.bucket < now - HOURLY_RETENTION).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"buckets": len(hourly), "prunedViews": pruned}
+
+
+def rollup_loop(app, sleep, interval, raw_retention):
+    while True:
+        sleep(interval)
+        with app.app_context():
+            try:
+                run_rollup(raw_retention)
+            except Exception as e:
+                app.logger.warning(f"Stats rollup failed: {e}")
+            finally:
+                db.session.remove()
+
+
+def load_series(organizer_id, granularity, since, until):
+    """Временные ряды по всем событиям организатора только из таблиц агрегатов."""
+    model = EventStatsDaily if granularity == 'day' else EventStatsHourly
+    rows = db.session.query(model.event_id, model.bucket, model.views, model.favorites, model.tickets).join(
+        Event, Event.id == model.event_id
+    ).filter(Event.organizer_id == organizer_id, model.bucket >= since, model.bucket < until).order_by(model.bucket).all()
+    totals = {}
+    per_event = {}
+    for event_id, bucket, views, favorites_count, tickets in rows:
+        point = {"bucket": bucket.isoformat(), "views": views, "favorites": favorites_count, "tickets": tickets}
+        per_event.setdefault(event_id, []).append(point)
+        total = totals.setdefault(bucket, {"bucket": bucket.isoformat(), "views": 0, "favorites": 0, "tickets": 0})
+        for metric in METRICS:
+            total[metric] += point[metric]
+    return [totals[bucket] for bucket in sorted(totals)], per_event
@@ -0,0 +1,313 @@
+import bisect
+import datetime
+import math
+import re
+import threading
+
+from sqlalchemy import cast, func, text
+from sqlalchemy.dialects.postgresql import REGCONFIG, insert as pg_insert
+from sqlalchemy.exc import OperationalError
+
+from models import db, Event, Post, SearchDocument
+
+# auto - Postgres tsvector, в SQLite FTS5, иначе индекс в памяти процесса (только для разработки и тестов)
+SEARCH_BACKENDS = ('auto', 'postgres', 'fts5', 'memory')
+PG_CONFIG = 'russian'
+MAX_QUERY_TOKENS = 8
+REBUILD_CHUNK = 500
+# Вес полей: заголовок, теги/категории/место, описание
+FIELD_WEIGHTS = (10.0, 4.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(value):
+    # Ни unicode61, ни русская конфигурация Postgres не сводят ё к е
+    return (value or '').replace('ё', 'е').replace('Ё', 'Е')
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(fold(value).lower())
+
+
+def query_tokens(query):
+    return tokenize(query)[:MAX_QUERY_TOKENS]
+
+
+def event_document(event):
+    labels = [str(v) for v in (event.tags or [])] + [str(v) for v in (event.categories or [])] + [event.location or '']
+    return event.title or '', ' '.join(labels), event.full_description or ''
+
+
+def post_document(post):
+    # У поста нет заголовка: для подсказок берется начало текста
+    return (post.content or '')[:120], '', post.content or ''
+
+
+class PostgresSearch:
+    """tsvector с русской конфигурацией, весами полей A/B/C и ранжированием ts_rank_cd."""
+    name = 'postgres'
+
+    def ensure_schema(self):
+        pass
+
+    def _vector(self, title, labels, body):
+        config = cast(PG_CONFIG, REGCONFIG)
+        return (func.setweight(func.to_tsvector(config, fold(title)), 'A')
+                .op('||')(func.setweight(func.to_tsvector(config, fold(labels)), 'B'))
+                .op('||')(func.setweight(func.to_tsvector(config, fold(body)), 'C')))
+
+    def index(self, kind, ref_id, title, labels, body):
+        values = {"title": title[:255], "tsv": self._vector(title, labels, body), "updated_at": datetime.datetime.utcnow()}
+        stmt = pg_insert(SearchDocument).values(kind=kind, ref_id=ref_id, **values)
+        db.session.execute(stmt.on_conflict_do_update(constraint='unique_search_document', set_=values))
+
+    def remove(self, kind, ref_id):
+        SearchDocument.query.filter_by(kind=kind, ref_id=ref_id).delete(synchronize_session=False)
+
+    def clear(self):
+        SearchDocument.query.delete(synchronize_session=False)
+
+    def _tsquery(self, tokens):
+        # Токены - только \w+, поэтому экранировать синтаксис to_tsquery не нужно
+        return func.to_tsquery(cast(PG_CONFIG, REGCONFIG), ' & '.join(f"{token}:*" for token in tokens))
+
+    def search(self, kinds, tokens, limit):
+        tsquery = self._tsquery(tokens)
+        rank = func.ts_rank_cd(SearchDocument.tsv, tsquery).label('rank')
+        rows = db.session.query(SearchDocument.kind, SearchDocument.ref_id, SearchDocument.title, rank).filter(
+            SearchDocument.kind.in_(kinds), SearchDocument.tsv.op('@@')(tsquery)
+        ).order_by(rank.desc(), SearchDocument.ref_id).limit(limit).all()
+        return [(row.kind, row.ref_id, row.title) for row in rows]
+
+
+class Fts5Search:
+    """Виртуальная таблица FTS5 с ранжированием bm25. Стемминга нет, поэтому каждое слово ищется по префиксу."""
+    name = 'fts5'
+
+    def ensure_schema(self):
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+                "title, labels, body, tokenize='unicode61 remove_diacritics 2')"
+            ))
+
+    def index(self, kind, ref_id, title, labels, body):
+        document = SearchDocument.query.filter_by(kind=kind, ref_id=ref_id).first()
+        if document is None:
+            document = SearchDocument(kind=kind, ref_id=ref_id)
+            db.session.add(document)
+        document.title = title[:255]; document.updated_at = datetime.datetime.utcnow()
+        db.session.flush()
+        db.session.execute(text("DELETE FROM search_fts WHERE rowid = :id"), {"id": document.id})
+        db.session.execute(text("INSERT INTO search_fts (rowid, title, labels, body) VALUES (:id, :title, :labels, :body)"),
+                           {"id": document.id, "title": fold(title), "labels": fold(labels), "body": fold(body)})
+
+    def remove(self, kind, ref_id):
+        document = SearchDocument.query.filter_by(kind=kind, ref_id=ref_id).first()
+        if document is None:
+            return
+        db.session.execute(text("DELETE FROM search_fts WHERE rowid = :id"), {"id": document.id})
+        db.session.delete(document)
+
+    def clear(self):
+        db.session.execute(text("DELETE FROM search_fts"))
+        SearchDocument.query.delete(synchronize_session=False)
+
+    def search(self, kinds, tokens, limit):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        kind_params = {f"kind_{i}": kind for i, kind in enumerate(kinds)}
+        rows = db.session.execute(text(
+            "SELECT d.kind, d.ref_id, d.title, bm25(search_fts, :w_title, :w_labels, :w_body) AS score "
+            "FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+            f"WHERE search_fts MATCH :match AND d.kind IN ({', '.join(':' + key for key in kind_params)}) "
+            "ORDER BY score, d.ref_id LIMIT :limit"
+        ), {"match": match, "limit": limit, "w_title": FIELD_WEIGHTS[0], "w_labels": FIELD_WEIGHTS[1],
+            "w_body": FIELD_WEIGHTS[2], **kind_params}).all()
+        return [(row.kind, row.ref_id, row.title) for row in rows]
+
+
+class MemorySearch:
+    """Инвертированный индекс в памяти процесса: term -> {документ: вес}.
+
+    Отсортированный список термов позволяет находить все термы с префиксом
+    бинарным поиском. Индекс строится из БД при первом запросе и дальше
+    обновляется обработчиками; в нескольких процессах он расходится, поэтому
+    годится только как запасной вариант.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._documents = {}
+        self._terms = []
+        self._terms_dirty = False
+        self._loaded = False
+
+    def ensure_schema(self):
+        pass
+
+    def _add(self, key, title, labels, body):
+        weights = {}
+        for weight, value in zip(FIELD_WEIGHTS, (title, labels, body)):
+            for token in tokenize(value):
+                weights[token] = weights.get(token, 0.0) + weight
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._terms_dirty = True
+            self._postings[token][key] = weight
+        self._documents[key] = (title[:255], list(weights.keys()))
+
+    def _discard(self, key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        for token in document[1]:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[token]
+                    self._terms_dirty = True
+
+    def index(self, kind, ref_id, title, labels, body):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._discard((kind, ref_id))
+            self._add((kind, ref_id), title, labels, body)
+
+    def remove(self, kind, ref_id):
+        with self._lock:
+            self._discard((kind, ref_id))
+
+    def clear(self):
+        with self._lock:
+            self._postings, self._documents, self._terms = {}, {}, []
+            self._loaded = True
+
+    def load(self, documents):
+        with self._lock:
+            for kind, ref_id, fields in documents:
+                self._discard((kind, ref_id))
+                self._add((kind, ref_id), *fields)
+            self._loaded = True
+
+    def _matching_terms(self, prefix):
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '\U0010ffff')
+        return self._terms[start:end]
+
+    def search(self, kinds, tokens, limit):
+        with self._lock:
+            if not self._loaded:
+                self.load(iter_documents())
+            total = max(len(self._documents), 1)
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term in self._matching_terms(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for key, weight in postings.items():
+                        if key[0] in kinds:
+                            token_scores[key] = max(token_scores.get(key, 0.0), weight * idf)
+                # Документ должен содержать все слова запроса
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {key: score + token_scores[key] for key, score in scores.items() if key in token_scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0][1]))[:limit]
+            return [(kind, ref_id, self._documents[(kind, ref_id)][0]) for (kind, ref_id), _ in ranked]
+
+
+def iter_documents():
+    for event in Event.query.order_by(Event.id).yield_per(REBUILD_CHUNK):
+        yield 'event', event.id, event_document(event)
+    for post in Post.query.order_by(Post.id).yield_per(REBUILD_CHUNK):
+        yield 'post', post.id, post_document(post)
+
+
+def detect_backend():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return PostgresSearch()
+    if dialect == 'sqlite':
+        backend = Fts5Search()
+        try:
+            backend.ensure_schema()
+            return backend
+        except OperationalError as e:
+            # SQLite собран без FTS5; остальные ошибки (например, занятая БД) не маскируем
+            if 'fts5' not in str(e):
+                raise
+    return MemorySearch()
+
+
+class SearchIndex:
+    """Полнотекстовый поиск по событиям и постам.
+
+    Обработчики вызывают index_*/remove_* до commit: в Postgres и SQLite
+    документ меняется в той же транзакции, что и сама запись.
+    """
+
+    def __init__(self, backend='auto'):
+        if backend not in SEARCH_BACKENDS:
+            raise ValueError(f"Unknown search backend: {backend}")
+        self.backend_name = backend
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        # Бэкенд выбирается при первом обращении, когда уже есть app context и engine.
+        # Схему FTS5 нельзя создавать внутри чужой пишущей транзакции SQLite,
+        # поэтому приложение вызывает prepare() до обработки первого запроса
+        with self._lock:
+            if self._backend is None:
+                if self.backend_name == 'auto':
+                    self._backend = detect_backend()
+                else:
+                    self._backend = {'postgres': PostgresSearch, 'fts5': Fts5Search, 'memory': MemorySearch}[self.backend_name]()
+                    self._backend.ensure_schema()
+            return self._backend
+
+    def prepare(self):
+        return self.backend.name
+
+    def index_event(self, event):
+        self.backend.index('event', event.id, *event_document(event))
+
+    def index_post(self, post):
+        self.backend.index('post', post.id, *post_document(post))
+
+    def remove(self, kind, ref_id):
+        self.backend.remove(kind, ref_id)
+
+    def search(self, kinds, query, limit):
+        """Список (kind, ref_id, title) по убыванию релевантности. Последнее слово может быть недописанным."""
+        tokens = query_tokens(query)
+        if not tokens or not kinds:
+            return []
+        return self.backend.search(tuple(kinds), tokens, limit)
+
+    def rebuild(self):
+        """Полная переиндексация. Коммит делает вызывающий код; возвращает число документов."""
+        backend = self.backend
+        backend.clear()
+        count = 0
+        if isinstance(backend, MemorySearch):
+            documents = list(iter_documents())
+            backend.load(documents)
+            return len(documents)
+        for kind, ref_id, fields in iter_documents():
+            backend.index(kind, ref_id, *fields)
+            count += 1
+        return count
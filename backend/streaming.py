@@ -0,0 +1,156 @@
+import gzip
+import json
+import zlib
+
+from flask import current_app, request, stream_with_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Списки отдаются потоком: JSON собирается пачками по STREAM_CHUNK строк прямо из курсора БД,
+# поэтому память ответа не зависит от длины списка
+STREAM_CHUNK = 500
+# Мелкие ответы не сжимаются: заголовки gzip дороже выигрыша
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Сжатый поток отдается кусками не меньше этого размера, а не после каждой пачки
+COMPRESS_FLUSH_BYTES = 64 * 1024
+
+
+def dumps(value):
+    """JSON в байтах: orjson, если установлен, иначе стандартный json (UTF-8 без экранирования)."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def batched(rows, size=STREAM_CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def query_chunks(query, size=STREAM_CHUNK):
+    """Пачки строк запроса через серверный курсор (yield_per), без загрузки всего результата."""
+    try:
+        yield from batched(query.yield_per(size), size)
+    finally:
+        # Тело читается уже после teardown запроса: сессия, к которой привязан query, вынута
+        # из реестра и заново открыла соединение - без close оно вернется в пул только при сборке мусора
+        query.session.close()
+
+
+def encode_array(chunks):
+    """Куски байтов JSON-массива из итератора списков словарей."""
+    yield b'['
+    first = True
+    try:
+        for items in chunks:
+            if not items:
+                continue
+            body = dumps(items)[1:-1]
+            yield body if first else b',' + body
+            first = False
+    finally:
+        # Клиент мог отключиться посреди отдачи: источник закрывается сразу, а не сборщиком мусора
+        close = getattr(chunks, 'close', None)
+        if close is not None: close()
+    yield b']'
+
+
+class StreamCompressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31 - формат gzip (заголовок и CRC), а не голый deflate
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_stream(parts, encoding):
+    compressor = StreamCompressor(encoding)
+    pending = []
+    pending_size = 0
+    for part in parts:
+        out = compressor.compress(part)
+        if out:
+            pending.append(out)
+            pending_size += len(out)
+        if pending_size >= COMPRESS_FLUSH_BYTES:
+            yield b''.join(pending)
+            pending, pending_size = [], 0
+    pending.append(compressor.finish())
+    yield b''.join(pending)
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def set_common_headers(response, next_cursor):
+    response.vary.add('Accept-Encoding')
+    if next_cursor: response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def json_response(value=None, body=None, next_cursor=None, status=200):
+    """Готовый (небольшой) JSON: быстрый кодировщик и сжатие по Accept-Encoding."""
+    if body is None:
+        body = dumps(value)
+    encoding = negotiate_encoding() if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = compress_body(body, encoding)
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return set_common_headers(response, next_cursor)
+
+
+def stream_json_list(chunks, next_cursor=None):
+    """Потоковый JSON-массив: chunks - итератор списков словарей (обычно из query_chunks).
+
+    Генератор выполняется уже после выхода из view, поэтому работает внутри
+    stream_with_context: сессия БД и request живы до конца отдачи.
+    """
+    encoding = negotiate_encoding()
+    parts = encode_array(chunks)
+    if encoding:
+        parts = compress_stream(parts, encoding)
+    response = current_app.response_class(stream_with_context(parts), mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return set_common_headers(response, next_cursor)
@@ -0,0 +1,160 @@
+import datetime
+
+from sqlalchemy import bindparam, func, text
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Event, Ticket, EventSummary, OrganizerSummary, favorites
+
+# Счетчики, которые приходят от действий; выручка выводится из проданных билетов по цене события
+COUNTERS = ('tickets_sold', 'favorites', 'views')
+TOTALS = COUNTERS + ('revenue',)
+ORGANIZER_TOTALS = ('events',) + TOTALS
+UPDATE_CHUNK = 500
+# Выручка - сумма произведений с плавающей точкой: при сверке копейки округления расхождением не считаются
+REVENUE_TOLERANCE = 0.005
+
+
+def insert_missing(model, values):
+    """Заводит недостающую строку итогов в savepoint: если ее параллельно создала другая транзакция, остальное не откатывается."""
+    try:
+        with db.session.begin_nested():
+            db.session.execute(model.__table__.insert().values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def bump_organizers(deltas, at=None, known=None):
+    """Прибавляет к итогам организаторов ({organizer_id: {колонка: дельта}}). known - id, у которых строка уже есть."""
+    deltas = {organizer_id: values for organizer_id, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+    at = at or datetime.datetime.utcnow()
+    organizer_ids = sorted(deltas)
+    if known is None:
+        known = {row[0] for row in db.session.query(OrganizerSummary.organizer_id).filter(OrganizerSummary.organizer_id.in_(organizer_ids))}
+    for organizer_id in organizer_ids:
+        if organizer_id not in known: insert_missing(OrganizerSummary, {"organizer_id": organizer_id, "updated_at": at})
+    table = OrganizerSummary.__table__
+    # В порядке id: параллельные транзакции блокируют строки организаторов в одном порядке
+    db.session.execute(table.update().where(table.c.organizer_id == bindparam('b_id')).values(
+        updated_at=at, **{name: table.c[name] + bindparam(f"b_{name}") for name in ORGANIZER_TOTALS}),
+        [{"b_id": organizer_id, **{f"b_{name}": deltas[organizer_id].get(name, 0) for name in ORGANIZER_TOTALS}}
+         for organizer_id in organizer_ids])
+
+
+def bump_summaries(deltas, at=None):
+    """Прибавляет к итогам событий и их организаторов ({event_id: {'tickets_sold': n, 'favorites': n, 'views': n}}).
+
+    Вызывается в транзакции самого действия (commit - за вызывающим), поэтому итоги
+    меняются вместе с билетами, избранным и просмотрами. Строки итогов блокируются
+    после строки события и до commit: строка организатора общая для всех его событий,
+    поэтому этот шаг - последний перед коммитом.
+    """
+    deltas = {event_id: values for event_id, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+    at = at or datetime.datetime.utcnow()
+    event_ids = sorted(deltas)
+    organizer_deltas, known_organizers = {}, set()
+    table = EventSummary.__table__
+    for start in range(0, len(event_ids), UPDATE_CHUNK):
+        chunk = event_ids[start:start + UPDATE_CHUNK]
+        # Организатор, цена и наличие строк итогов - одним запросом
+        rows = db.session.query(Event.id, Event.organizer_id, Event.price_value, EventSummary.event_id, OrganizerSummary.organizer_id).outerjoin(
+            EventSummary, EventSummary.event_id == Event.id
+        ).outerjoin(OrganizerSummary, OrganizerSummary.organizer_id == Event.organizer_id).filter(Event.id.in_(chunk)).order_by(Event.id).all()
+        updates = []
+        for event_id, organizer_id, price, summary_id, organizer_summary_id in rows:
+            values = dict.fromkeys(ORGANIZER_TOTALS, 0)
+            values.update(deltas[event_id])
+            values['revenue'] = values['tickets_sold'] * (price or 0)
+            # Событие, созданное до появления итогов: строка заводится с нуля, прошлое досчитает rebuild_summaries
+            if summary_id is None and insert_missing(EventSummary, {"event_id": event_id, "organizer_id": organizer_id, "updated_at": at}):
+                values['events'] = 1
+            if organizer_summary_id is not None: known_organizers.add(organizer_id)
+            updates.append({"b_id": event_id, **{f"b_{name}": values[name] for name in TOTALS}})
+            target = organizer_deltas.setdefault(organizer_id, dict.fromkeys(ORGANIZER_TOTALS, 0))
+            for name in ORGANIZER_TOTALS:
+                target[name] += values[name]
+        if updates:
+            db.session.execute(table.update().where(table.c.event_id == bindparam('b_id')).values(
+                updated_at=at, **{name: table.c[name] + bindparam(f"b_{name}") for name in TOTALS}), updates)
+    bump_organizers(organizer_deltas, at, known_organizers)
+
+
+def add_event(event_id, organizer_id, at=None):
+    at = at or datetime.datetime.utcnow()
+    db.session.execute(EventSummary.__table__.insert().values(event_id=event_id, organizer_id=organizer_id, updated_at=at))
+    bump_organizers({organizer_id: {'events': 1}}, at)
+
+
+def remove_event(event_id, at=None):
+    """Удаляет итоги события и вычитает их из итогов организатора."""
+    table = EventSummary.__table__
+    row = db.session.execute(table.delete().where(table.c.event_id == event_id).returning(
+        table.c.organizer_id, *[table.c[name] for name in TOTALS])).first()
+    if row is None:
+        return
+    bump_organizers({row.organizer_id: {'events': -1, **{name: -getattr(row, name) for name in TOTALS}}}, at)
+
+
+def summary_source(now):
+    """Итоги по событиям из сырых таблиц.
+
+    Выручка - по текущей цене события: цена покупки в билете не хранится. Просмотры
+    берутся из events.views, а не из event_views: сырые просмотры чистятся по сроку хранения.
+    """
+    sold = db.select(Ticket.event_id, func.sum(Ticket.quantity).label('amount')).group_by(Ticket.event_id).subquery()
+    saved = db.select(favorites.c.event_id, func.count().label('amount')).group_by(favorites.c.event_id).subquery()
+    tickets = func.coalesce(sold.c.amount, 0)
+    return db.select(
+        Event.id.label('event_id'), Event.organizer_id.label('organizer_id'), tickets.label('tickets_sold'),
+        (tickets * func.coalesce(Event.price_value, 0)).label('revenue'), func.coalesce(saved.c.amount, 0).label('favorites'),
+        func.coalesce(Event.views, 0).label('views'), db.literal(now, db.DateTime).label('updated_at')
+    ).select_from(Event).outerjoin(sold, sold.c.event_id == Event.id).outerjoin(saved, saved.c.event_id == Event.id)
+
+
+def rebuild_summaries(now=None):
+    """Пересчитывает все итоги из билетов, избранного и счетчиков просмотров (commit - за вызывающим).
+
+    Возвращает число событий, число организаторов и сколько событий расходились с сырыми данными.
+    """
+    now = now or datetime.datetime.utcnow()
+    if db.engine.dialect.name == 'postgresql':
+        # Инкременты ждут конца пересчета, чтение итогов продолжается: ни одна дельта не попадет
+        # в строку, которую пересчет тут же заменит, и не потеряется вместе со старой
+        db.session.execute(text('LOCK TABLE event_summaries, organizer_summaries IN EXCLUSIVE MODE'))
+    source = summary_source(now).subquery()
+    drifted = db.session.query(func.count()).select_from(source).outerjoin(EventSummary, EventSummary.event_id == source.c.event_id).filter(db.or_(
+        EventSummary.event_id.is_(None), EventSummary.tickets_sold != source.c.tickets_sold, EventSummary.favorites != source.c.favorites,
+        EventSummary.views != source.c.views, func.abs(EventSummary.revenue - source.c.revenue) > REVENUE_TOLERANCE
+    )).scalar()
+    db.session.execute(OrganizerSummary.__table__.delete())
+    db.session.execute(EventSummary.__table__.delete())
+    columns = ['event_id', 'organizer_id', 'tickets_sold', 'revenue', 'favorites', 'views', 'updated_at']
+    events_count = db.session.execute(EventSummary.__table__.insert().from_select(columns, summary_source(now))).rowcount
+    per_organizer = db.select(
+        EventSummary.organizer_id, func.count(), func.sum(EventSummary.tickets_sold), func.sum(EventSummary.revenue),
+        func.sum(EventSummary.favorites), func.sum(EventSummary.views), db.literal(now, db.DateTime)
+    ).group_by(EventSummary.organizer_id)
+    organizers_count = db.session.execute(OrganizerSummary.__table__.insert().from_select(
+        ['organizer_id', 'events', 'tickets_sold', 'revenue', 'favorites', 'views', 'updated_at'], per_organizer)).rowcount
+    return {"events": events_count, "organizers": organizers_count, "drifted": drifted}
+
+
+def summary_to_dict(row, **extra):
+    return {**extra, "ticketsSold": row.tickets_sold if row else 0, "revenue": round(row.revenue, 2) if row else 0.0,
+            "favorites": row.favorites if row else 0, "views": row.views if row else 0,
+            "updatedAt": row.updated_at.isoformat() if row and row.updated_at else None}
+
+
+def load_organizer_summary(organizer_id):
+    """Итоги организатора - одна строка по первичному ключу, сколько бы билетов ни было продано."""
+    row = db.session.get(OrganizerSummary, organizer_id)
+    return summary_to_dict(row, organizerId=organizer_id, events=row.events if row else 0)
+
+
+def event_summaries_query(organizer_id):
+    return db.session.query(EventSummary, Event.title).join(Event, Event.id == EventSummary.event_id).filter(
+        EventSummary.organizer_id == organizer_id).order_by(EventSummary.event_id)
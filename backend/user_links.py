@@ -0,0 +1,102 @@
+from models import db, User, Event, favorites, follows
+
+MAX_SYNC_ACTIONS = 500
+
+# kind -> (таблица связи, колонка владельца, колонка цели, модель цели)
+LINK_KINDS = {
+    'favorite': (favorites, 'user_id', 'event_id', Event),
+    'follow': (follows, 'follower_id', 'organizer_id', User),
+}
+
+
+def link_match(kind, owner_id, target_id):
+    table, owner_column, target_column, _ = LINK_KINDS[kind]
+    return table, (table.c[owner_column] == owner_id, table.c[target_column] == target_id)
+
+
+def insert_link(kind, owner_id, target_id):
+    table, owner_column, target_column, _ = LINK_KINDS[kind]
+    db.session.execute(table.insert().values({owner_column: owner_id, target_column: target_id}))
+
+
+def toggle_link(kind, owner_id, target_id):
+    """Переключает одну строку связи, не загружая коллекцию пользователя. Возвращает новое состояние."""
+    table, match = link_match(kind, owner_id, target_id)
+    if db.session.execute(table.delete().where(*match)).rowcount == 1:
+        return False
+    insert_link(kind, owner_id, target_id)
+    return True
+
+
+def set_link(kind, owner_id, target_id, present):
+    """Идемпотентно ставит или снимает связь. Возвращает True, если строка изменилась."""
+    table, match = link_match(kind, owner_id, target_id)
+    if not present:
+        return db.session.execute(table.delete().where(*match)).rowcount == 1
+    if db.session.execute(db.select(table.c[LINK_KINDS[kind][1]]).where(*match)).first():
+        return False
+    insert_link(kind, owner_id, target_id)
+    return True
+
+
+def target_exists(kind, target_id):
+    model = LINK_KINDS[kind][3]
+    return db.session.query(model.id).filter(model.id == target_id).first() is not None
+
+
+def normalize_actions(owner_id, actions):
+    """Схлопывает очередь офлайн-действий: для каждой пары (kind, id) важна только последняя операция."""
+    final_ops = {}
+    results = []
+    for index, action in enumerate(actions):
+        kind = action.get('type') if isinstance(action, dict) else None
+        op = action.get('op') if isinstance(action, dict) else None
+        target_id = action.get('id') if isinstance(action, dict) else None
+        if kind not in LINK_KINDS or op not in ('add', 'remove') or not target_id:
+            results.append({"index": index, "status": "invalid"})
+            continue
+        if kind == 'follow' and target_id == owner_id:
+            results.append({"index": index, "status": "invalid"})
+            continue
+        previous = final_ops.pop((kind, target_id), None)
+        if previous:
+            results.append({"index": previous[1], "type": kind, "id": target_id, "op": previous[0], "status": "superseded"})
+        final_ops[(kind, target_id)] = (op, index)
+    return final_ops, results
+
+
+def apply_link_batch(owner_id, actions):
+    """Применяет очередь действий набором запросов на вид связи: проверка целей, один DELETE,
+    выборка существующих строк и один INSERT. Коммит делает вызывающий код."""
+    final_ops, results = normalize_actions(owner_id, actions)
+    for kind, (table, owner_column, target_column, model) in LINK_KINDS.items():
+        ops = {target_id: value for (op_kind, target_id), value in final_ops.items() if op_kind == kind}
+        if not ops:
+            continue
+        target_ids = list(ops.keys())
+        known = {row.id for row in db.session.query(model.id).filter(model.id.in_(target_ids))}
+        to_remove = [t for t, (op, _) in ops.items() if op == 'remove']
+        to_add = [t for t, (op, _) in ops.items() if op == 'add' and t in known]
+        removed = set()
+        if to_remove:
+            rows = db.session.execute(db.select(table.c[target_column]).where(table.c[owner_column] == owner_id, table.c[target_column].in_(to_remove))).all()
+            removed = {row[0] for row in rows}
+            db.session.execute(table.delete().where(table.c[owner_column] == owner_id, table.c[target_column].in_(to_remove)))
+        added = set()
+        if to_add:
+            rows = db.session.execute(db.select(table.c[target_column]).where(table.c[owner_column] == owner_id, table.c[target_column].in_(to_add))).all()
+            present = {row[0] for row in rows}
+            added = [t for t in to_add if t not in present]
+            if added:
+                db.session.execute(table.insert(), [{owner_column: owner_id, target_column: t} for t in added])
+            added = set(added)
+        for target_id, (op, index) in ops.items():
+            if op == 'add' and target_id not in known:
+                status = "not_found"
+            elif op == 'add':
+                status = "added" if target_id in added else "unchanged"
+            else:
+                status = "removed" if target_id in removed else "unchanged"
+            results.append({"index": index, "type": kind, "id": target_id, "op": op, "status": status})
+    results.sort(key=lambda r: r["index"])
+    return results
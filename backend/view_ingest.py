@@ -0,0 +1,272 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Event, EventView
+from ranking import VIEW_WEIGHT, bump_events
+from summaries import bump_summaries
+
+# buffered - дедупликация и лимиты в памяти, запись пачками раз в flush_interval (один воркер)
+# direct   - каждый просмотр сразу пишется в БД, дедупликация по таблице event_views (несколько воркеров)
+INGEST_MODES = ('buffered', 'direct')
+
+
+class ExpiringKeys:
+    """Ограниченное множество ключей с одинаковым TTL.
+
+    Ключи хранятся в порядке добавления, поэтому устаревшие всегда в начале
+    и вычищаются без обхода всего словаря.
+    """
+
+    def __init__(self, ttl_seconds, max_size):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self._expires = OrderedDict()
+
+    def _purge(self, now):
+        while self._expires:
+            key, expires_at = next(iter(self._expires.items()))
+            if expires_at > now and len(self._expires) <= self.max_size:
+                break
+            self._expires.popitem(last=False)
+
+    def contains(self, key, now):
+        self._purge(now)
+        return key in self._expires
+
+    def add_if_absent(self, key, now):
+        self._purge(now)
+        if key in self._expires:
+            return False
+        self._expires[key] = now + self.ttl
+        self._purge(now)
+        return True
+
+    def __len__(self):
+        return len(self._expires)
+
+
+class RateLimiter:
+    """Засчитанные просмотры на ключ (IP) в фиксированном окне, не больше max_keys окон в памяти."""
+
+    def __init__(self, limit, window_seconds, max_keys):
+        self.limit = limit
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+
+    def _current(self, key, now):
+        window_start, count = self._windows.get(key, (now, 0))
+        if now - window_start >= self.window:
+            return now, 0
+        return window_start, count
+
+    def exceeded(self, key, now):
+        # Как и раньше, запросы с IP отсекаются, когда за минуту с него засчитано больше limit просмотров.
+        # Повторные открытия уже просмотренных событий в лимит не идут; окно фиксированное, а не скользящее
+        return self._current(key, now)[1] > self.limit
+
+    def charge(self, key, now):
+        window_start, count = self._current(key, now)
+        self._windows[key] = (window_start, count + 1)
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+
+    def __len__(self):
+        return len(self._windows)
+
+
+class ViewIngestor:
+    def __init__(self, mode='buffered', flush_interval=5.0, max_pending=5000,
+                 user_dedup_seconds=24 * 3600, anon_dedup_seconds=3600,
+                 rate_limit=10, rate_window_seconds=60, max_keys=200000, on_flush=None):
+        if mode not in INGEST_MODES:
+            raise ValueError(f"Unknown view ingest mode: {mode}")
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.user_dedup_seconds = user_dedup_seconds
+        self.anon_dedup_seconds = anon_dedup_seconds
+        self.on_flush = on_flush
+        self._user_seen = ExpiringKeys(user_dedup_seconds, max_keys)
+        self._anon_seen = ExpiringKeys(anon_dedup_seconds, max_keys)
+        self._limiter = RateLimiter(rate_limit, rate_window_seconds, max_keys)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending_counts = {}
+        self._pending_rows = []
+        self._flusher_started = False
+        self.counted = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    # --- Прием просмотра ---
+
+    def check(self, event_id, user_id, ip_address, now=None):
+        """Возвращает 'counted', 'duplicate' или 'rate_limited' и запоминает просмотр в окне дедупликации."""
+        if now is None:
+            now = time.monotonic()
+        seen, key = (self._user_seen, (event_id, user_id)) if user_id else (self._anon_seen, (event_id, ip_address))
+        with self._lock:
+            if self._limiter.exceeded(ip_address, now):
+                return 'rate_limited'
+            if seen.contains(key, now):
+                return 'duplicate'
+            self._limiter.charge(ip_address, now)
+            seen.add_if_absent(key, now)
+            return 'counted'
+
+    def record(self, event_id, user_id, ip_address, user_agent):
+        """Буферизует засчитанный просмотр. True - буфер переполнен и его пора сбросить."""
+        row = {"event_id": event_id, "user_id": user_id, "ip_address": ip_address,
+               "user_agent": user_agent, "viewed_at": datetime.datetime.utcnow()}
+        with self._lock:
+            self._pending_counts[event_id] = self._pending_counts.get(event_id, 0) + 1
+            self._pending_rows.append(row)
+            self.counted += 1
+            return len(self._pending_rows) >= self.max_pending
+
+    def pending_views(self, event_id):
+        with self._lock:
+            return self._pending_counts.get(event_id, 0)
+
+    # --- Запись в БД ---
+
+    def write_direct(self, event_id, user_id, ip_address, user_agent):
+        """Режим direct: межпроцессная дедупликация по event_views и атомарный инкремент."""
+        now = datetime.datetime.utcnow()
+        if user_id:
+            since = now - datetime.timedelta(seconds=self.user_dedup_seconds)
+            existing = EventView.query.filter_by(event_id=event_id, user_id=user_id).first()
+            if existing and existing.viewed_at and existing.viewed_at >= since:
+                return False
+        else:
+            since = now - datetime.timedelta(seconds=self.anon_dedup_seconds)
+            recent = EventView.query.filter(EventView.event_id == event_id, EventView.ip_address == ip_address, EventView.viewed_at >= since).first()
+            if recent:
+                return False
+            existing = None
+        try:
+            # Savepoint: если того же пользователя параллельно засчитал другой воркер, unique_event_user_view
+            # срабатывает здесь, а не при автосбросе сессии в одном из следующих запросов
+            with db.session.begin_nested():
+                if existing:
+                    existing.viewed_at = now; existing.ip_address = ip_address; existing.user_agent = user_agent
+                else:
+                    db.session.add(EventView(event_id=event_id, user_id=user_id, ip_address=ip_address, user_agent=user_agent, viewed_at=now))
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        events = Event.__table__
+        db.session.execute(events.update().where(events.c.id == event_id).values(views=events.c.views + 1))
+        bump_events({event_id: VIEW_WEIGHT}, now)
+        bump_summaries({event_id: {'views': 1}}, now)
+        db.session.commit()
+        if self.on_flush:
+            self.on_flush({event_id: 1})
+        return True
+
+    def _drain(self):
+        with self._lock:
+            counts, rows = self._pending_counts, self._pending_rows
+            self._pending_counts, self._pending_rows = {}, []
+        return counts, rows
+
+    def _requeue(self, counts, rows):
+        # После неудачной записи возвращаем пачку в буфер, но не даем ему расти без предела
+        with self._lock:
+            for event_id, count in counts.items():
+                self._pending_counts[event_id] = self._pending_counts.get(event_id, 0) + count
+            room = max(0, self.max_pending * 2 - len(self._pending_rows))
+            self._pending_rows = rows[:room] + self._pending_rows
+
+    def flush(self):
+        """Сбрасывает буфер одной транзакцией. Вызывать внутри app context."""
+        with self._flush_lock:
+            counts, rows = self._drain()
+            if not counts:
+                return 0
+            try:
+                written = self._write_batch(counts, rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._requeue(counts, rows)
+                raise
+            self.flushed += written
+            self.flushes += 1
+            if self.on_flush:
+                self.on_flush(counts)
+            return written
+
+    def _write_batch(self, counts, rows):
+        existing_ids = {row.id for row in db.session.query(Event.id).filter(Event.id.in_(list(counts.keys())))}
+        counts = {event_id: count for event_id, count in counts.items() if event_id in existing_ids}
+        rows = [row for row in rows if row['event_id'] in existing_ids]
+        if not counts:
+            return 0
+        events = Event.__table__
+        db.session.execute(
+            events.update().where(events.c.id == bindparam('b_id')).values(views=events.c.views + bindparam('b_count')),
+            [{"b_id": event_id, "b_count": count} for event_id, count in counts.items()]
+        )
+        bump_events({event_id: VIEW_WEIGHT * count for event_id, count in counts.items()})
+        bump_summaries({event_id: {'views': count} for event_id, count in counts.items()})
+        anon_rows = [row for row in rows if not row['user_id']]
+        # У пользователя одна строка на событие (unique_event_user_view): повторный просмотр обновляет ее
+        latest_user_rows = {}
+        for row in rows:
+            if row['user_id']:
+                latest_user_rows[(row['event_id'], row['user_id'])] = row
+        stored_pairs = set()
+        if latest_user_rows:
+            stored_pairs = set(db.session.query(EventView.event_id, EventView.user_id).filter(
+                tuple_(EventView.event_id, EventView.user_id).in_(list(latest_user_rows.keys()))
+            ).all())
+        views_table = EventView.__table__
+        updates = [row for key, row in latest_user_rows.items() if key in stored_pairs]
+        if updates:
+            db.session.execute(
+                views_table.update().where(views_table.c.event_id == bindparam('b_event_id'), views_table.c.user_id == bindparam('b_user_id')).values(
+                    viewed_at=bindparam('b_viewed_at'), ip_address=bindparam('b_ip_address'), user_agent=bindparam('b_user_agent')),
+                [{"b_event_id": r['event_id'], "b_user_id": r['user_id'], "b_viewed_at": r['viewed_at'],
+                  "b_ip_address": r['ip_address'], "b_user_agent": r['user_agent']} for r in updates]
+            )
+        inserts = anon_rows + [row for key, row in latest_user_rows.items() if key not in stored_pairs]
+        if inserts:
+            db.session.execute(views_table.insert(), inserts)
+        return sum(counts.values())
+
+    # --- Фоновый сброс ---
+
+    def ensure_flusher(self, app, spawn, sleep):
+        """Запускает фоновый цикл сброса один раз на процесс (spawn/sleep - из socketio)."""
+        with self._lock:
+            if self._flusher_started or self.mode != 'buffered':
+                return
+            self._flusher_started = True
+        spawn(self._flush_loop, app, sleep)
+
+    def _flush_loop(self, app, sleep):
+        while True:
+            sleep(self.flush_interval)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    app.logger.warning(f"View flush failed: {e}")
+                finally:
+                    db.session.remove()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode, "pending": len(self._pending_rows), "counted": self.counted,
+                "flushed": self.flushed, "flushes": self.flushes,
+                "dedupKeys": len(self._user_seen) + len(self._anon_seen), "rateLimitKeys": len(self._limiter)
+            }
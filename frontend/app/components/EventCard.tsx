@@ -4,6 +4,9 @@ import { Ionicons } from '@expo/vector-icons';
 import { colors, spacing, borderRadius, typography } from '../theme/colors';
 import EventPlaceholder from '../assets/placeholder.jpg';
 
+// URL производных картинки с сервера: { thumb | card | full: { webp, jpeg } }
+export type ImageVariants = Record<string, { webp: string; jpeg: string }> | null;
+
 export interface EventItem {
   id: string;
   title: string;
@@ -12,6 +15,7 @@ export interface EventItem {
   price: string | number;
   priceValue?: number;
   image: any;
+  imageVariants?: ImageVariants;
   categories: string[];
   views?: number;
   ageLimit?: number;
@@ -86,18 +90,21 @@ export default function EventCard({
   price,
   priceValue,
   image,
+  imageVariants,
   onPress,
   style,
   categories,
   ageLimit,
 }: EventCardProps) {
   const [imageError, setImageError] = useState(false);
+  // Для карточки хватает варианта card, оригинал на полный экран не нужен
+  const cardImage = imageVariants?.card?.webp || image;
   const source =
-    imageError || !image || image === ''
+    imageError || !cardImage || cardImage === ''
       ? EventPlaceholder
-      : typeof image === 'string'
-        ? { uri: image }
-        : image;
+      : typeof cardImage === 'string'
+        ? { uri: cardImage }
+        : cardImage;
 
   const formattedDate = formatRussianDate(date);
   const formattedPrice = formatPrice(price, priceValue);
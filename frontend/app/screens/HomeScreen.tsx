@@ -29,7 +29,13 @@ import { calculateUserAge } from '../utils/dateUtils';
 
 export default function HomeScreen() {
   const navigation = useNavigation<any>();
-  const { events, fetchEvents, isLoading: eventsLoading } = useEventStore();
+  const {
+    events,
+    forYouEvents: recommendedEvents,
+    fetchEvents,
+    fetchForYouEvents,
+    isLoading: eventsLoading,
+  } = useEventStore();
   const { user } = useUserStore();
   const { posts, fetchPosts, isLoading: postsLoading } = useDiscussionStore();
 
@@ -44,6 +50,7 @@ export default function HomeScreen() {
   useFocusEffect(
     useCallback(() => {
       fetchEvents();
+      fetchForYouEvents();
       fetchPosts();
       // Сбрасываем локальный поиск при возврате на главный экран
       setHomeSearchValue('');
@@ -52,9 +59,9 @@ export default function HomeScreen() {
 
   const onRefresh = useCallback(async () => {
     setRefreshing(true);
-    await Promise.all([fetchEvents(), fetchPosts()]);
+    await Promise.all([fetchEvents(), fetchForYouEvents(), fetchPosts()]);
     setRefreshing(false);
-  }, [fetchEvents, fetchPosts]);
+  }, [fetchEvents, fetchForYouEvents, fetchPosts]);
 
   // КИБЕРБЕЗОПАСНОСТЬ: Базовая фильтрация всех ивентов по возрасту перед распределением по секциям
   const ageAppropriateEvents = useMemo(() => {
@@ -62,6 +69,9 @@ export default function HomeScreen() {
   }, [events, userAge]);
 
   const forYouEvents = useMemo(() => {
+    // Серверная подборка; локальный подбор ниже остается на случай, если она недоступна
+    const recommended = recommendedEvents.filter(e => userAge >= (e.ageLimit || 0));
+    if (recommended.length > 0) return recommended;
     let result = ageAppropriateEvents;
     if (!user.interests || user.interests.length === 0) {
       const special = result.filter(e => e.isForYou);
@@ -82,7 +92,7 @@ export default function HomeScreen() {
         return 0;
       })
       .slice(0, 20);
-  }, [ageAppropriateEvents, user.interests]);
+  }, [recommendedEvents, ageAppropriateEvents, user.interests, userAge]);
 
   const nextWeekEvents = useMemo(() => {
     const now = new Date();
@@ -8,6 +8,23 @@ import { io, Socket } from 'socket.io-client';
 
 const SOCKET_URL = BASE_URL.replace('/api', '');
 
+// --------------------
+// Применяет голос одного пользователя к карте votedUsers
+// --------------------
+function applyVoteChange(
+  votedUsers: Record<string, 'up' | 'down'> | undefined,
+  userId: string,
+  vote: 'up' | 'down' | null
+) {
+  const updated = { ...(votedUsers || {}) };
+  if (vote) {
+    updated[userId] = vote;
+  } else {
+    delete updated[userId];
+  }
+  return updated;
+}
+
 interface DiscussionState {
   posts: PostData[];
   comments: Record<string, CommentData[]>;
@@ -52,22 +69,33 @@ export const useDiscussionStore = create<DiscussionState>()(
 
         socket.emit('join_post', { postId });
 
-        socket.on('new_comment', (comment: CommentData) => {
+        const appendComments = (incoming: CommentData[]) => {
           const currentComments = get().comments[postId] || [];
-          if (currentComments.some(c => c.id === comment.id)) return;
+          const fresh = incoming.filter(comment => !currentComments.some(c => c.id === comment.id));
+          if (fresh.length === 0) return;
 
           set(state => ({
             comments: {
               ...state.comments,
-              [postId]: [...currentComments, comment],
+              [postId]: [...currentComments, ...fresh],
             },
             posts: state.posts.map(p =>
-              p.id === postId ? { ...p, commentCount: p.commentCount + 1 } : p
+              p.id === postId ? { ...p, commentCount: p.commentCount + fresh.length } : p
             ),
           }));
+        };
+
+        socket.on('new_comment', (comment: CommentData) => appendComments([comment]));
+
+        // Пачка комментариев за окно склейки; dropped > 0 - часть не влезла в очередь, перечитываем
+        socket.on('new_comments', (data: { comments: CommentData[]; dropped: number }) => {
+          appendComments(data.comments);
+          if (data.dropped > 0) get().fetchComments(postId);
         });
 
+        // Итоги за окно склейки и последние голоса изменившихся пользователей
         socket.on('vote_update', (data: any) => {
+          const changes: Record<string, 'up' | 'down' | null> = data.votes || { [data.userId]: data.vote };
           set(state => ({
             posts: state.posts.map(p =>
               p.id === data.postId
@@ -75,7 +103,10 @@ export const useDiscussionStore = create<DiscussionState>()(
                     ...p,
                     upvotes: data.upvotes,
                     downvotes: data.downvotes,
-                    votedUsers: data.votedUsers,
+                    votedUsers: Object.entries(changes).reduce(
+                      (voted, [userId, vote]) => applyVoteChange(voted, userId, vote),
+                      p.votedUsers
+                    ),
                   }
                 : p
             ),
@@ -88,6 +119,7 @@ export const useDiscussionStore = create<DiscussionState>()(
         if (socket) {
           socket.emit('leave_post', { postId });
           socket.off('new_comment');
+          socket.off('new_comments');
           socket.off('vote_update');
         }
       },
@@ -11,8 +11,10 @@ export interface AppEvent extends DetailedEventItem {
 
 interface EventState {
   events: AppEvent[];
+  forYouEvents: AppEvent[];
   isLoading: boolean;
   fetchEvents: () => Promise<void>;
+  fetchForYouEvents: () => Promise<void>;
   addEvent: (event: Omit<AppEvent, 'id'>) => Promise<void>;
   updateEvent: (event: AppEvent) => Promise<void>;
   deleteEvent: (id: string) => Promise<void>;
@@ -24,6 +26,7 @@ export const useEventStore = create<EventState>()(
   persist(
     (set, get) => ({
       events: [],
+      forYouEvents: [],
       isLoading: false,
 
       fetchEvents: async () => {
@@ -36,6 +39,14 @@ export const useEventStore = create<EventState>()(
         }
       },
 
+      // Подборка "Для вас" считается на сервере по интересам, подпискам и похожим пользователям
+      fetchForYouEvents: async () => {
+        try {
+          const data = await apiClient('events/for-you?limit=20', { method: 'GET' });
+          set({ forYouEvents: data });
+        } catch (error: any) {}
+      },
+
       addEvent: async event => {
         if (event.image && !validateImageUrl(event.image)) {
           throw new Error('Некорректный URL изображения');
@@ -86,7 +97,7 @@ export const useEventStore = create<EventState>()(
       },
 
       clearAllEvents: async () => {
-        set({ events: [] });
+        set({ events: [], forYouEvents: [] });
       },
     }),
     {
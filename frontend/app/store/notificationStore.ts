@@ -24,6 +24,21 @@ interface NotificationState {
   addNotification: (notification: NotificationItem) => void;
 }
 
+// --------------------
+// Рассылка по подписчикам приходит одним кадром на всех:
+// id уведомления собирается из idPrefix и id текущего пользователя
+// --------------------
+function completeBroadcastNotification(notification: any, userId: string): NotificationItem {
+  if (notification.id) {
+    return notification;
+  }
+  return {
+    ...notification,
+    id: notification.idPrefix + userId,
+    recipientId: userId,
+  };
+}
+
 export const useNotificationStore = create<NotificationState>((set, get) => ({
   notifications: [],
   unreadCount: 0,
@@ -47,9 +62,9 @@ export const useNotificationStore = create<NotificationState>((set, get) => ({
       socket.emit('join_user_room', { userId });
     });
 
-    socket.on('new_notification', (notification: NotificationItem) => {
+    socket.on('new_notification', (notification: any) => {
       console.log('Received notification:', notification);
-      get().addNotification(notification);
+      get().addNotification(completeBroadcastNotification(notification, userId));
     });
 
     set({ socket });
@@ -65,10 +80,10 @@ export const useNotificationStore = create<NotificationState>((set, get) => ({
 
   fetchNotifications: async () => {
     try {
-      const data = await apiClient('notifications', { method: 'GET' });
-      // data is array of notifications
-      const unread = data.filter((n: NotificationItem) => !n.isRead).length;
-      set({ notifications: data, unreadCount: unread });
+      // Последняя страница уведомлений и отдельный дешевый счетчик непрочитанных
+      const data = await apiClient('notifications?limit=50', { method: 'GET' });
+      const counter = await apiClient('notifications/unread-count', { method: 'GET' });
+      set({ notifications: data, unreadCount: counter.unreadCount });
     } catch (error) {
       console.log('Error fetching notifications', error);
     }
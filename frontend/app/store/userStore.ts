@@ -6,6 +6,14 @@ import { UserData, INITIAL_USER_DATA } from '../data/userMockData';
 import { apiClient } from '../api/apiClient';
 import { validateEmail, validatePassword } from '../utils/security';
 
+// --------------------
+// Сервер возвращает только новое состояние одной связи, список обновляем локально
+// --------------------
+function setIdPresence(ids: string[] | undefined, id: string, present: boolean): string[] {
+  const rest = (ids || []).filter(existing => existing !== id);
+  return present ? [...rest, id] : rest;
+}
+
 interface UserState {
   user: UserData;
   registeredUsers: UserData[];
@@ -96,7 +104,8 @@ export const useUserStore = create<UserState>()(
 
       login: async (email, password) => {
         try {
-          const res = await apiClient('login', {
+          // Коллекции профиля сервер отдает только по запросу
+          const res = await apiClient('login?fields=all', {
             method: 'POST',
             body: JSON.stringify({ email, password }),
           });
@@ -187,7 +196,7 @@ export const useUserStore = create<UserState>()(
             method: 'PUT',
             body: JSON.stringify(data),
           });
-          set(state => ({ user: updatedUser }));
+          set(state => ({ user: { ...state.user, ...updatedUser } }));
         } catch (error) {
           throw error;
         }
@@ -199,9 +208,9 @@ export const useUserStore = create<UserState>()(
             method: 'POST',
           });
           set(state => ({
-            user: updatedUser,
+            user: { ...state.user, ...updatedUser },
             registeredUsers: state.registeredUsers.map(u =>
-              u.id === updatedUser.id ? updatedUser : u
+              u.id === updatedUser.id ? { ...u, ...updatedUser } : u
             ),
           }));
         } catch (error) {
@@ -217,7 +226,14 @@ export const useUserStore = create<UserState>()(
             body: JSON.stringify({ organizerId }),
           });
           set(state => ({
-            user: { ...state.user, followingOrganizerIds: res.followingOrganizerIds },
+            user: {
+              ...state.user,
+              followingOrganizerIds: setIdPresence(
+                state.user.followingOrganizerIds,
+                organizerId,
+                res.following
+              ),
+            },
           }));
         } catch (error) {}
       },
@@ -233,7 +249,12 @@ export const useUserStore = create<UserState>()(
             method: 'POST',
             body: JSON.stringify({ eventId: id }),
           });
-          set(state => ({ user: { ...state.user, savedEventIds: res.savedEventIds } }));
+          set(state => ({
+            user: {
+              ...state.user,
+              savedEventIds: setIdPresence(state.user.savedEventIds, id, res.saved),
+            },
+          }));
         } catch (error) {}
       },
 